@@ -1,4 +1,5 @@
 import os
+import sys
 import time
 import requests
 import logging
@@ -8,7 +9,6 @@ import queue
 import hashlib
 import traceback
 from urllib.parse import urljoin, urlparse
-from urllib.robotparser import RobotFileParser
 import multiprocessing
 import psutil
 import json
@@ -17,6 +17,12 @@ from urllib3.util.retry import Retry
 from crawler_config import API_BASE_URL
 from bs4 import BeautifulSoup
 
+# Shared crawler modules (robots.py, ...) live in the parent directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+from robots import RobotsCache
+from canonical import canonicalize
+from links import extract_links
+
 # Configure logging
 logging.basicConfig(
     level=logging.DEBUG,
@@ -54,6 +60,9 @@ HEADERS = {
 # Rate limit tracking
 domain_delays = {}
 
+# robots.txt cache shared by all worker threads
+robots_cache = RobotsCache(HEADERS['User-Agent'], session=session)
+
 # Blacklist cache (domain -> (is_blacklisted, timestamp))
 blacklist_cache = {}
 BLACKLIST_CACHE_TTL = 300  # 5 minutes
@@ -76,12 +85,7 @@ DOMAIN_TAGS = {
 def get_crawl_delay(url):
     """Get crawl delay from robots.txt."""
     try:
-        parsed = urlparse(url)
-        robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
-        rp = RobotFileParser()
-        rp.set_url(robots_url)
-        rp.read()
-        delay = rp.crawl_delay(HEADERS['User-Agent']) or 1.0
+        delay = robots_cache.crawl_delay(urlparse(url).netloc) or 1.0
         logger.debug(f"Crawl delay for {url}: {delay}s")
         return delay
     except Exception as e:
@@ -91,12 +95,7 @@ def get_crawl_delay(url):
 def can_crawl(url):
     """Check if URL is allowed by robots.txt."""
     try:
-        parsed = urlparse(url)
-        robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
-        rp = RobotFileParser()
-        rp.set_url(robots_url)
-        rp.read()
-        can_fetch = rp.can_fetch(HEADERS['User-Agent'], url)
+        can_fetch = robots_cache.can_fetch(url)
         logger.debug(f"robots.txt check for {url}: {'Allowed' if can_fetch else 'Disallowed'}")
         return can_fetch
     except Exception as e:
@@ -239,19 +238,17 @@ def extract_urls(response, base_url, blacklist_check_endpoint, jwt_token):
         urls = set()
         # Extract from headers (e.g., Location)
         if 'Location' in response.headers:
-            absolute_url = urljoin(base_url, response.headers['Location'])
+            absolute_url = canonicalize(urljoin(base_url, response.headers['Location']))
             parsed = urlparse(absolute_url)
             if parsed.scheme in ['http', 'https'] and not is_domain_blacklisted(parsed.netloc, blacklist_check_endpoint, jwt_token):
                 urls.add(absolute_url[:2048])
         
         # Extract from HTML content
         if 'text/html' in response.headers.get('Content-Type', ''):
-            soup = BeautifulSoup(response.text, 'html.parser')
-            for a in soup.find_all('a', href=True):
-                absolute_url = urljoin(base_url, a['href'])
-                parsed = urlparse(absolute_url)
-                if parsed.scheme in ['http', 'https'] and not is_domain_blacklisted(parsed.netloc, blacklist_check_endpoint, jwt_token):
-                    urls.add(absolute_url[:2048])
+            # links.extract_links returns canonical, absolute http(s) URLs
+            for link in extract_links(base_url, response.text):
+                if not is_domain_blacklisted(urlparse(link.url).netloc, blacklist_check_endpoint, jwt_token):
+                    urls.add(link.url)
         
         logger.debug(f"Extracted {len(urls)} new URLs from {base_url}")
         return list(urls)
@@ -314,7 +311,8 @@ def crawl_url(url, blacklist_check_endpoint, jwt_token, enforce_robots=True):
             summary = extract_summary(url)
             tags = extract_tags(url)
         
-        new_urls = extract_urls(response, url, blacklist_check_endpoint, jwt_token)[:50]
+        # Resolve links against the final URL after redirects, not the requested one
+        new_urls = extract_urls(response, response.url or url, blacklist_check_endpoint, jwt_token)[:50]
         logger.info(f"Completed crawl for {url}: title='{title}', summary_len={len(summary)}, tags_count={len(tags.split(',')) if tags else 0}, content_hash={content_hash[:8]}..., new_urls={len(new_urls)} in {time.time() - start_time:.2f}s")
         return {
             'url': url[:2048],
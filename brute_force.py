@@ -1,60 +1,289 @@
-import requests
+#!/usr/bin/env python3
+"""
+brute_force.py
+
+Domain discovery from a wordlist, as a staged pipeline.
+
+Every word becomes one candidate domain per TLD. Names are resolved first,
+DNS_CONCURRENCY at a time, by asyncio workers over a thread pool, since
+most candidates do not exist and a lookup is far cheaper than an HTTP
+connect timeout. A domain counts as live if it or its www. name resolves.
+Each live host gets one probe on the THREADS-wide pool: HTTPS first, then
+HTTP if HTTPS cannot connect at all. Found pages go to database.save_pages
+in batches of SAVE_BATCH_SIZE. Lookups go through a DNSCache, so the probe
+reuses the answer from the first stage.
+
+Progress (the number of wordlist lines fully done) is saved every
+PROGRESS_INTERVAL seconds and on exit, always after the pages of those
+lines are stored, so an interrupted run over a large wordlist continues
+where it stopped. A batch the database rejects is kept and retried with
+the next one, and progress does not move past it until it is saved. Tags
+come from tagger.py, scored against the crawler's saved document-frequency
+table when there is one.
+
+    python brute_force.py wordlist.txt
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from utils import summarize_content, generate_tags
-from database import save_page, init_db
+
+import requests
+
+from checkpoint import read_checkpoint, write_checkpoint
+from dns_cache import DNSCache
+from fetch import fetch_page, decode_body, HTML_TYPES
+from tagger import Tagger, extract_terms
+from utils import ParsedPage
+from database import get_connection, release_connection, save_pages
 from config import THREADS
 
 TLDs = ['.com', '.net', '.org', '.us', '.xyz', '.io', '.co']
-PROTOCOLS = ['http://', 'https://']
-WWW_PREFIXES = ['', 'www.']
-tried_urls = set()
-
-def run_bruteforcer(dummy_conn=None, wordlist_file="wordlist.txt"):
-    with open(wordlist_file, "r") as f:
-        words = [line.strip().lower() for line in f if line.strip()]
-
-    domain_variants = []
-    for word in words:
-        for tld in TLDs:
-            base = f"{word}{tld}"
-            for protocol in PROTOCOLS:
-                for prefix in WWW_PREFIXES:
-                    url = protocol + prefix + base
-                    if url not in tried_urls:
-                        tried_urls.add(url)
-                        domain_variants.append(url)
-
-    print(f"[*] Generated {len(domain_variants)} combinations for brute-forcing...")
-
-    with ThreadPoolExecutor(max_workers=THREADS) as executor:
-        futures = [executor.submit(test_domain, url) for url in domain_variants]
-        for future in as_completed(futures):
-            _ = future.result()
+WWW_PREFIX = 'www.'
+DNS_CONCURRENCY = 200  # Words resolved at once
+PROBE_TIMEOUT = 5  # Seconds per HTTP attempt
+SAVE_BATCH_SIZE = 50  # Found pages per database transaction
+PROGRESS_PATH = "bruteforce_progress.json.gz"
+PROGRESS_INTERVAL = 30  # Seconds between progress saves
+DOC_FREQ_PATH = "docfreq.npy"  # Written by crawler.py checkpoints
 
-def test_domain(url):
-    try:
-        r = requests.get(url, timeout=5)
-        if r.status_code != 200 or "text/html" not in r.headers.get("Content-Type", ""):
-            return
+_LABEL = re.compile(r"[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?$")
 
-        html = r.text
-        soup = BeautifulSoup(html, 'lxml')
+def read_words(wordlist_file, start=0):
+    """Yield (line number, word) for every line from `start` on; word is None unless it can be a domain label."""
+    with open(wordlist_file, "r", encoding="utf-8", errors="replace") as f:
+        for i, line in enumerate(f):
+            if i >= start:
+                word = line.strip().lower()
+                yield i, word if _LABEL.match(word) else None
+
+_default_tagger = None
+
+def default_tagger():
+    """Tagger scored against the crawler's saved table, loaded once."""
+    global _default_tagger
+    if _default_tagger is None:
+        _default_tagger = Tagger()
+        if _default_tagger.load(DOC_FREQ_PATH):
+            print(f"[*] Scoring tags against {_default_tagger.doc_freq.docs} pages in {DOC_FREQ_PATH}")
+    return _default_tagger
+
+def probe_host(host, tagger):
+    """
+    Fetch the front page of host over HTTPS, falling back to HTTP when HTTPS
+    cannot connect. Returns (save_pages row, page.anchors) for an HTML page,
+    otherwise None.
+    """
+    for scheme in ("https://", "http://"):
+        try:
+            return fetch_site(scheme + host, tagger)
+        except requests.RequestException:
+            continue
+    return None
+
+def fetch_site(url, tagger):
+    """
+    (save_pages row, page.anchors) for url if it serves an HTML page,
+    otherwise None; raises requests.RequestException if it cannot be fetched.
+    """
+    r, body = fetch_page(requests, url, accept=HTML_TYPES, timeout=PROBE_TIMEOUT)
+    if body is None or "text/html" not in r.headers.get("Content-Type", ""):
+        return None
+
+    try:
+        page = ParsedPage(url, decode_body(body, r.headers.get("Content-Type")))
 
         # Extract real <title>
-        title_tag = soup.find("title")
-        title = title_tag.get_text(strip=True) if title_tag else urlparse(url).netloc
+        title = page.title or urlparse(url).netloc
         if title.lower() in ("home", "index", "untitled"):
             title = urlparse(url).netloc
 
-        summary = summarize_content(html)
-        tags = generate_tags(summary, title=title, url=url)
-
+        text = page.text
+        tags = tagger.observe_and_tag(*extract_terms(text, title, url))
         print(f"[+] Found site: {url}")
-        conn = init_db()
-        save_page(conn, title, url, summary, tags)
-        conn.close()
+        return (title, url, page.summary, tags, page.images, text), page.anchors
+    except Exception:
+        return None
 
+def test_domain(url):
+    """Save url if it serves an HTML page; returns the page's links.Link list, or None."""
+    try:
+        result = fetch_site(url, default_tagger())
+        if result is None:
+            return None
+        row, anchors = result
+        conn = get_connection()
+        try:
+            save_pages(conn, [row])
+        finally:
+            release_connection(conn)
+        return anchors
     except Exception:
-        pass
+        return None
+
+class Progress:
+    """Tracks finished wordlist lines; `line` is the first one not yet fully done."""
+
+    def __init__(self, line=0):
+        self.line = line
+        self._done = set()
+
+    def finish(self, i):
+        self._done.add(i)
+        while self.line in self._done:
+            self._done.discard(self.line)
+            self.line += 1
+
+def load_progress(path, wordlist_file):
+    state = read_checkpoint(path)
+    if state is None or state.get("wordlist") != os.path.abspath(wordlist_file):
+        return 0, 0
+    return state["line"], state.get("found", 0)
+
+class FoundPages:
+    """save_pages rows waiting to be stored: added on the event loop, saved on the writer thread."""
+
+    def __init__(self):
+        self._rows = []
+        self._lock = threading.Lock()
+        self.added = 0  # Rows added since the last flush was requested
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, row):
+        with self._lock:
+            self._rows.append(row)
+        self.added += 1
+
+    def save(self):
+        """Store every row added so far; on a database error they stay buffered and the error propagates."""
+        with self._lock:
+            batch = self._rows[:]
+        if not batch:
+            return
+        conn = get_connection()
+        try:
+            save_pages(conn, batch)
+        finally:
+            release_connection(conn)
+        with self._lock:
+            del self._rows[:len(batch)]
+
+def store(pages, path, wordlist_file, line, found):
+    """Save buffered pages, then record that every line before `line` is done."""
+    pages.save()
+    write_checkpoint(path, {"wordlist": os.path.abspath(wordlist_file), "line": line, "found": found})
+
+async def discover(wordlist_file, progress_path, start, found, tagger, dns):
+    loop = asyncio.get_running_loop()
+    resolver = ThreadPoolExecutor(DNS_CONCURRENCY, thread_name_prefix="Resolve")
+    prober = ThreadPoolExecutor(THREADS, thread_name_prefix="Probe")
+    writer = ThreadPoolExecutor(1, thread_name_prefix="Save")  # Keeps saves and progress in order
+    words = asyncio.Queue(DNS_CONCURRENCY * 2)
+    progress = Progress(start)
+    pages, outbound = FoundPages(), set()
+    stats = {"found": found, "live": 0}
+
+    async def resolves(host):
+        try:
+            await loop.run_in_executor(resolver, dns.lookup, host)
+            return True
+        except socket.gaierror:
+            return False
+
+    async def live_host(domain):
+        if await resolves(domain):
+            return domain
+        if await resolves(WWW_PREFIX + domain):
+            return WWW_PREFIX + domain
+        return None
+
+    async def flush():
+        # Every row of a line before progress.line is already in pages, so a
+        # cancelled or failed flush loses nothing: the next one saves it first
+        pages.added = 0
+        try:
+            await loop.run_in_executor(writer, store, pages, progress_path, wordlist_file,
+                                       progress.line, stats["found"])
+        except Exception as e:
+            print(f"[!] Saving found sites failed, will retry with the next batch: {e}")
+
+    async def check_word(word):
+        hosts = [h for h in await asyncio.gather(*(live_host(word + tld) for tld in TLDs)) if h]
+        stats["live"] += len(hosts)
+        results = await asyncio.gather(*(loop.run_in_executor(prober, probe_host, h, tagger)
+                                         for h in hosts))
+        for result in filter(None, results):
+            row, anchors = result
+            pages.add(row)
+            outbound.update(urlparse(link.url).netloc for link in anchors)
+            stats["found"] += 1
+
+    async def worker():
+        while True:
+            i, word = await words.get()
+            try:
+                await check_word(word)
+            except Exception as e:
+                print(f"[!] Skipped '{word}' after an error: {e}")
+            progress.finish(i)
+            if pages.added >= SAVE_BATCH_SIZE:
+                await flush()
+            # Only now, so words.join() also waits for this flush
+            words.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(DNS_CONCURRENCY)]
+    last_save = monotonic()
+    try:
+        for i, word in read_words(wordlist_file, start):
+            if word is None:
+                progress.finish(i)
+            else:
+                await words.put((i, word))
+            if monotonic() - last_save > PROGRESS_INTERVAL:
+                last_save = monotonic()
+                await flush()
+                print(f"[*] {progress.line} lines done, {stats['live']} live hosts, "
+                      f"{stats['found']} sites found")
+        await words.join()
+    finally:
+        for task in workers:
+            task.cancel()
+        await flush()
+        if len(pages):
+            print(f"[!] {len(pages)} found sites could not be saved; progress stops before them")
+        for pool in (resolver, prober, writer):
+            pool.shutdown(wait=False, cancel_futures=True)
+    return stats["found"], outbound
+
+def run_bruteforcer(dummy_conn=None, wordlist_file="wordlist.txt", progress_path=PROGRESS_PATH, restart=False):
+    start, found = (0, 0) if restart else load_progress(progress_path, wordlist_file)
+    if start:
+        print(f"[*] Resuming {wordlist_file} at line {start} ({found} sites found so far)")
+    print(f"[*] Brute-forcing {len(TLDs)} TLDs per word, {DNS_CONCURRENCY} lookups at a time...")
+
+    tagger = default_tagger()
+    dns = DNSCache().install()
+
+    try:
+        found, outbound = asyncio.run(discover(wordlist_file, progress_path, start, found, tagger, dns))
+    except KeyboardInterrupt:
+        print(f"[!] Interrupted; progress saved to {progress_path}, run again to continue.")
+        return
+    print(f"[*] {found} sites found, linking to {len(outbound)} hosts")
+    print(f"[*] DNS cache hit rate {dns.hit_rate():.0%} ({dns.failures} failed lookups)")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Discover sites by brute-forcing domain names from a wordlist.")
+    ap.add_argument("wordlist", nargs="?", default="wordlist.txt")
+    ap.add_argument("--progress", default=PROGRESS_PATH, help="resumable progress file")
+    ap.add_argument("--restart", action="store_true", help="ignore saved progress")
+    args = ap.parse_args()
+    run_bruteforcer(wordlist_file=args.wordlist, progress_path=args.progress, restart=args.restart)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+canonical.py
+
+URL canonicalization shared by crawler.py and CrawlerV2, applied before
+visited checks and enqueueing so equivalent URLs are only fetched once.
+
+canonicalize() lower-cases scheme and host, drops default ports, userinfo,
+fragments and ;jsessionid-style session path parameters (other ;params are
+kept), removes tracking/session query parameters (plus any per-host extras
+in HOST_STRIP_PARAMS) and sorts the remaining query. The canonical URL is
+also the one fetched, so nothing else is rewritten: a valueless query key
+stays ?key, not ?key=. A trailing slash is kept: /docs/ and /docs are
+different resources, and relative links resolve differently against them.
+"""
+
+from urllib.parse import urlsplit, urlunsplit, quote_plus, unquote_plus
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Session ids, dropped from the query and from ;param path parameters
+SESSION_PARAMS = {
+    "jsessionid", "phpsessid", "aspsessionid", "sid", "sessionid", "session_id", "cfid", "cftoken",
+}
+# Query parameters dropped on every host
+STRIP_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "mc_cid", "mc_eid", "_ga", "_gl",
+    "igshid", "ref_src",
+} | SESSION_PARAMS
+STRIP_PREFIXES = ("utm_",)
+
+# Extra per-host parameters to drop; a rule for example.com also covers its subdomains.
+# e.g. {"example.com": {"ref", "sort"}, "news.site.org": {"page_view"}}
+HOST_STRIP_PARAMS = {}
+
+def _host_rules(host, host_rules):
+    extra = set()
+    labels = host.split(".")
+    for i in range(len(labels) - 1):
+        extra.update(host_rules.get(".".join(labels[i:]), ()))
+    return extra
+
+def _strip_session(segment):
+    """Path segment without its ;name=value parameters whose name is a session id."""
+    name, *params = segment.split(";")
+    kept = [p for p in params if p.split("=", 1)[0].lower() not in SESSION_PARAMS]
+    return ";".join([name] + kept)
+
+def canonicalize(url, host_rules=None):
+    """Return the canonical form of an absolute http(s) URL; other input is returned unchanged."""
+    try:
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS or not parts.hostname:
+            return url
+        host = parts.hostname.rstrip(".")
+        port = parts.port
+    except ValueError:
+        return url
+
+    if ":" in host:  # IPv6 literal
+        host = f"[{host}]"
+    netloc = host if port in (None, DEFAULT_PORTS[scheme]) else f"{host}:{port}"
+
+    path = parts.path
+    if ";" in path:
+        path = "/".join(_strip_session(seg) for seg in path.split("/"))
+    if not path:
+        path = "/"
+
+    query = parts.query
+    if query:
+        rules = HOST_STRIP_PARAMS if host_rules is None else host_rules
+        extra = _host_rules(host, rules) if rules else ()
+        params = []
+        for piece in query.split("&"):
+            k, eq, v = piece.partition("=")
+            k, v = unquote_plus(k), unquote_plus(v)
+            if not piece or k.lower() in STRIP_PARAMS or k in extra or k.lower().startswith(STRIP_PREFIXES):
+                continue
+            params.append((k, eq, v))  # eq is "" for a valueless key
+        params.sort()
+        query = "&".join(quote_plus(k) + (eq and eq + quote_plus(v)) for k, eq, v in params)
+
+    return urlunsplit((scheme, netloc, path, query, ""))
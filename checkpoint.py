@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+checkpoint.py
+
+Snapshot file for the crawler's in-memory runtime state.
+
+crawler.py periodically writes a small gzipped JSON checkpoint holding the
+ToS vetting verdicts, the politeness scheduler's booked slots and Crawl-delays,
+and the frontier lease owner of the running process (the visited set has
+its own memory-mapped snapshot, see visited.py). On restart the crawler
+restores it and then reads only DB rows newer than the checkpoint, instead
+of re-vetting every domain and waiting for the old process' leases to time
+out. Writes are atomic, so a crash mid-write leaves the previous checkpoint.
+"""
+
+import gzip
+import json
+import logging
+import os
+import socket
+from datetime import datetime
+from time import time
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+
+def write_checkpoint(path, state):
+    """Atomically write state (a JSON-serialisable dict) with a saved_at timestamp."""
+    state = dict(state, version=VERSION, saved_at=time())
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=1) as f:
+        json.dump(state, f, separators=(",", ":"))
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+def read_checkpoint(path):
+    """Return the dict written by write_checkpoint(), or None if missing, unreadable or outdated."""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable checkpoint {path}: {e}")
+        return None
+    if state.get("version") != VERSION:
+        logger.warning(f"Ignoring checkpoint {path} with version {state.get('version')}")
+        return None
+    return state
+
+def saved_at(state):
+    return datetime.fromtimestamp(state["saved_at"])
+
+def owner_alive(owner):
+    """
+    Whether a frontier lease owner ("hostname:pid") is a process still
+    running on this machine. Owners on other machines count as alive.
+    """
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
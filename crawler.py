@@ -6,26 +6,42 @@ A multi-threaded web crawler that indexes pages into PostgreSQL.
 Uses psycopg2 with a connection pool and DB credentials from config.py.
 """
 
+import os
 import threading
 import logging
 import requests
 from requests.adapters import HTTPAdapter
 from requests.exceptions import SSLError
 from urllib3.util.retry import Retry
-from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
-from time import time, sleep
+from time import time, sleep, perf_counter
 from random import uniform
-from queue import Queue, Empty
-import urllib.robotparser as robotparser
+from queue import Queue, Empty, Full
 import urllib3
+from functools import partial
+from datetime import datetime, timedelta
+from hashlib import blake2b
 from psycopg2.pool import ThreadedConnectionPool
-from collections import defaultdict
+from psycopg2.extras import execute_values
 
 from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASS
-from langdetect import detect, LangDetectException
-from utils import extract_links, summarize_content, extract_images, generate_tags, is_xml_content
+from engine import run_batched, run_streaming
+from politeness import HostScheduler
+from robots import RobotsCache, PgRobotsStore
+from vetting import DomainVetter, BLOCKED, PENDING
+from visited import FingerprintSet, save_fingerprints
+from frontier import Frontier
+from journal import WriteJournal
+from sitemaps import SitemapIngester
+from canonical import canonicalize
+from fetch import fetch_page, time_connections
+from dns_cache import DNSCache
+from parse_stage import ParseStage
+from checkpoint import write_checkpoint, read_checkpoint, saved_at, owner_alive
+from simhash_index import PgSimhashIndex
+from sharding import Shard, shard_path, host_point, HOST_POINT_SQL, NETLOC_SQL
+from tagger import Tagger
+import metrics
 
 # Suppress InsecureRequestWarning when verify=False
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -39,24 +55,75 @@ USER_AGENT = "DarkNetCrawler@projectkryptos.xyz"
 RESPECT_ROBOTS = True
 respect_robots = RESPECT_ROBOTS  # Alias for backward compatibility
 IGNORE_TOS = False
+TOS_DEFER_SECONDS = 30  # A URL whose host is still being vetted is claimable again after this...
+TOS_DEFER_MAX_SECONDS = 600  # ...doubled on every further deferral of the URL, up to this
+DEFERRED_POLL_INTERVAL = 1.0  # Min seconds between frontier checks for deferred rows when idle
+PERSIST_ROBOTS = True  # Keep fetched robots.txt files in the robots_cache table
+VETTING_WORKERS = 4  # Background threads probing ToS pages of new domains
+FOLLOW_SITEMAPS = True  # Ingest robots.txt-listed sitemaps of every new host
+SITEMAP_WORKERS = 2  # Background threads reading sitemaps
 DOMAIN_DELAY = 1.0  # Seconds between requests to same domain
 MAX_DEPTH = 5  # Maximum crawl depth from seed URLs
+SCHEDULER_CAPACITY = 5000  # Max URLs held in memory by the host scheduler
+CLAIM_INTERVAL = 0.5  # Min seconds between frontier refills of the scheduler
+WRITE_BATCH_SIZE = 500  # Max queued writes group-committed in one transaction
+WRITE_BATCH_WINDOW = 0.2  # Max seconds DBWorker waits to fill a batch
+WRITE_QUEUE_MAX = 20000  # Queued writes before fetch threads are blocked
+WRITE_BACKPRESSURE_TIMEOUT = 1.0  # Seconds a write waits for room before it is spilled
+WRITE_SPILL_JOURNAL = "write_spill.jsonl"  # Overflow journal replayed by DBWorker; None to only block
+VISITED_SNAPSHOT = "visited.npy"  # Fingerprint snapshot of crawled_urls
+SNAPSHOT_MARGIN = timedelta(minutes=10)  # Re-read rows this much older than a snapshot
+CHECKPOINT_PATH = "crawler_state.json.gz"  # Vetting, politeness and lease-owner checkpoint; None disables
+CHECKPOINT_INTERVAL = 300  # Seconds between checkpoints (visited snapshot included)
+DOC_FREQ_PATH = "docfreq.npy"  # Document frequencies behind TF-IDF tags, saved with each checkpoint
+TAGS_PER_PAGE = 8  # Highest TF-IDF terms stored as a page's tags
+RECRAWL_AFTER = timedelta(days=7)  # Stored pages older than this are conditionally refetched
+RECRAWL_BATCH = 10000  # Max pages queued for recrawl per run
+MAX_PAGE_BYTES = 2 * 1024 * 1024  # Page bodies are cut off after this many bytes
+PARSE_PROCESSES = max(1, (os.cpu_count() or 2) - 1)  # Parse worker processes; 0 parses on fetch threads
+PARSE_QUEUE_SIZE = 256  # Fetched pages waiting for a parse worker before fetch threads block
+METRICS_LOG_INTERVAL = 60  # Seconds between pipeline metrics lines in crawler.log
+DNS_OVERRIDES = {}  # Static host -> [IP, ...] pins, e.g. virtual hosts on a local test server
+DB_POOL_SIZE = 16  # Pooled DB connections; callers beyond this wait for one instead of failing
+METRICS_PORT = 9109  # Serve /metrics and /metrics.json on localhost; 0 disables
+ENGINE_MODE = "stream"  # "stream" keeps max_threads fetches in flight; "batch" waits per batch
+SHARD = None  # "index/count" crawls one consistent-hash slice of hosts (see sharding.py); None crawls all
 
 # ── Globals ───────────────────────────────────────────────────────────────────
 shutdown_event = threading.Event()
-visited = set()
+visited = FingerprintSet()
 visited_lock = threading.Lock()
-write_queue = Queue()
+write_queue = Queue(maxsize=WRITE_QUEUE_MAX)
+write_journal = None  # WriteJournal for overflow, opened by run_crawler
 _SENTINEL = object()
-robots_parsers = {}
-blocked_domains = set()
-tos_checked_domains = set()
-domain_last_accessed = defaultdict(float)
-domain_lock = threading.Lock()
-
-# Connection pool
-db_pool = ThreadedConnectionPool(1, 5, host=DB_HOST, port=DB_PORT, 
+_metrics_server = None
+
+# Per-stage timings (see metrics.py); parse, tags and langdetect come from parse_stage
+robots_stage = metrics.stage("robots")
+tos_stage = metrics.stage("tos")
+politeness_stage = metrics.stage("politeness")
+connect_stage = metrics.stage("connect")
+download_stage = metrics.stage("download")
+enqueue_stage = metrics.stage("db_enqueue")
+db_stage = metrics.stage("db_write", depth=write_queue.qsize)
+http_status = metrics.counter("http_responses", label="code")
+bytes_downloaded = metrics.counter("bytes_downloaded")
+writes_spilled = metrics.counter("writes_spilled")
+dns_cache = DNSCache(overrides=DNS_OVERRIDES, observe=metrics.stage("dns").observe).install()
+time_connections(connect_stage)
+
+host_scheduler = HostScheduler(DOMAIN_DELAY, on_wait=politeness_stage.observe)
+simhash_index = PgSimhashIndex()  # Near-duplicate bands, shared with database.save_page
+tagger = Tagger(tags_per_page=TAGS_PER_PAGE)
+_last_claim = 0.0
+_last_renew = 0.0
+_deferred_check = (0.0, None)  # (time, frontier.deferred_wait()) of the last check
+
+# Connection pool; ThreadedConnectionPool raises PoolError when empty, so
+# callers first take one of its DB_POOL_SIZE slots and block until one is free
+db_pool = ThreadedConnectionPool(1, DB_POOL_SIZE, host=DB_HOST, port=DB_PORT,
                                  dbname=DB_NAME, user=DB_USER, password=DB_PASS)
+_pool_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
 
 # Global requests session
 global_session = requests.Session()
@@ -71,260 +138,666 @@ global_session.mount("https://", adapter)
 global_session.headers.update({"User-Agent": USER_AGENT})
 
 def get_pg_connection():
-    """Return a connection from the pool."""
-    return db_pool.getconn()
+    """Return a connection from the pool, waiting for one if all are in use."""
+    _pool_slots.acquire()
+    try:
+        return db_pool.getconn()
+    except Exception:
+        _pool_slots.release()
+        raise
 
 def release_pg_connection(conn):
     """Return a connection to the pool."""
     db_pool.putconn(conn)
+    _pool_slots.release()
+
+robots_store = PgRobotsStore(get_pg_connection, release_pg_connection)
+robots_cache = RobotsCache(USER_AGENT, session=global_session,
+                           store=robots_store if PERSIST_ROBOTS else None)
+frontier = Frontier(get_pg_connection, release_pg_connection)
+domain_vetter = DomainVetter(global_session, get_pg_connection, release_pg_connection,
+                             workers=VETTING_WORKERS)
+sitemap_ingester = SitemapIngester(global_session, robots_cache, frontier, get_pg_connection,
+                                   release_pg_connection, workers=SITEMAP_WORKERS,
+                                   reserve=host_scheduler.reserve)
+metrics.gauge("write_queue_depth", write_queue.qsize)
+metrics.gauge("spilled_writes_pending", lambda: write_journal.pending() if write_journal else 0)
+metrics.gauge("scheduler_rows", lambda: len(host_scheduler))
+metrics.gauge("vetting_queue_depth", domain_vetter.queue_depth)
+metrics.gauge("sitemap_queue_depth", sitemap_ingester.queue_depth)
+metrics.gauge("visited_urls", lambda: len(visited))
+metrics.gauge("dns_hit_rate", lambda: round(dns_cache.hit_rate(), 3))
+metrics.gauge("dns_cache_entries", lambda: len(dns_cache))
 
 class DBWorker(threading.Thread):
-    """Background thread that serializes all DB writes to Postgres."""
-    def __init__(self):
+    """
+    Background thread that serializes all DB writes to Postgres.
+
+    Queued writes are drained into micro-batches (up to WRITE_BATCH_SIZE
+    items or WRITE_BATCH_WINDOW seconds), written with one multi-row
+    statement per table and committed once per batch.
+    """
+    # Tables are written in this order so tags/images follow their webpages row
+    ACTIONS = ("record_visited", "dequeue_pending", "save_page", "record_language",
+               "save_validators", "touch_validators", "enqueue_pending", "release_pending",
+               "defer_pending")
+
+    def __init__(self, batch_size=WRITE_BATCH_SIZE, batch_window=WRITE_BATCH_WINDOW):
         super().__init__(daemon=True)
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.stats = {"batches": 0, "writes": 0, "max_batch": 0,
+                      "last_flush_ms": 0.0, "total_flush_ms": 0.0}
 
     def run(self):
         conn = get_pg_connection()
         try:
-            while True:
-                try:
-                    req = write_queue.get(timeout=1)
-                except Empty:
-                    if shutdown_event.is_set() and write_queue.empty():
-                        break
+            done = False
+            while not done:
+                if self._replay(conn):
                     continue
-
-                if req is _SENTINEL:
-                    break
-
-                action, payload = req
-                cur = conn.cursor()
-                try:
-                    if action == "record_visited":
-                        self._record_visited(cur, payload)
-                    elif action == "enqueue_pending":
-                        self._enqueue_pending(cur, payload)
-                    elif action == "dequeue_pending":
-                        self._dequeue_pending(cur, payload)
-                    elif action == "save_page":
-                        self._save_page(cur, payload)
-                    elif action == "record_language":
-                        self._record_language(cur, payload)
-                    conn.commit()
-                except Exception as e:
-                    logger.error(f"DB error in {action}: {e}")
-                    conn.rollback()
-                finally:
-                    cur.close()
-                    write_queue.task_done()
+                batch, done = self._collect()
+                if batch:
+                    self._flush(conn, batch)
+            # Spilled writes still count on exit
+            while self._replay(conn):
+                pass
         except Exception as e:
             logger.error(f"DBWorker crashed: {e}")
         finally:
             release_pg_connection(conn)
 
-    def _record_visited(self, cur, url):
-        cur.execute(
-            "INSERT INTO crawled_urls(url) VALUES (%s) ON CONFLICT DO NOTHING;",
-            (url,)
-        )
+    def _collect(self):
+        """Block for the first write, then gather more until the batch is full or the window closes."""
+        try:
+            req = write_queue.get(timeout=1)
+        except Empty:
+            return [], shutdown_event.is_set() and write_queue.empty()
+        if req is _SENTINEL:
+            write_queue.task_done()
+            return [], True
+
+        batch = [req]
+        deadline = time() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time()
+            try:
+                req = write_queue.get(timeout=remaining) if remaining > 0 else write_queue.get_nowait()
+            except Empty:
+                break
+            if req is _SENTINEL:
+                write_queue.task_done()
+                return batch, True
+            batch.append(req)
+        return batch, False
+
+    def _replay(self, conn):
+        """
+        Write one batch from the spill journal once the queue is empty: the
+        queued writes are older, since submit_write spills everything while
+        the journal is not drained.
+        """
+        journal = write_journal
+        if journal is None or not journal.pending() or not write_queue.empty():
+            return False
+        items, offset = journal.read(self.batch_size)
+        if not items:
+            return False
+        self._flush(conn, items, queued=False)
+        journal.commit(offset, len(items))
+        logger.info(f"Replayed {len(items)} spilled writes, {journal.pending()} left")
+        return True
 
-    def _enqueue_pending(self, cur, payload):
-        url, depth = payload
-        cur.execute(
-            "INSERT INTO pending_urls(url, depth) VALUES (%s, %s) ON CONFLICT DO NOTHING;",
-            (url, depth)
-        )
+    def _flush(self, conn, batch, queued=True):
+        start = perf_counter()
+        try:
+            cur = conn.cursor()
+            try:
+                self._write(cur, batch)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"DB batch of {len(batch)} failed ({e}); retrying one by one")
+                self._flush_singly(conn, batch)
+            finally:
+                cur.close()
+        finally:
+            if queued:
+                for _ in batch:
+                    write_queue.task_done()
 
-    def _dequeue_pending(self, cur, url):
-        cur.execute("DELETE FROM pending_urls WHERE url = %s;", (url,))
+        db_stage.observe(perf_counter() - start)
+        elapsed_ms = (perf_counter() - start) * 1000
+        st = self.stats
+        st["batches"] += 1
+        st["writes"] += len(batch)
+        st["max_batch"] = max(st["max_batch"], len(batch))
+        st["last_flush_ms"] = elapsed_ms
+        st["total_flush_ms"] += elapsed_ms
+        logger.debug(f"DB flush: {len(batch)} writes in {elapsed_ms:.1f} ms")
+        if st["batches"] % 100 == 0:
+            logger.info(
+                f"DBWorker: {st['batches']} batches, avg {st['writes'] / st['batches']:.1f} "
+                f"writes/batch (max {st['max_batch']}), avg flush "
+                f"{st['total_flush_ms'] / st['batches']:.1f} ms, queue depth {write_queue.qsize()}"
+            )
 
-    def _save_page(self, cur, payload):
-        title, url, summary, tags, images = payload
-        cur.execute(
+    def _flush_singly(self, conn, batch):
+        """Fallback after a failed batch: commit each write alone so one bad row only loses itself."""
+        for req in batch:
+            cur = conn.cursor()
+            try:
+                self._write(cur, [req])
+                conn.commit()
+            except Exception as e:
+                logger.error(f"DB error in {req[0]}: {e}")
+                conn.rollback()
+            finally:
+                cur.close()
+
+    def _write(self, cur, batch):
+        grouped = {}
+        for action, payload in batch:
+            grouped.setdefault(action, []).append(payload)
+        for action in self.ACTIONS:
+            payloads = grouped.pop(action, None)
+            if payloads:
+                getattr(self, "_" + action)(cur, payloads)
+        for action in grouped:
+            logger.error(f"Unknown DB action: {action}")
+
+    def _record_visited(self, cur, urls):
+        execute_values(
+            cur,
+            "INSERT INTO crawled_urls(url, host_point) VALUES %s ON CONFLICT DO NOTHING;",
+            [(u, host_point(urlparse(u).netloc)) for u in urls], page_size=len(urls)
+        )
+
+    def _enqueue_pending(self, cur, payloads):
+        frontier.enqueue(cur, payloads)
+
+    def _dequeue_pending(self, cur, urls):
+        frontier.complete(cur, urls)
+
+    def _release_pending(self, cur, urls):
+        frontier.release(cur, urls)
+
+    def _defer_pending(self, cur, urls):
+        frontier.defer(cur, urls, TOS_DEFER_SECONDS, TOS_DEFER_MAX_SECONDS)
+
+    def _save_page(self, cur, payloads):
+        pages, prints, tags_of, image_rows = {}, {}, {}, []
+        # Entries spilled by an older version have no fingerprint
+        for title, url, summary, tags, images, *fingerprint in payloads:
+            fingerprint = fingerprint[0] if fingerprint else None
+            pages[url] = (title, url, summary, None if fingerprint is None else str(fingerprint))
+            if fingerprint is not None:
+                prints[url] = fingerprint
+            tags_of[url] = tags
+            image_rows.extend((url, image) for image in images)
+        tag_rows = [(url, tag) for url, tags in tags_of.items() for tag in tags]
+        # A changed page on recrawl refreshes its row
+        execute_values(
+            cur,
             """
-            INSERT INTO webpages (title, url, summary, timestamp)
-            VALUES (%s, %s, %s, NOW())
-            ON CONFLICT (url) DO NOTHING;
+            INSERT INTO webpages (title, url, summary, content_hash, timestamp)
+            VALUES %s
+            ON CONFLICT (url) DO UPDATE
+            SET title = EXCLUDED.title, summary = EXCLUDED.summary,
+                content_hash = COALESCE(EXCLUDED.content_hash, webpages.content_hash), timestamp = NOW();
             """,
-            (title, url, summary)
+            list(pages.values()), template="(%s, %s, %s, %s, NOW())", page_size=len(pages)
         )
-        for tag in tags:
-            cur.execute(
-                """
-                INSERT INTO tags (url, tag) VALUES (%s, %s)
-                ON CONFLICT DO NOTHING;
-                """,
-                (url, tag)
+        if prints:
+            simhash_index.remove(cur, prints)
+            simhash_index.add_many(cur, prints.items())
+        # A recrawl replaces the page's tags rather than adding to them
+        cur.execute("DELETE FROM tags WHERE url = ANY(%s);", (list(tags_of),))
+        if tag_rows:
+            execute_values(
+                cur,
+                "INSERT INTO tags (url, tag) VALUES %s ON CONFLICT DO NOTHING;",
+                tag_rows, page_size=len(tag_rows)
             )
-        for image in images:
-            cur.execute(
-                """
-                INSERT INTO images (url, image_url) VALUES (%s, %s)
-                ON CONFLICT DO NOTHING;
-                """,
-                (url, image)
+        if image_rows:
+            execute_values(
+                cur,
+                "INSERT INTO images (url, image_url) VALUES %s ON CONFLICT DO NOTHING;",
+                image_rows, page_size=len(image_rows)
             )
 
-    def _record_language(self, cur, payload):
-        url, lang = payload
-        cur.execute(
+    def _save_validators(self, cur, payloads):
+        rows = list({p[0]: p for p in payloads}.values())
+        execute_values(
+            cur,
+            """
+            INSERT INTO page_validators (url, etag, last_modified, body_hash, checked_at)
+            VALUES %s
+            ON CONFLICT (url) DO UPDATE
+            SET etag = EXCLUDED.etag, last_modified = EXCLUDED.last_modified,
+                body_hash = EXCLUDED.body_hash, checked_at = NOW();
+            """,
+            rows, template="(%s, %s, %s, %s, NOW())", page_size=len(rows)
+        )
+
+    def _touch_validators(self, cur, urls):
+        cur.execute("UPDATE page_validators SET checked_at = NOW() WHERE url = ANY(%s);", (list(urls),))
+
+    def _record_language(self, cur, payloads):
+        # ON CONFLICT DO UPDATE cannot touch one row twice per statement: keep the last value
+        rows = list(dict(payloads).items())
+        execute_values(
+            cur,
             """
             INSERT INTO language (url, language)
-            VALUES (%s, %s)
+            VALUES %s
             ON CONFLICT (url) DO UPDATE SET language = EXCLUDED.language;
             """,
-            (url, lang)
+            rows, page_size=len(rows)
         )
 
 def get_robot_parser(domain):
-    if domain in robots_parsers:
-        return robots_parsers[domain]
-    rp = robotparser.RobotFileParser()
-    try:
-        rp.set_url(f"https://{domain}/robots.txt")
-        rp.read()
-    except Exception:
-        rp = None
-    robots_parsers[domain] = rp
-    return rp
+    return robots_cache.get(domain)
 
 def is_allowed_by_robots(url):
     if not RESPECT_ROBOTS:
         return True
-    parsed = urlparse(url)
-    rp = get_robot_parser(parsed.netloc)
-    return rp is None or rp.can_fetch(USER_AGENT, url)
-
-def check_tos_for_domain(domain):
-    if domain in tos_checked_domains or IGNORE_TOS:
-        return
-    tos_checked_domains.add(domain)
-    conn = get_pg_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT 1 FROM blocked_domains WHERE domain = %s;", (domain,))
-        if cur.fetchone():
-            blocked_domains.add(domain)
-            return
-        for path in ("/terms", "/terms-of-service", "/tos", "/legal/terms"):
-            try:
-                r = global_session.get(
-                    f"https://{domain}{path}", timeout=5
-                )
-                text = r.text.lower()
-                if r.status_code == 200 and any(
-                    kw in text for kw in
-                    ("automated", "robot", "scrap", "crawl", "not allowed", "disallow", "unauthorized")
-                ):
-                    blocked_domains.add(domain)
-                    cur.execute("INSERT INTO blocked_domains(domain) VALUES (%s);", (domain,))
-                    conn.commit()
-                    logger.info(f"Disallowed by ToS: {domain}")
-                    return
-            except Exception:
-                continue
-        conn.commit()
-    except Exception as e:
-        logger.error(f"ToS check error for {domain}: {e}")
-        conn.rollback()
-    finally:
-        cur.close()
-        release_pg_connection(conn)
+    return robots_cache.can_fetch(url)
 
 def ignore_robots_and_tos():
     """Disable robots.txt and ToS checks on the fly."""
-    global RESPECT_ROBOTS, IGNORE_TOS, blocked_domains, tos_checked_domains, robots_parsers, respect_robots
+    global RESPECT_ROBOTS, IGNORE_TOS, respect_robots
     RESPECT_ROBOTS = False
     respect_robots = RESPECT_ROBOTS  # Update alias
     IGNORE_TOS = True
-    blocked_domains.clear()
-    tos_checked_domains.clear()
-    robots_parsers.clear()
+    domain_vetter.clear()
+    robots_cache.clear()
     logger.info("Robots.txt and ToS checks disabled.")
 
-def crawl_url(url, depth):
-    """Fetch a single URL, extract data, detect language, and enqueue new links."""
-    if shutdown_event.is_set() or depth > MAX_DEPTH:
+def crawl_url(url, depth, validators=None, scheduled=False):
+    """
+    Fetch a single URL, extract data, detect language, and enqueue new links.
+    validators is (etag, last_modified, body_hash) when the URL is a recrawl:
+    the request is made conditional and an unchanged page skips parse/save.
+    scheduled=True means the host scheduler already granted this host's slot.
+    """
+    if shutdown_event.is_set():
+        submit_write("release_pending", url)
+        return set()
+    if depth > MAX_DEPTH:
+        submit_write("dequeue_pending", url)
         return set()
 
     dom = urlparse(url).netloc
-    if not is_allowed_by_robots(url):
+    with robots_stage.time():
+        allowed = is_allowed_by_robots(url)
+    if not allowed:
         logger.info(f"Blocked by robots.txt: {url}")
+        submit_write("dequeue_pending", url)
         return set()
 
-    if not IGNORE_TOS and dom not in blocked_domains:
-        check_tos_for_domain(dom)
-        if dom in blocked_domains:
+    if RESPECT_ROBOTS:
+        delay = robots_cache.crawl_delay(dom)
+        if delay:
+            host_scheduler.set_delay(dom, delay)
+
+    if not IGNORE_TOS:
+        with tos_stage.time():
+            state = domain_vetter.status(dom)
+        if state == BLOCKED:
+            submit_write("dequeue_pending", url)
+            return set()
+        if state == PENDING:
+            # Never wait on ToS probes: hand the URL back to the frontier, not
+            # claimable for TOS_DEFER_SECONDS (doubling per deferral), and crawl
+            # something else. The engines wait for it through deferred_wait().
+            logger.info(f"Deferred until {dom} is vetted: {url}")
+            submit_write("defer_pending", url)
             return set()
 
+    if FOLLOW_SITEMAPS:
+        # Only hosts that passed vetting, after their Crawl-delay is known
+        sitemap_ingester.submit(dom)
+
+    # Rows queued before canonicalization existed may still be in raw form
+    key = canonicalize(url)
     with visited_lock:
-        if url in visited:
+        if not visited.add(key) and validators is None:
+            submit_write("dequeue_pending", url)
             return set()
-        visited.add(url)
 
-    with domain_lock:
-        now = time()
-        last = domain_last_accessed[dom]
-        if now - last < DOMAIN_DELAY:
-            sleep(DOMAIN_DELAY - (now - last))
-        domain_last_accessed[dom] = now
+    if not scheduled:
+        wait = host_scheduler.reserve(dom)
+        politeness_stage.observe(max(wait, 0.0))
+        if wait > 0:
+            sleep(wait)
+
+    headers = {}
+    if validators:
+        etag, last_modified, _ = validators
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
 
     try:
-        r = global_session.get(url, timeout=10)
-    except SSLError:
-        r = global_session.get(url, timeout=10, verify=False)
+        with download_stage.time():
+            try:
+                r, body = fetch_page(global_session, url, max_bytes=MAX_PAGE_BYTES, headers=headers)
+            except SSLError:
+                r, body = fetch_page(global_session, url, max_bytes=MAX_PAGE_BYTES,
+                                     headers=headers, verify=False)
     except Exception as e:
         logger.error(f"Request error for {url}: {e}")
-        write_queue.put(("dequeue_pending", url))
+        http_status.inc(value="error")
+        if validators is not None:
+            # Failed recrawls go to the back of the recrawl order too
+            submit_write("touch_validators", url)
+        submit_write("dequeue_pending", url)
         return set()
 
-    if r.status_code != 200:
-        write_queue.put(("dequeue_pending", url))
+    http_status.inc(value=r.status_code)
+    if body:
+        bytes_downloaded.inc(len(body))
+
+    if r.status_code == 304 and validators:
+        logger.info(f"Not modified: {url}")
+        submit_write("touch_validators", url)
+        submit_write("dequeue_pending", url)
         return set()
 
-    write_queue.put(("record_visited", url))
-    write_queue.put(("dequeue_pending", url))
+    if r.status_code != 200:
+        if validators is not None:
+            submit_write("touch_validators", url)
+        submit_write("dequeue_pending", url)
+        return set()
 
-    html = r.text
-    if is_xml_content(html):
-        logger.info(f"Skipping XML content for storage: {url}")
-        soup = BeautifulSoup(html, 'xml')
-        links = extract_links(url, html)
-        new_links = set()
-        for link in links:
-            write_queue.put(("enqueue_pending", (link, depth + 1)))
-            new_links.add(link)
-        return new_links
-
-    soup = BeautifulSoup(html, 'html.parser')
-    title = soup.title.string.strip() if soup.title else url
-    summary = summarize_content(html)
-    tags = generate_tags(soup.get_text(" ", strip=True), title=title, url=url)
-    images = extract_images(html)
-    write_queue.put(("save_page", (title, url, summary, tags, images)))
+    submit_write("record_visited", key)
+    submit_write("dequeue_pending", url)
+    if body is None:
+        # Not a page type we index, or over the size cap
+        if validators is not None:
+            submit_write("touch_validators", url)
+        return set()
 
-    try:
-        lang = detect(soup.get_text(" ", strip=True))
-        write_queue.put(("record_language", (url, lang)))
-    except LangDetectException:
-        write_queue.put(("record_language", (url, "unknown")))
+    body_hash = blake2b(body, digest_size=16).hexdigest()
+    submit_write("save_validators", (
+        url, r.headers.get("ETag"), r.headers.get("Last-Modified"), body_hash
+    ))
+    if validators and validators[2] == body_hash:
+        logger.info(f"Unchanged since last crawl: {url}")
+        return set()
 
-    links = extract_links(url, html)
+    # Relative links resolve against the final URL, trailing slash and redirects included
+    return parse_stage.submit(url, depth, body, r.headers.get("Content-Type"), dom,
+                              base_url=r.url, recrawl=validators is not None)
+
+def store_parsed(record, depth, recrawl=False):
+    """
+    Queue the writes for a record produced by parse_stage.parse_page. A
+    recrawled page was already counted in the document frequencies, so it
+    is only tagged.
+    """
+    url = record["url"]
+    if record["is_xml"]:
+        logger.info(f"Skipping XML content for storage: {url}")
+    else:
+        if recrawl:
+            tags = tagger.tag(record["terms"])
+        else:
+            tags = tagger.observe_and_tag(record["terms"], record["term_buckets"])
+        submit_write("save_page", (record["title"], url, record["summary"],
+                                   tags, record["images"], record["simhash"]))
+        submit_write("record_language", (url, record["language"]))
+    enqueue_links(record["links"], depth + 1)
+
+parse_stage = ParseStage(store_parsed, PARSE_PROCESSES, queue_size=PARSE_QUEUE_SIZE)
+
+def enqueue_links(links, depth):
+    """Queue discovered links for the frontier and their hosts for ToS vetting."""
     new_links = set()
     for link in links:
-        write_queue.put(("enqueue_pending", (link, depth + 1)))
+        submit_write("enqueue_pending", (link, depth))
         new_links.add(link)
-
+        parsed = urlparse(link)
+        # Another shard's host is routed to its owner through pending_urls
+        if not frontier.owns(parsed.netloc):
+            continue
+        dns_cache.prefetch(parsed.hostname)
+        if not IGNORE_TOS:
+            domain_vetter.submit(parsed.netloc)
     return new_links
 
-def run_crawler(seed_urls, max_threads=2):
-    """Main entry point: ensure schema, seed URLs, and crawl until done."""
+def submit_write(action, payload):
+    """
+    Queue a write for DBWorker. A full queue blocks the caller (backpressure)
+    for up to WRITE_BACKPRESSURE_TIMEOUT; after that the write is spilled to
+    the journal, or without one the caller keeps waiting for room. While the
+    journal holds writes, new ones are appended behind them, so a newer
+    queued write is never applied before an older spilled one.
+    """
+    with enqueue_stage.time():
+        if write_journal is not None and write_journal.pending():
+            write_journal.append(action, payload)
+            writes_spilled.inc()
+            return
+        try:
+            write_queue.put((action, payload), timeout=WRITE_BACKPRESSURE_TIMEOUT)
+            return
+        except Full:
+            pass
+        if write_journal is None:
+            write_queue.put((action, payload))
+        else:
+            write_journal.append(action, payload)
+            writes_spilled.inc()
+
+def claim_pending(n):
+    """Lease up to n rows from the frontier and return them as (url, depth, validators)."""
+    return frontier.claim(n)
+
+def settle():
+    """Wait until queued parses and their DB writes are done, so new links are in pending_urls."""
+    parse_stage.join()
+    write_queue.join()
+    while write_journal is not None and write_journal.pending():
+        sleep(0.2)
+
+def deferred_wait():
+    """frontier.deferred_wait(), queried at most every DEFERRED_POLL_INTERVAL seconds."""
+    global _deferred_check
+    now = time()
+    checked_at, wait = _deferred_check
+    if now - checked_at >= DEFERRED_POLL_INTERVAL:
+        checked_at, wait = _deferred_check = (now, frontier.deferred_wait())
+    return None if wait is None else max(0.0, wait - (now - checked_at))
+
+def retry_after():
+    """
+    Seconds until the host scheduler or a deferred frontier row has work, or
+    None if neither has any, so the streaming engine waits for URLs handed
+    back while their host is vetted instead of ending the crawl.
+    """
+    wait = host_scheduler.wait_time()
+    return wait if wait is not None else deferred_wait()
+
+def claim_settled(n):
+    """
+    claim_pending for the batched engine: settle, and wait for deferred rows,
+    before concluding the frontier is empty.
+    """
+    rows = claim_pending(n)
+    if not rows:
+        settle()
+        rows = claim_pending(n)
+    while not rows and not shutdown_event.is_set():
+        wait = frontier.deferred_wait()
+        if wait is None:
+            break
+        shutdown_event.wait(min(max(wait, 0.1), TOS_DEFER_SECONDS))
+        rows = claim_pending(n)
+    return rows
+
+def next_ready(n):
+    """
+    Top up the host scheduler from pending_urls and return up to n rows whose
+    host may be fetched right now.
+    """
+    global _last_claim, _last_renew
+    now = time()
+    if len(host_scheduler) and now - _last_renew >= frontier.lease_seconds / 3:
+        # Rows waiting on politeness stay leased to us
+        _last_renew = now
+        frontier.renew()
+    if (host_scheduler.host_count() < n * 2 and len(host_scheduler) < SCHEDULER_CAPACITY
+            and (not len(host_scheduler) or now - _last_claim >= CLAIM_INTERVAL)):
+        _last_claim = now
+        for row in claim_pending(n * 4):
+            host_scheduler.push(row)
+    rows = []
+    while len(rows) < n:
+        row = host_scheduler.pop()
+        if row is None:
+            break
+        rows.append(row)
+    return rows
+
+def load_visited(snapshot_path=None):
+    """
+    Fill visited from the fingerprint snapshot plus crawled_urls rows added
+    since it was taken, or from a full scan when there is no snapshot. With
+    a shard, only URLs of its own hosts are read.
+    """
+    start = time()
+    snapshot_path = snapshot_path or state_path(VISITED_SNAPSHOT)
+    watermark = visited.load(snapshot_path)
+    in_shard, args = frontier.shard.sql_filter() if frontier.shard else ("", ())
+    conditions = [in_shard] if in_shard else []
+    if watermark is not None:
+        conditions.append("crawled_at >= %s")
+        args += (watermark - SNAPSHOT_MARGIN,)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    conn = get_pg_connection()
+    try:
+        cur = conn.cursor(name="visited_scan")  # server-side cursor: stream, don't fetchall
+        cur.execute(f"SELECT url FROM crawled_urls{where};", args)
+        added = 0
+        while True:
+            rows = cur.fetchmany(50000)
+            if not rows:
+                break
+            visited.update(u for (u,) in rows)
+            added += len(rows)
+        cur.close()
+        conn.commit()
+    finally:
+        release_pg_connection(conn)
+    visited.merge()
+    source = "full scan" if watermark is None else f"snapshot from {watermark:%Y-%m-%d %H:%M}"
+    logger.info(f"Loaded {len(visited)} visited URLs ({source}, {added} from DB) "
+                f"in {time() - start:.1f}s, {visited.nbytes() / 1e6:.1f} MB")
+
+def log_metrics():
+    """Log per-stage counts, latencies and queue depths every METRICS_LOG_INTERVAL seconds."""
+    while not shutdown_event.wait(METRICS_LOG_INTERVAL):
+        logger.info(f"Pipeline: {metrics.registry.summary()}")
+
+def start_metrics_server():
+    """Expose metrics over HTTP once per process (run_crawler may be called again from the GUI)."""
+    global _metrics_server
+    # Shards on one machine each take the next port
+    port = METRICS_PORT + frontier.shard.index if METRICS_PORT and frontier.shard else METRICS_PORT
+    if port and _metrics_server is None:
+        try:
+            _metrics_server = metrics.registry.serve(port)
+        except OSError as e:
+            logger.warning(f"Metrics endpoint not started on port {port}: {e}")
+
+def save_visited(snapshot_path=None):
+    snapshot_path = snapshot_path or state_path(VISITED_SNAPSHOT)
+    # Only the merge needs the lock; the merged array is never modified in place
+    with visited_lock:
+        watermark = datetime.now()
+        base = visited.fingerprints()
+    save_fingerprints(snapshot_path, base, watermark)
+    logger.info(f"Saved visited snapshot ({len(base)} URLs) to {snapshot_path}")
+
+def save_checkpoint():
+    """Snapshot visited and tag document frequencies, plus vetting verdicts, politeness slots and the lease owner."""
+    start = time()
+    save_visited()
+    tagger.save(state_path(DOC_FREQ_PATH))
+    path = state_path(CHECKPOINT_PATH)
+    if not path:
+        return
+    size = write_checkpoint(path, {
+        "owner": frontier.owner,
+        "vetting": domain_vetter.snapshot(),
+        "politeness": host_scheduler.state(),
+    })
+    logger.info(f"Checkpoint written to {path} ({size / 1e3:.0f} kB) in {time() - start:.1f}s")
+
+def restore_checkpoint(cur):
+    """
+    Restore the last checkpoint and hand back the previous process' leases.
+    Returns the time it was taken, from which the DB delta is read, or None.
+    """
+    state = read_checkpoint(state_path(CHECKPOINT_PATH)) if CHECKPOINT_PATH else None
+    if state is None:
+        return None
+    domain_vetter.restore(state["vetting"])
+    host_scheduler.restore(state["politeness"])
+    released = 0
+    owner = state["owner"]
+    # Our own owner string means a reused pid; nothing is leased yet this run
+    if owner == frontier.owner or not owner_alive(owner):
+        released = frontier.release_owner(cur, owner)
+    taken = saved_at(state)
+    logger.info(f"Restored checkpoint from {taken:%Y-%m-%d %H:%M:%S}: {len(state['vetting'])} vetted hosts, "
+                f"{len(state['politeness'])} politeness entries, {released} leases of {owner} released")
+    return taken
+
+def checkpoint_loop():
+    while not shutdown_event.wait(CHECKPOINT_INTERVAL):
+        try:
+            save_checkpoint()
+        except Exception as e:
+            logger.error(f"Checkpoint failed: {e}")
+
+def state_path(path):
+    """Where this process keeps a state file: tagged with the shard when crawling one of several."""
+    return shard_path(path, frontier.shard)
+
+def run_crawler(seed_urls, max_threads=2, engine=ENGINE_MODE, shard=SHARD):
+    """
+    Main entry point: ensure schema, seed URLs, and crawl until done. With
+    shard (a sharding.Shard or "index/count"), only that shard's hosts are
+    crawled; run one process per shard against the same database.
+    """
+    global write_journal
+    frontier.shard = Shard.parse(shard) if isinstance(shard, str) else shard
+    if frontier.shard:
+        logger.info(f"Crawling shard {frontier.shard} of the host ring")
     # Ensure tables exist and migrate schema
     conn = get_pg_connection()
     try:
         cur = conn.cursor()
         # Create tables
-        cur.execute("CREATE TABLE IF NOT EXISTS crawled_urls(url TEXT PRIMARY KEY);")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS crawled_urls(
+                url TEXT PRIMARY KEY,
+                crawled_at TIMESTAMP DEFAULT NOW()
+            );
+        """)
+        cur.execute("ALTER TABLE crawled_urls ADD COLUMN IF NOT EXISTS crawled_at TIMESTAMP DEFAULT NOW();")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_crawled_urls_crawled_at ON crawled_urls(crawled_at);")
+        cur.execute("ALTER TABLE crawled_urls ADD COLUMN IF NOT EXISTS host_point BIGINT;")
+        # Rows recorded before hosts were hashed; the partial index keeps this
+        # check from scanning the table on every start once they are done
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_crawled_urls_unhashed ON crawled_urls(url) "
+                    "WHERE host_point IS NULL;")
+        cur.execute(f"UPDATE crawled_urls SET host_point = {HOST_POINT_SQL.format(NETLOC_SQL)} "
+                    "WHERE host_point IS NULL;")
         cur.execute("""
             CREATE TABLE IF NOT EXISTS pending_urls(
                 url TEXT PRIMARY KEY,
@@ -341,12 +814,15 @@ def run_crawler(seed_urls, max_threads=2):
             logger.info("Adding depth column to pending_urls")
             cur.execute("ALTER TABLE pending_urls ADD COLUMN depth INTEGER DEFAULT 0;")
             cur.execute("UPDATE pending_urls SET depth = 0 WHERE depth IS NULL;")
+        frontier.ensure_schema(cur)
         cur.execute("""
             CREATE TABLE IF NOT EXISTS webpages(
                 title TEXT, url TEXT PRIMARY KEY, summary TEXT,
                 timestamp TIMESTAMP DEFAULT NOW()
             );
         """)
+        cur.execute("ALTER TABLE webpages ADD COLUMN IF NOT EXISTS content_hash TEXT;")
+        simhash_index.ensure_schema(cur)
         cur.execute("""
             CREATE TABLE IF NOT EXISTS tags(
                 url TEXT REFERENCES webpages(url), tag TEXT,
@@ -361,6 +837,16 @@ def run_crawler(seed_urls, max_threads=2):
         """)
         cur.execute("CREATE TABLE IF NOT EXISTS language(url TEXT PRIMARY KEY, language TEXT);")
         cur.execute("CREATE TABLE IF NOT EXISTS blocked_domains(domain TEXT PRIMARY KEY);")
+        robots_store.ensure_schema(cur)
+        domain_vetter.ensure_schema(cur)
+        sitemap_ingester.ensure_schema(cur)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS page_validators(
+                url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT,
+                body_hash TEXT, checked_at TIMESTAMP DEFAULT NOW()
+            );
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_page_validators_checked ON page_validators(checked_at);")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_webpages_timestamp ON webpages(timestamp);")
         conn.commit()
     except Exception as e:
@@ -370,20 +856,28 @@ def run_crawler(seed_urls, max_threads=2):
         cur.close()
         release_pg_connection(conn)
 
-    # Start DB worker
+    # Start DB worker (replaying writes spilled by an earlier run) and background ToS vetting
+    if WRITE_SPILL_JOURNAL and write_journal is None:
+        write_journal = WriteJournal(state_path(WRITE_SPILL_JOURNAL))
+        if write_journal.pending():
+            logger.info(f"{write_journal.pending()} spilled writes from a previous run will be replayed")
     dbw = DBWorker()
     dbw.start()
-
-    # Preload visited URLs and blocked domains
+    domain_vetter.start()
+    if FOLLOW_SITEMAPS:
+        sitemap_ingester.start()
+
+    # Preload visited URLs (snapshot + delta), tag document frequencies,
+    # then the checkpoint plus vetting verdicts newer than it
+    load_visited()
+    # A new shard starts from the unsharded table (e.g. one built by scripts/retag.py)
+    if tagger.load(state_path(DOC_FREQ_PATH)) or tagger.load(DOC_FREQ_PATH):
+        logger.info(f"Loaded tag document frequencies for {tagger.doc_freq.docs} pages")
     conn = get_pg_connection()
     try:
         cur = conn.cursor()
-        cur.execute("SELECT url FROM crawled_urls;")
-        for (u,) in cur.fetchall():
-            visited.add(u)
-        cur.execute("SELECT domain FROM blocked_domains;")
-        for (d,) in cur.fetchall():
-            blocked_domains.add(d)
+        taken = restore_checkpoint(cur)
+        domain_vetter.load(cur, since=taken - SNAPSHOT_MARGIN if taken else None)
         conn.commit()
     finally:
         cur.close()
@@ -396,55 +890,44 @@ def run_crawler(seed_urls, max_threads=2):
         cur.execute("SELECT COUNT(*) FROM pending_urls;")
         count = cur.fetchone()[0]
         if count == 0:
-            for s in seed_urls:
-                cur.execute(
-                    "INSERT INTO pending_urls(url, depth) VALUES (%s, %s) ON CONFLICT DO NOTHING;",
-                    (s, 0)
-                )
+            frontier.enqueue(cur, [(canonicalize(s), 0) for s in seed_urls])
             conn.commit()
             logger.info(f"Seeded {len(seed_urls)} initial URLs.")
+        recrawl = frontier.enqueue_recrawl(cur, RECRAWL_AFTER, RECRAWL_BATCH)
+        conn.commit()
+        if recrawl:
+            logger.info(f"Queued {recrawl} stale pages for conditional recrawl.")
     finally:
         cur.close()
         release_pg_connection(conn)
 
-    batch = 1
-    while not shutdown_event.is_set():
-        # Fetch and delete batch
-        conn = get_pg_connection()
-        try:
-            cur = conn.cursor()
-            cur.execute("SELECT url, depth FROM pending_urls LIMIT %s;", (max_threads,))
-            rows = cur.fetchall()
-            if not rows:
-                logger.info("Pending queue empty. Crawl complete.")
-                break
+    parse_stage.start()
+    threading.Thread(target=log_metrics, daemon=True).start()
+    threading.Thread(target=checkpoint_loop, name="Checkpoint", daemon=True).start()
+    start_metrics_server()
 
-            urls = [(u, d) for (u, d) in rows]
-            for u, _ in urls:
-                cur.execute("DELETE FROM pending_urls WHERE url = %s;", (u,))
-            conn.commit()
-        finally:
-            cur.close()
-            release_pg_connection(conn)
+    if engine == "stream":
+        run_streaming(next_ready, partial(crawl_url, scheduled=True), max_threads,
+                      shutdown_event, idle=settle, prefetch=1,
+                      retry_after=retry_after)
+    else:
+        run_batched(claim_settled, crawl_url, max_threads, shutdown_event)
 
-        logger.info(f"Batch {batch}: {len(urls)} URLs")
-        for u, _ in urls:
-            logger.info(f"    → {u}")
-        batch += 1
-
-        # Crawl in parallel
-        with ThreadPoolExecutor(max_workers=max_threads) as executor:
-            futures = {executor.submit(crawl_url, u, d): u for u, d in urls}
-            for fut in futures:
-                u = futures[fut]
-                try:
-                    fut.result()
-                except Exception as e:
-                    logger.error(f"Error on {u}: {e}")
+    # Hand back leases of URLs still waiting on politeness
+    for url, *_ in host_scheduler.drain():
+        submit_write("release_pending", url)
 
     # Shutdown
+    parse_stage.stop()
+    logger.info(f"Pipeline: {metrics.registry.summary()}")
+    domain_vetter.stop()
+    sitemap_ingester.stop()
     write_queue.put(_SENTINEL)
     dbw.join(timeout=30)
+    try:
+        save_checkpoint()
+    except Exception as e:
+        logger.error(f"Failed to save checkpoint: {e}")
     global_session.close()
     db_pool.closeall()
     logger.info("DBWorker done, exiting.")
@@ -3,14 +3,17 @@
 database.py
 
 PostgreSQL database utilities for the DarkNetCrawler.
-Handles schema setup, page saving, and deduplication.
+Handles schema setup, page saving, and deduplication. Near-duplicate
+lookups go through the simhash_bands index (see simhash_index.py).
 """
 
 import logging
 import psycopg2
+from psycopg2.extras import execute_values
 from psycopg2.pool import ThreadedConnectionPool
-from simhash import Simhash
 from urllib.parse import urlparse
+from simhash_index import PgSimhashIndex, SimhashIndex
+from page_simhash import simhash
 from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASS
 
 # Logger setup
@@ -22,6 +25,8 @@ logger = logging.getLogger(__name__)
 db_pool = ThreadedConnectionPool(1, 5, host=DB_HOST, port=DB_PORT,
                                  dbname=DB_NAME, user=DB_USER, password=DB_PASS)
 
+simhash_index = PgSimhashIndex()
+
 def get_connection():
     """Return a connection from the pool."""
     return db_pool.getconn()
@@ -39,22 +44,23 @@ def normalize_url_path(url):
     parsed = urlparse(url)
     return parsed.path.rstrip('/')
 
-def save_page(conn, title: str, url: str, summary: str, tags: list, images: list):
+def save_page(conn, title: str, url: str, summary: str, tags: list, images: list, text: str = None):
     """
     Inserts a page into webpages, tags, and images tables, skipping duplicates
-    based on Simhash and URL path.
+    based on Simhash and URL path. The fingerprint covers the page's full
+    text when given, otherwise the summary; content_hash holds it as a
+    decimal string.
     """
-    content_hash = str(Simhash(summary))
+    fingerprint = simhash(text or summary)
+    content_hash = str(fingerprint)
     cur = conn.cursor()
     try:
-        # Check for duplicates
-        cur.execute("SELECT url, content_hash FROM webpages WHERE content_hash IS NOT NULL;")
-        for existing_url, existing_hash in cur.fetchall():
-            if existing_hash and normalize_url_path(existing_url) == normalize_url_path(url):
-                distance = Simhash(existing_hash).distance(Simhash(content_hash))
-                if distance <= 3:
-                    logger.info(f"Skipped duplicate page: {url} (hash distance {distance})")
-                    return
+        # Check for duplicates among the pages sharing a fingerprint band
+        path = normalize_url_path(url)
+        for existing_url, distance in simhash_index.near(cur, fingerprint):
+            if normalize_url_path(existing_url) == path:
+                logger.info(f"Skipped duplicate page: {url} (hash distance {distance})")
+                return
 
         # Insert page
         cur.execute(
@@ -67,6 +73,7 @@ def save_page(conn, title: str, url: str, summary: str, tags: list, images: list
             (title, url, summary, content_hash)
         )
         if cur.fetchone():  # Insert succeeded
+            simhash_index.add(cur, url, fingerprint)
             logger.info(f"Stored page: {url} ({title})")
         else:
             logger.info(f"Skipped page due to URL conflict: {url}")
@@ -96,6 +103,69 @@ def save_page(conn, title: str, url: str, summary: str, tags: list, images: list
     finally:
         cur.close()
 
+def save_pages(conn, pages) -> int:
+    """
+    Batch version of save_page for (title, url, summary, tags, images, text)
+    tuples, in one transaction. Applies the same near-duplicate rule against
+    stored pages and earlier pages of the batch. Returns the number stored.
+    Unlike save_page, a failed batch is rolled back and the error re-raised,
+    so the caller can keep the pages and retry.
+    """
+    batch_index = SimhashIndex()
+    rows, prints, tag_rows, image_rows = [], {}, [], []
+    cur = conn.cursor()
+    try:
+        for title, url, summary, tags, images, text in pages:
+            fingerprint = simhash(text or summary)
+            path = normalize_url_path(url)
+            near = simhash_index.near(cur, fingerprint) + batch_index.near(fingerprint)
+            duplicate = next((u for u, _ in near if normalize_url_path(u) == path), None)
+            if duplicate is not None:
+                logger.info(f"Skipped duplicate page: {url} (near {duplicate})")
+                continue
+            batch_index.add(url, fingerprint)
+            rows.append((title, url, summary, str(fingerprint)))
+            prints[url] = fingerprint
+            tag_rows.extend((url, tag) for tag in tags)
+            image_rows.extend((url, image) for image in images)
+        if not rows:
+            return 0
+
+        stored = execute_values(
+            cur,
+            """
+            INSERT INTO webpages (title, url, summary, content_hash, timestamp)
+            VALUES %s
+            ON CONFLICT (url) DO NOTHING
+            RETURNING url;
+            """,
+            rows, template="(%s, %s, %s, %s, NOW())", page_size=len(rows), fetch=True
+        )
+        stored = {url for url, in stored}
+        if stored:
+            simhash_index.add_many(cur, [(url, prints[url]) for url in stored])
+        if tag_rows:
+            execute_values(
+                cur,
+                "INSERT INTO tags (url, tag) VALUES %s ON CONFLICT DO NOTHING;",
+                tag_rows, page_size=len(tag_rows)
+            )
+        if image_rows:
+            execute_values(
+                cur,
+                "INSERT INTO images (url, image_url) VALUES %s ON CONFLICT DO NOTHING;",
+                image_rows, page_size=len(image_rows)
+            )
+        conn.commit()
+        logger.info(f"Stored {len(stored)} of {len(rows)} pages in a batch")
+        return len(stored)
+    except Exception as e:
+        logger.error(f"Error saving a batch of {len(rows)} pages: {e}")
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
 def page_exists(conn, url: str) -> bool:
     """Returns True if the URL is in crawled_urls."""
     cur = conn.cursor()
@@ -111,7 +181,13 @@ def setup_schema():
     try:
         cur = conn.cursor()
         # Create tables
-        cur.execute("CREATE TABLE IF NOT EXISTS crawled_urls(url TEXT PRIMARY KEY);")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS crawled_urls(
+                url TEXT PRIMARY KEY,
+                crawled_at TIMESTAMP DEFAULT NOW()
+            );
+        """)
+        cur.execute("ALTER TABLE crawled_urls ADD COLUMN IF NOT EXISTS crawled_at TIMESTAMP DEFAULT NOW();")
         cur.execute("""
             CREATE TABLE IF NOT EXISTS pending_urls(
                 url TEXT PRIMARY KEY,
@@ -140,6 +216,7 @@ def setup_schema():
                 ) STORED
             );
         """)
+        cur.execute("ALTER TABLE webpages ADD COLUMN IF NOT EXISTS content_hash TEXT;")
         cur.execute("""
             CREATE TABLE IF NOT EXISTS tags(
                 url TEXT REFERENCES webpages(url),
@@ -161,6 +238,7 @@ def setup_schema():
             );
         """)
         cur.execute("CREATE TABLE IF NOT EXISTS blocked_domains(domain TEXT PRIMARY KEY);")
+        simhash_index.ensure_schema(cur)
         # Indexes
         cur.execute("CREATE INDEX IF NOT EXISTS idx_webpages_timestamp ON webpages(timestamp);")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_webpages_tsv ON webpages USING GIN(tsv);")
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+dns_cache.py
+
+In-process DNS cache for the crawler's HTTP connections.
+
+DNSCache.install() routes urllib3's socket creation through the cache, so
+every requests Session in the process resolves a host at most once per TTL.
+Failed lookups are cached for a shorter negative TTL, which keeps dead
+domains from costing a full resolver timeout on every URL. Lookups for one
+host are single-flight, prefetch() resolves newly discovered hosts on a
+small thread pool ahead of their first fetch, and static overrides pin a
+host to fixed addresses (e.g. to point virtual hosts at a local server);
+an override key starting with "." matches every host under that suffix.
+
+Only name resolution changes: TLS SNI and certificate checks still use the
+original hostname, which urllib3 keeps separately from the socket.
+"""
+
+import ipaddress
+import logging
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import time, perf_counter
+
+from urllib3.util import connection
+
+logger = logging.getLogger(__name__)
+
+DNS_TTL = 300  # Seconds a successful lookup is reused
+DNS_NEGATIVE_TTL = 120  # Seconds a failed lookup is remembered
+DNS_MAX_ENTRIES = 200000  # Cache is cleared when it grows past this
+DNS_PREFETCH_WORKERS = 8
+DNS_PREFETCH_BACKLOG = 1000  # Prefetches queued beyond this are dropped
+
+class DNSCache:
+    """TTL'd, single-flight cache of host -> IP addresses."""
+
+    def __init__(self, ttl=DNS_TTL, negative_ttl=DNS_NEGATIVE_TTL, max_entries=DNS_MAX_ENTRIES,
+                 prefetch_workers=DNS_PREFETCH_WORKERS, overrides=None, observe=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.prefetch_workers = prefetch_workers
+        self.overrides = {h.lower(): tuple(ips) for h, ips in (overrides or {}).items()}
+        self.observe = observe  # Called with the seconds each real lookup took
+        self._lock = threading.Lock()
+        self._entries = {}   # host -> (ips or gaierror, expires_at)
+        self._inflight = {}  # host -> Event set when its lookup finishes
+        self._executor = None
+        self._queued = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.prefetches = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, host):
+        """Return a tuple of IP addresses for host or raise socket.gaierror (possibly cached)."""
+        host = host.lower().rstrip(".")
+        if host in self.overrides:
+            return self.overrides[host]
+        for suffix, ips in self.overrides.items():
+            if suffix.startswith(".") and host.endswith(suffix):
+                return ips
+        try:
+            ipaddress.ip_address(host.strip("[]"))
+            return (host.strip("[]"),)
+        except ValueError:
+            pass
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(host)
+                if entry and entry[1] > time():
+                    if isinstance(entry[0], socket.gaierror):
+                        self.negative_hits += 1
+                        raise entry[0]
+                    self.hits += 1
+                    return entry[0]
+                event = self._inflight.get(host)
+                if event is None:
+                    event = self._inflight[host] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another thread is already resolving this host
+            event.wait(30)
+
+        try:
+            result = self._resolve(host)
+            with self._lock:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                ttl = self.negative_ttl if isinstance(result, socket.gaierror) else self.ttl
+                self._entries[host] = (result, time() + ttl)
+        finally:
+            with self._lock:
+                del self._inflight[host]
+            event.set()
+        if isinstance(result, socket.gaierror):
+            raise result
+        return result
+
+    def _resolve(self, host):
+        start = perf_counter()
+        try:
+            infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+            ips = tuple(dict.fromkeys(info[4][0] for info in infos))
+            if not ips:
+                raise socket.gaierror(socket.EAI_NONAME, "no addresses")
+            return ips
+        except socket.gaierror as e:
+            self.failures += 1
+            return e
+        except (UnicodeError, OSError) as e:
+            self.failures += 1
+            return socket.gaierror(socket.EAI_FAIL, str(e))
+        finally:
+            if self.observe is not None:
+                self.observe(perf_counter() - start)
+
+    def cached(self, host):
+        entry = self._entries.get(host.lower().rstrip("."))
+        return entry is not None and entry[1] > time()
+
+    def prefetch(self, host):
+        """Resolve host in the background unless it is cached, in flight or the backlog is full."""
+        if not host or self.cached(host) or host in self._inflight:
+            return
+        with self._lock:
+            if self._queued >= DNS_PREFETCH_BACKLOG:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.prefetch_workers, thread_name_prefix="DNS")
+            self._queued += 1
+        self.prefetches += 1
+        self._executor.submit(self._prefetch, host)
+
+    def _prefetch(self, host):
+        try:
+            self.lookup(host)
+        except socket.gaierror:
+            pass
+        finally:
+            with self._lock:
+                self._queued -= 1
+
+    def hit_rate(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        return (self.hits + self.negative_hits) / lookups if lookups else 0.0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def install(self):
+        """Route urllib3.util.connection.create_connection through this cache."""
+        create = connection.create_connection
+
+        def cached_create_connection(address, *args, **kwargs):
+            host, port = address
+            last_error = None
+            for ip in self.lookup(host):
+                try:
+                    return create((ip, port), *args, **kwargs)
+                except OSError as e:
+                    last_error = e
+            raise last_error
+
+        connection.create_connection = cached_create_connection
+        return self
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+engine.py
+
+Scheduling loops that feed URLs from the frontier to crawl workers.
+
+Both loops take the same callables so crawler.py can switch between them:
+  next_batch(n) -> list of argument tuples (e.g. (url, depth)), [] when empty
+  work(*row)    -> crawls one row; exceptions are logged, not raised
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+def run_batched(next_batch, work, max_threads, stop_event):
+    """
+    Original loop: claim max_threads rows, crawl them in a fresh pool and wait
+    for the whole batch before claiming the next one.
+    Returns the number of rows processed.
+    """
+    processed = 0
+    batch = 1
+    while not stop_event.is_set():
+        rows = next_batch(max_threads)
+        if not rows:
+            logger.info("Pending queue empty. Crawl complete.")
+            break
+
+        logger.info(f"Batch {batch}: {len(rows)} URLs")
+        for row in rows:
+            logger.info(f"    → {row[0]}")
+        batch += 1
+
+        with ThreadPoolExecutor(max_workers=max_threads) as executor:
+            futures = {executor.submit(work, *row): row for row in rows}
+            for fut in futures:
+                try:
+                    fut.result()
+                except Exception as e:
+                    logger.error(f"Error on {futures[fut][0]}: {e}")
+                processed += 1
+    return processed
+
+def run_streaming(next_batch, work, max_threads, stop_event, idle=None, prefetch=2,
+                  retry_after=None):
+    """
+    Continuous loop: one long-lived pool with max_threads fetches in flight at
+    all times. A slow URL only occupies its own slot; every completion is
+    immediately replaced from a local buffer refilled from the frontier.
+    prefetch=1 keeps no buffer, so rows are only taken when a slot is free.
+
+    idle, if given, is called once the frontier and all slots are empty (e.g.
+    to flush pending DB writes) before the frontier is polled a final time.
+    retry_after, if given, returns the seconds until next_batch may yield rows
+    that are queued but not yet ready (politeness), or None if none are queued.
+    Returns the number of rows processed.
+    """
+    processed = 0
+    buffer = []
+    in_flight = {}
+    drained = False
+
+    with ThreadPoolExecutor(max_workers=max_threads) as executor:
+        while not stop_event.is_set():
+            want = max_threads * prefetch - len(buffer) - len(in_flight)
+            if want > 0:
+                rows = next_batch(want)
+                if rows:
+                    buffer.extend(rows)
+                    drained = False
+
+            while buffer and len(in_flight) < max_threads:
+                row = buffer.pop(0)
+                logger.info(f"    → {row[0]}")
+                in_flight[executor.submit(work, *row)] = row
+
+            delay = retry_after() if retry_after else None
+            if not in_flight:
+                if delay is not None:
+                    stop_event.wait(min(delay, 1.0))
+                    continue
+                if drained or idle is None:
+                    logger.info("Pending queue empty. Crawl complete.")
+                    break
+                idle()
+                drained = True
+                continue
+
+            timeout = 1.0 if delay is None else min(max(delay, 0.01), 1.0)
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                row = in_flight.pop(fut)
+                try:
+                    fut.result()
+                except Exception as e:
+                    logger.error(f"Error on {row[0]}: {e}")
+                processed += 1
+
+        # Let whatever is already running finish before the pool shuts down.
+        for fut in list(in_flight):
+            try:
+                fut.result()
+            except Exception as e:
+                logger.error(f"Error on {in_flight[fut][0]}: {e}")
+    return processed
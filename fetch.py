@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+fetch.py
+
+Streaming page downloads for the crawler.
+
+fetch_page() requests the body with stream=True and looks at the status,
+Content-Type and Content-Length before reading anything, so images, videos,
+archives and oversized files are dropped without being downloaded. Accepted
+bodies are read in chunks up to max_bytes (and max_seconds), which bounds
+memory per thread even for endless chunked responses; a body cut at the cap
+is returned truncated, which lxml parses without complaint.
+
+decode_body() turns those bytes into text with CharsetDecoder, which only
+falls back to statistical detection on a bounded prefix and caches the
+result per host.
+"""
+
+import codecs
+import logging
+import re
+from collections import Counter
+from time import monotonic
+
+from urllib3.util import connection
+
+try:
+    from charset_normalizer import from_bytes
+except ImportError:  # pragma: no cover - shipped with requests
+    from_bytes = None
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_BYTES = 2 * 1024 * 1024  # Body bytes kept per page
+MAX_FETCH_SECONDS = 30  # Wall-clock cap on reading one body
+CHUNK_SIZE = 64 * 1024
+SNIFF_BYTES = 4096  # Prefix searched for a <meta charset> declaration
+DETECT_BYTES = 16 * 1024  # Prefix handed to the statistical detector
+HOST_CHARSET_CACHE = 100000  # Hosts whose last detected charset is remembered
+
+HTML_TYPES = frozenset({"text/html", "application/xhtml+xml"})
+# XML feeds and sitemaps are followed for links by crawler.py
+PAGE_TYPES = HTML_TYPES | {"application/xml", "text/xml", "application/rss+xml", "application/atom+xml"}
+
+_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+_META_CHARSET = re.compile(rb'<meta[^>]{0,200}?charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+_XML_ENCODING = re.compile(rb'<\?xml[^>]{0,100}?encoding\s*=\s*["\']([\w.:-]+)')
+_BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+
+def media_type(content_type):
+    """'text/html; charset=utf-8' -> 'text/html'."""
+    return (content_type or "").split(";", 1)[0].strip().lower()
+
+def header_charset(content_type):
+    """Charset named in a Content-Type header, or None."""
+    m = _CHARSET.search(content_type or "")
+    return m.group(1) if m else None
+
+def fetch_page(session, url, max_bytes=MAX_PAGE_BYTES, accept=PAGE_TYPES,
+               max_seconds=MAX_FETCH_SECONDS, **kwargs):
+    """
+    GET url through session (a requests.Session or the requests module).
+
+    Returns (response, body). body is the raw bytes of the page, at most
+    max_bytes of them, or None when the status is not 200, the Content-Type
+    is not in accept, or Content-Length already exceeds max_bytes. The
+    response is always closed; its status and headers stay readable.
+    Extra keyword arguments (headers, verify, timeout...) go to session.get.
+    """
+    kwargs.setdefault("timeout", 10)
+    r = session.get(url, stream=True, **kwargs)
+    try:
+        if r.status_code != 200:
+            return r, None
+
+        ctype = media_type(r.headers.get("Content-Type"))
+        if ctype and ctype not in accept:
+            logger.info(f"Skipping {ctype} content: {url}")
+            return r, None
+
+        length = r.headers.get("Content-Length", "")
+        if length.isdigit() and int(length) > max_bytes:
+            logger.info(f"Skipping {length}-byte body over the {max_bytes}-byte cap: {url}")
+            return r, None
+
+        body = bytearray()
+        deadline = monotonic() + max_seconds
+        for chunk in r.iter_content(CHUNK_SIZE):
+            body += chunk
+            if len(body) >= max_bytes:
+                del body[max_bytes:]
+                logger.info(f"Truncated body at {max_bytes} bytes: {url}")
+                break
+            if monotonic() > deadline:
+                logger.info(f"Truncated body after {max_seconds}s: {url}")
+                break
+        return r, bytes(body)
+    finally:
+        r.close()
+
+def time_connections(stage):
+    """
+    Time every new socket urllib3 opens (DNS lookup plus TCP connect) with
+    stage, a metrics.Stage. Reused keep-alive connections are not counted.
+    """
+    create = connection.create_connection
+
+    def timed_create_connection(*args, **kwargs):
+        with stage.time():
+            return create(*args, **kwargs)
+
+    connection.create_connection = timed_create_connection
+
+class CharsetDecoder:
+    """
+    Turns page bytes into str without running a detector over the whole body.
+
+    The charset comes from, in order: the Content-Type header, a BOM, a
+    <meta charset>/<meta http-equiv>/<?xml encoding> declaration in the first
+    SNIFF_BYTES, a strict UTF-8 decode, the charset last detected for the
+    same host, and finally charset_normalizer over the first DETECT_BYTES.
+    stats counts how each page was resolved.
+    """
+
+    def __init__(self, max_hosts=HOST_CHARSET_CACHE):
+        self.max_hosts = max_hosts
+        self._hosts = {}
+        self.stats = Counter()
+
+    def charset(self, body, content_type=None, host=None):
+        """Return (charset, source) for body; charset is None only for undecodable input."""
+        charset = header_charset(content_type)
+        if charset and _known(charset):
+            return charset, "header"
+
+        for bom, name in _BOMS:
+            if body.startswith(bom):
+                return name, "bom"
+
+        head = body[:SNIFF_BYTES]
+        m = _META_CHARSET.search(head) or _XML_ENCODING.match(head)
+        if m:
+            charset = m.group(1).decode("ascii")
+            if _known(charset):
+                self._remember(host, charset)
+                return charset, "meta"
+
+        try:
+            # final=False tolerates a character split by the size cap
+            codecs.getincrementaldecoder("utf-8")().decode(body, final=False)
+            return "utf-8", "utf-8"
+        except UnicodeDecodeError:
+            pass
+
+        charset = self._hosts.get(host)
+        if charset:
+            try:
+                body.decode(charset)
+                return charset, "host"
+            except UnicodeDecodeError:
+                pass
+
+        charset = _detect(body[:DETECT_BYTES])
+        if charset:
+            self._remember(host, charset)
+            return charset, "detected"
+        return None, "fallback"
+
+    def decode(self, body, content_type=None, host=None):
+        charset, source = self.charset(body, content_type, host)
+        self.stats[source] += 1
+        return body.decode(charset or "utf-8", errors="replace")
+
+    def _remember(self, host, charset):
+        if host is None or codecs.lookup(charset).name in ("ascii", "utf-8"):
+            return
+        if len(self._hosts) >= self.max_hosts:
+            self._hosts.clear()
+        self._hosts[host] = charset
+
+def _known(charset):
+    try:
+        codecs.lookup(charset)
+        return True
+    except LookupError:
+        return False
+
+def _detect(prefix):
+    if from_bytes is None:
+        return None
+    match = from_bytes(prefix).best()
+    return match.encoding if match else None
+
+charset_decoder = CharsetDecoder()
+
+def decode_body(body, content_type, host=None):
+    """Text of a page body; see CharsetDecoder."""
+    return charset_decoder.decode(body, content_type, host)
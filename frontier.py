@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+frontier.py
+
+Multi-process-safe crawl frontier over the pending_urls table.
+
+Rows are claimed with FOR UPDATE SKIP LOCKED and leased to one crawler
+process instead of being deleted up front: a claimed row stays in
+pending_urls with leased_until/lease_owner set until the crawl completes
+(complete() deletes it) or is handed back (release()). If a process dies,
+its leases simply expire and the rows become claimable again, or are
+handed back right away by release_owner() when it restarts from a checkpoint.
+
+Claims are ordered by (priority, depth) through an index. priority is
+assigned at enqueue time as the next number in a per-host sequence, so
+every host's first link comes before any host's second one and a single
+large site cannot monopolise the crawl. The sequence of a host starts
+after its highest priority already in pending_urls, so it carries over
+restarts and reshards, and for the same reason the sequences of hosts not
+enqueued for a while can be dropped from memory (HOST_SEQ_MAX_HOSTS).
+
+With a sharding.Shard, claim() only takes rows whose host_point (the
+host's consistent-hash point, set at enqueue time) lies in that shard's
+ranges, so several crawler processes split the hosts between them.
+"""
+
+import os
+import socket
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from psycopg2.extras import execute_values
+
+from sharding import HOST_POINT_SQL, NETLOC_SQL, host_point
+
+LEASE_SECONDS = 600  # A claimed row becomes claimable again after this long without renewal
+HOST_SEQ_MAX_HOSTS = 100000  # Host sequences kept in memory; dropped ones are re-seeded from pending_urls
+
+class Frontier:
+    """Claims, leases, completes and enqueues rows of pending_urls."""
+
+    def __init__(self, get_conn, release_conn, owner=None, lease_seconds=LEASE_SECONDS, shard=None):
+        self.get_conn = get_conn
+        self.release_conn = release_conn
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.shard = shard  # sharding.Shard whose hosts this process claims; None claims every row
+        self._host_seq = OrderedDict()  # host -> next priority, least recently enqueued first
+        self._seq_lock = threading.Lock()  # DBWorker and sitemap threads enqueue concurrently
+
+    def owns(self, host):
+        """True if this process crawls host (always without a shard)."""
+        return self.shard is None or self.shard.owns(host)
+
+    def ensure_schema(self, cur):
+        cur.execute("ALTER TABLE pending_urls ADD COLUMN IF NOT EXISTS host TEXT;")
+        cur.execute("ALTER TABLE pending_urls ADD COLUMN IF NOT EXISTS priority INTEGER DEFAULT 0;")
+        cur.execute("ALTER TABLE pending_urls ADD COLUMN IF NOT EXISTS leased_until TIMESTAMP;")
+        cur.execute("ALTER TABLE pending_urls ADD COLUMN IF NOT EXISTS lease_owner TEXT;")
+        cur.execute("ALTER TABLE pending_urls ADD COLUMN IF NOT EXISTS host_point BIGINT;")
+        cur.execute("ALTER TABLE pending_urls ADD COLUMN IF NOT EXISTS defer_count INTEGER DEFAULT 0;")
+        # Rows queued before hosts were hashed; the partial index keeps this
+        # check from scanning the table on every start once they are done
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_pending_urls_unhashed ON pending_urls(url) "
+                    "WHERE host_point IS NULL;")
+        cur.execute(f"""
+            UPDATE pending_urls
+            SET host = COALESCE(host, {NETLOC_SQL}),
+                host_point = {HOST_POINT_SQL.format(f"COALESCE(host, {NETLOC_SQL})")}
+            WHERE host_point IS NULL;
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_pending_urls_claim ON pending_urls(priority, depth);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_pending_urls_owner ON pending_urls(lease_owner);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_pending_urls_host_point ON pending_urls(host_point);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_pending_urls_host ON pending_urls(host, priority);")
+        # Only deferred rows are unowned with a lease time
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_pending_urls_deferred ON pending_urls(leased_until)
+            WHERE lease_owner IS NULL AND leased_until IS NOT NULL;
+        """)
+
+    def claim(self, n):
+        """
+        Lease up to n claimable rows to this process and return them as
+        (url, depth, validators); validators is (etag, last_modified, body_hash)
+        from page_validators for a recrawl, or None for a first visit.
+        """
+        in_shard, shard_args = self.shard.sql_filter() if self.shard else ("", ())
+        if in_shard:
+            in_shard = " AND " + in_shard
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                f"""
+                UPDATE pending_urls p
+                SET leased_until = NOW() + make_interval(secs => %s), lease_owner = %s
+                FROM (
+                    SELECT url FROM pending_urls
+                    WHERE (leased_until IS NULL OR leased_until < NOW()){in_shard}
+                    ORDER BY priority, depth
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ) c
+                LEFT JOIN page_validators v ON v.url = c.url
+                WHERE p.url = c.url
+                RETURNING p.url, p.depth, v.url IS NOT NULL, v.etag, v.last_modified, v.body_hash;
+                """,
+                (self.lease_seconds, self.owner, *shard_args, n)
+            )
+            rows = [(url, depth, (etag, modified, body_hash) if known else None)
+                    for url, depth, known, etag, modified, body_hash in cur.fetchall()]
+            conn.commit()
+            cur.close()
+            return rows
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_conn(conn)
+
+    def renew(self):
+        """Extend every lease held by this process (rows waiting in memory)."""
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                UPDATE pending_urls SET leased_until = NOW() + make_interval(secs => %s)
+                WHERE lease_owner = %s;
+                """,
+                (self.lease_seconds, self.owner)
+            )
+            renewed = cur.rowcount
+            conn.commit()
+            cur.close()
+            return renewed
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_conn(conn)
+
+    def complete(self, cur, urls):
+        """Remove finished rows."""
+        cur.execute("DELETE FROM pending_urls WHERE url = ANY(%s);", (list(urls),))
+
+    def release(self, cur, urls):
+        """Hand leased rows back without crawling them."""
+        cur.execute(
+            """
+            UPDATE pending_urls SET leased_until = NULL, lease_owner = NULL
+            WHERE url = ANY(%s) AND lease_owner = %s;
+            """,
+            (list(urls), self.owner)
+        )
+
+    def defer(self, cur, urls, seconds, max_seconds):
+        """
+        Hand leased rows back, claimable again only after a delay (e.g. while
+        their host is vetted): seconds the first time, doubling with every
+        further deferral of the same row up to max_seconds.
+        """
+        cur.execute(
+            """
+            UPDATE pending_urls
+            SET leased_until = NOW() + make_interval(secs => LEAST(%s * power(2, COALESCE(defer_count, 0)), %s)),
+                lease_owner = NULL, defer_count = COALESCE(defer_count, 0) + 1
+            WHERE url = ANY(%s) AND lease_owner = %s;
+            """,
+            (seconds, max_seconds, list(urls), self.owner)
+        )
+
+    def deferred_wait(self):
+        """
+        Seconds until the soonest deferred row of this shard is claimable
+        again (0 if one already is), or None if no row is deferred.
+        """
+        in_shard, shard_args = self.shard.sql_filter() if self.shard else ("", ())
+        if in_shard:
+            in_shard = " AND " + in_shard
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                f"""
+                SELECT EXTRACT(EPOCH FROM MIN(leased_until) - NOW()) FROM pending_urls
+                WHERE lease_owner IS NULL AND leased_until IS NOT NULL{in_shard};
+                """,
+                shard_args
+            )
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+        finally:
+            self.release_conn(conn)
+        if row is None or row[0] is None:
+            return None
+        return max(0.0, float(row[0]))
+
+    def release_owner(self, cur, owner):
+        """Hand back every lease of a previous process instead of waiting for them to expire."""
+        cur.execute(
+            """
+            UPDATE pending_urls SET leased_until = NULL, lease_owner = NULL
+            WHERE lease_owner = %s;
+            """,
+            (owner,)
+        )
+        return cur.rowcount
+
+    def enqueue_recrawl(self, cur, older_than, limit):
+        """Queue up to limit stored pages not checked since older_than for a conditional recrawl."""
+        cur.execute(
+            f"""
+            INSERT INTO pending_urls(url, depth, host, priority, host_point)
+            SELECT url, 0, {NETLOC_SQL}, 0, {HOST_POINT_SQL.format(NETLOC_SQL)}
+            FROM page_validators
+            WHERE checked_at < NOW() - make_interval(secs => %s)
+            ORDER BY checked_at
+            LIMIT %s
+            ON CONFLICT DO NOTHING;
+            """,
+            (older_than.total_seconds(), limit)
+        )
+        return cur.rowcount
+
+    def enqueue_rows(self, payloads):
+        """
+        Turn (url, depth) or (url, depth, priority) payloads into
+        (url, depth, host, priority, host_point) rows, one per URL.
+        """
+        rows = {}
+        for payload in payloads:
+            url, depth = payload[0], payload[1]
+            if url in rows:
+                continue
+            host = urlparse(url).netloc
+            if len(payload) > 2:
+                priority = payload[2]
+            else:
+                priority = self._host_seq.get(host, 0)
+                self._host_seq[host] = priority + 1
+                self._host_seq.move_to_end(host)
+            rows[url] = (url, depth, host, priority, host_point(host))
+        return list(rows.values())
+
+    def seed_host_seq(self, cur, hosts):
+        """
+        Continue the sequence of hosts not seen since this process started
+        after their highest queued priority, so a restart or reshard does
+        not put new links ahead of the ones already waiting.
+        """
+        hosts = [h for h in set(hosts) if h not in self._host_seq]
+        if not hosts:
+            return
+        cur.execute(
+            "SELECT host, MAX(priority) FROM pending_urls WHERE host = ANY(%s) GROUP BY host;",
+            (hosts,)
+        )
+        queued = dict(cur.fetchall())
+        for host in hosts:
+            queued_max = queued.get(host)
+            self._host_seq[host] = 0 if queued_max is None else queued_max + 1
+
+    def enqueue(self, cur, payloads):
+        with self._seq_lock:
+            self.seed_host_seq(cur, (urlparse(p[0]).netloc for p in payloads if len(p) == 2))
+            rows = self.enqueue_rows(payloads)
+            # Trimmed only after the batch, so none of its hosts loses its seed midway
+            while len(self._host_seq) > HOST_SEQ_MAX_HOSTS:
+                self._host_seq.popitem(last=False)
+        if rows:
+            execute_values(
+                cur,
+                """
+                INSERT INTO pending_urls(url, depth, host, priority, host_point) VALUES %s
+                ON CONFLICT DO NOTHING;
+                """,
+                rows, page_size=len(rows)
+            )
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+journal.py
+
+Append-only spill file for DB writes that do not fit in the crawler's
+bounded write queue.
+
+WriteJournal stores one JSON line per (action, payload). Once a write has
+been spilled, the crawler appends every following write here as well until
+the journal is drained, so writes keep their order. DBWorker replays it in
+batches once the queue is empty and calls commit() with the returned
+offset after the batch is written, which records the position in a small
+.offset sidecar so a crash never loses or double-applies more than one
+batch. The file is truncated whenever it has been fully replayed, and
+anything left over from a previous run is replayed on the next start.
+"""
+
+import json
+import os
+import threading
+
+class WriteJournal:
+    """Thread-safe JSON-lines spill file with a persisted replay offset."""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset_path = path + ".offset"
+        self._lock = threading.Lock()
+        self._offset = 0
+        self._pending = 0
+        self._file = None
+        self._open()
+
+    def _open(self):
+        try:
+            with open(self.offset_path) as f:
+                self._offset = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            self._offset = 0
+        self._file = open(self.path, "ab")
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            self._pending = sum(1 for _ in f)
+
+    def pending(self):
+        """Entries appended but not yet committed."""
+        return self._pending
+
+    def append(self, action, payload):
+        line = json.dumps([action, payload], separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._pending += 1
+
+    def read(self, n):
+        """
+        Return (items, offset) for up to n uncommitted entries; pass offset
+        and len(items) to commit() once they are durably written.
+        """
+        items = []
+        with self._lock:
+            self._file.flush()
+            offset = self._offset
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                while len(items) < n:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break  # End of file or a line still being written
+                    offset += len(line)
+                    action, payload = json.loads(line)
+                    if isinstance(payload, list):
+                        payload = tuple(payload)
+                    items.append((action, payload))
+        return items, offset
+
+    def commit(self, offset, count):
+        with self._lock:
+            self._pending = max(0, self._pending - count)
+            if offset >= os.path.getsize(self.path):
+                # Fully replayed: start the file over
+                self._file.truncate(0)
+                offset = 0
+            self._offset = offset
+            tmp = self.offset_path + ".tmp"
+            with open(tmp, "w") as f:
+                f.write(str(offset))
+            os.replace(tmp, self.offset_path)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
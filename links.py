@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+links.py
+
+Fast outbound-link extraction shared by crawler.py, CrawlerV2 and brute_force.py.
+
+links_from_root() walks only the <a>/<area> elements of an lxml tree that
+is already parsed (utils.ParsedPage reuses its own), and extract_links()
+parses raw HTML with lxml first. Both return Link(url, text, rel) tuples in
+document order: url is absolute, canonical and http(s) only, with
+javascript:, mailto:, fragment-only and over-long hrefs dropped and
+<base href> honoured. text is the anchor text with whitespace collapsed,
+and rel is a tuple of lower-cased tokens such as ("nofollow",). Each URL
+appears once, keeping its first anchor. Resolving URLs costs more than
+walking the tree, so repeated hrefs in a page are resolved once and
+canonical forms are kept in a small LRU shared across pages (navigation
+and footer links repeat on every page of a site).
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+from urllib.parse import urljoin, urlsplit
+
+from lxml import etree, html as lxml_html
+
+from canonical import canonicalize
+
+MAX_URL_LENGTH = 2048
+MAX_TEXT_LENGTH = 200
+SKIP_PREFIXES = ("#", "javascript:", "mailto:", "tel:", "data:", "about:")
+CANONICAL_CACHE_SIZE = 65536
+
+Link = namedtuple("Link", "url text rel")
+
+def links_from_root(root, base_url, limit=None):
+    """Return up to limit Links from the <a href>/<area href> elements of an lxml tree."""
+    if root is None:
+        return []
+    for base in root.iter("base", "{*}base"):
+        href = (base.get("href") or "").strip()
+        if href:
+            base_url = urljoin(base_url, href)
+        break
+
+    out = []
+    seen = set()
+    resolved = {}  # raw href -> canonical URL or None, for repeated hrefs
+    for el in root.iter("a", "area", "{*}a", "{*}area"):
+        href = el.get("href")
+        if not href:
+            continue
+        url = resolved.get(href, False)
+        if url is False:
+            url = resolved[href] = _resolve(base_url, href)
+        if url is None or url in seen:
+            continue
+        seen.add(url)
+        text = " ".join("".join(el.itertext()).split())[:MAX_TEXT_LENGTH]
+        rel = tuple((el.get("rel") or "").lower().split())
+        out.append(Link(url, text, rel))
+        if limit is not None and len(out) >= limit:
+            break
+    return out
+
+def extract_links(base_url, content, limit=None):
+    """Parse HTML (str or bytes) and return its Links; [] if it cannot be parsed."""
+    try:
+        root = lxml_html.document_fromstring(content)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration
+        if not isinstance(content, str):
+            return []
+        try:
+            root = lxml_html.document_fromstring(content.encode("utf-8"))
+        except (etree.ParserError, ValueError):
+            return []
+    except etree.ParserError:
+        return []
+    return links_from_root(root, base_url, limit)
+
+def _resolve(base_url, href):
+    href = href.strip()
+    if not href or href.lower().startswith(SKIP_PREFIXES):
+        return None
+    try:
+        # Absolute hrefs need no join; canonicalize re-serializes them anyway
+        url = href if href.startswith(("http://", "https://")) else urljoin(base_url, href)
+    except ValueError:
+        return None
+    return _canonical(url)
+
+@lru_cache(maxsize=CANONICAL_CACHE_SIZE)
+def _canonical(url):
+    """Canonical form of an absolute http(s) URL, or None for other schemes and bad URLs."""
+    try:
+        parts = urlsplit(url)
+        if parts.scheme.lower() not in ("http", "https") or not parts.hostname:
+            return None
+        parts.port  # Raises ValueError for a malformed port
+    except ValueError:
+        return None
+    url = canonicalize(url)
+    return url if len(url) <= MAX_URL_LENGTH else None
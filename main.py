@@ -17,6 +17,7 @@ import psycopg2
 from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASS, THREADS
 from crawler import run_crawler, shutdown_event, ignore_robots_and_tos
 from database import setup_schema
+import metrics
 import Crawled_Urls  # runs verify_or_rotate() on import
 
 # ─── Override built-in print to also push logs into the GUI queue ────────────
@@ -119,6 +120,28 @@ def poll_log_queue():
         text_widget.yview(tk.END)
     root.after(200, poll_log_queue)
 
+def format_metrics(snap):
+    """Render a metrics.Registry snapshot as a fixed-width table."""
+    lines = [f"{'stage':<12}{'count':>9}{'avg ms':>9}{'p95 ms':>9}{'max ms':>10}{'queue':>8}"]
+    for name, s in snap["stages"].items():
+        depth = s.get("depth", "")
+        lines.append(f"{name:<12}{s['count']:>9}{s['avg_ms']:>9.1f}{s['p95_ms']:>9.0f}"
+                     f"{s['max_ms']:>10.0f}{depth:>8}")
+    statuses = snap["counters"].get("http_responses") or {}
+    if statuses:
+        lines.append("HTTP: " + "  ".join(f"{code}={n}" for code, n in sorted(statuses.items(), key=str)))
+    mb = snap["counters"].get("bytes_downloaded", 0) / 1e6
+    gauges = "  ".join(f"{name}={value}" for name, value in snap["gauges"].items())
+    lines.append(f"Downloaded: {mb:.1f} MB  {gauges}")
+    return "\n".join(lines)
+
+def poll_metrics():
+    metrics_widget.configure(state=tk.NORMAL)
+    metrics_widget.delete("1.0", tk.END)
+    metrics_widget.insert(tk.END, format_metrics(metrics.registry.snapshot()))
+    metrics_widget.configure(state=tk.DISABLED)
+    root.after(1000, poll_metrics)
+
 # ─── Signal Handling ──────────────────────────────────────────────────────────
 def handle_shutdown(signum, frame):
     print("[*] Shutting down gracefully...")
@@ -136,7 +159,7 @@ if __name__ == "__main__":
     # Build and start the GUI
     root = tk.Tk()
     root.title("DarkNetCrawler Control")
-    root.geometry("800x600")
+    root.geometry("800x800")
 
     controls_frame = tk.Frame(root)
     controls_frame.pack(fill=tk.X, padx=10, pady=5)
@@ -162,6 +185,12 @@ if __name__ == "__main__":
     )
     robots_check.pack(side=tk.LEFT, padx=(20, 0))
 
+    metrics_frame = tk.LabelFrame(root, text="Pipeline metrics")
+    metrics_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+
+    metrics_widget = tk.Text(metrics_frame, height=18, font=("Courier", 9), state=tk.DISABLED)
+    metrics_widget.pack(fill=tk.X)
+
     log_frame = tk.Frame(root)
     log_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
 
@@ -173,6 +202,7 @@ if __name__ == "__main__":
     text_widget.config(yscrollcommand=scrollbar.set)
 
     root.after(200, poll_log_queue)
+    root.after(1000, poll_metrics)
     root.mainloop()
 
     print("[*] Program exit.")
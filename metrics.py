@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+metrics.py
+
+In-process pipeline metrics for the crawler.
+
+A Stage is a latency histogram (fixed buckets, plus count/sum/max) that can
+also report a queue depth through a callable. Counters count events,
+optionally split by one label (e.g. HTTP status), and gauges read a value
+through a callable when metrics are collected. Everything lives in a
+Registry that renders a one-line log summary, a JSON snapshot or the
+Prometheus text format; serve() exposes the latter two over HTTP:
+
+    /metrics       Prometheus text format
+    /metrics.json  JSON snapshot
+"""
+
+import json
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "crawler"
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Stage:
+    """Latency histogram and queue depth of one pipeline stage. Thread-safe."""
+
+    def __init__(self, name, depth=None, buckets=BUCKETS):
+        self.name = name
+        self.depth = depth
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[i] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    @contextmanager
+    def time(self):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding quantile q (seconds), or None without samples."""
+        with self._lock:
+            counts, count, top = list(self._counts), self.count, self.max
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for bound, n in zip(self.buckets + (top,), counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, top)
+        return top
+
+    def cumulative(self):
+        """[(le, cumulative count)] including +Inf, plus (sum, count)."""
+        with self._lock:
+            counts, total, count = list(self._counts), self.total, self.count
+        out, running = [], 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            running += n
+            out.append((bound, running))
+        return out, total, count
+
+    def snapshot(self):
+        with self._lock:
+            snap = {"count": self.count,
+                    "avg_ms": self.total / self.count * 1000 if self.count else 0.0,
+                    "max_ms": self.max * 1000}
+        p95 = self.quantile(0.95)
+        snap["p95_ms"] = p95 * 1000 if p95 is not None else 0.0
+        if self.depth is not None:
+            snap["depth"] = self.depth()
+        return snap
+
+class Counter:
+    """Monotonic counter, optionally split by the values of one label."""
+
+    def __init__(self, name, label=None):
+        self.name = name
+        self.label = label
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, value=None):
+        with self._lock:
+            self._values[value] = self._values.get(value, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def total(self):
+        return sum(self.values().values())
+
+class Gauge:
+    """Current value read through a callable at collection time."""
+
+    def __init__(self, name, read):
+        self.name = name
+        self.read = read
+
+    def value(self):
+        try:
+            return self.read()
+        except Exception:
+            return None
+
+class Registry:
+    """Named stages, counters and gauges, created on first use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def stage(self, name, depth=None):
+        with self._lock:
+            st = self._stages.get(name)
+            if st is None:
+                st = self._stages[name] = Stage(name, depth)
+            elif depth is not None:
+                st.depth = depth
+            return st
+
+    def counter(self, name, label=None):
+        with self._lock:
+            c = self._counters.get(name)
+            if c is None:
+                c = self._counters[name] = Counter(name, label)
+            return c
+
+    def gauge(self, name, read):
+        with self._lock:
+            g = self._gauges[name] = Gauge(name, read)
+            return g
+
+    def _all(self):
+        with self._lock:
+            return list(self._stages.values()), list(self._counters.values()), list(self._gauges.values())
+
+    def snapshot(self):
+        stages, counters, gauges = self._all()
+        return {
+            "stages": {st.name: st.snapshot() for st in stages},
+            "counters": {c.name: (c.values() if c.label else c.total()) for c in counters},
+            "gauges": {g.name: g.value() for g in gauges},
+        }
+
+    def summary(self):
+        """One log line: name count avg/max [depth] per stage, then gauges."""
+        snap = self.snapshot()
+        parts = []
+        for name, s in snap["stages"].items():
+            part = f"{name} n={s['count']} avg={s['avg_ms']:.1f}ms p95={s['p95_ms']:.0f}ms"
+            if "depth" in s:
+                part += f" q={s['depth']}"
+            parts.append(part)
+        parts.extend(f"{name}={value}" for name, value in snap["gauges"].items())
+        return " | ".join(parts)
+
+    def prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        stages, counters, gauges = self._all()
+        lines = []
+        if stages:
+            name = f"{PREFIX}_stage_seconds"
+            lines += [f"# HELP {name} Time spent per item in each crawl stage.",
+                      f"# TYPE {name} histogram"]
+            for st in stages:
+                buckets, total, count = st.cumulative()
+                for le, n in buckets:
+                    le = "+Inf" if le == float("inf") else repr(le)
+                    lines.append(f'{name}_bucket{{stage="{st.name}",le="{le}"}} {n}')
+                lines.append(f'{name}_sum{{stage="{st.name}"}} {total}')
+                lines.append(f'{name}_count{{stage="{st.name}"}} {count}')
+            depth = [st for st in stages if st.depth is not None]
+            if depth:
+                name = f"{PREFIX}_stage_queue_depth"
+                lines += [f"# TYPE {name} gauge"]
+                lines += [f'{name}{{stage="{st.name}"}} {st.depth()}' for st in depth]
+        for c in counters:
+            name = f"{PREFIX}_{c.name}_total"
+            lines.append(f"# TYPE {name} counter")
+            for value, n in sorted(c.values().items(), key=lambda kv: str(kv[0])):
+                labels = f'{{{c.label}="{value}"}}' if c.label else ""
+                lines.append(f"{name}{labels} {n}")
+        for g in gauges:
+            value = g.value()
+            if value is not None:
+                lines += [f"# TYPE {PREFIX}_{g.name} gauge", f"{PREFIX}_{g.name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve /metrics and /metrics.json on a daemon thread; returns the server."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body = json.dumps(registry.snapshot()).encode()
+                    ctype = "application/json"
+                elif self.path.startswith("/metrics"):
+                    body = registry.prometheus().encode()
+                    ctype = "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="Metrics", daemon=True).start()
+        logger.info(f"Metrics endpoint on http://{host}:{port}/metrics")
+        return server
+
+registry = Registry()
+stage = registry.stage
+counter = registry.counter
+gauge = registry.gauge
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+page_simhash.py
+
+NumPy SimHash of a page's full text, for near-duplicate detection.
+
+Text is lower-cased and split into words, and every run of SHINGLE_WORDS
+consecutive words is one feature. Each distinct word is hashed once with
+blake2b (cached). The shingle hashes are then built from the word hashes
+with array ops: rotate, xor and a splitmix64 finalizer. Bits are
+accumulated per byte: one np.bincount over (byte position, byte value)
+gives an 8 x 256 histogram, and a product with the 256 x 8 bit table of
+each byte value turns that into per-bit counts. A fingerprint bit is set
+where more than half of the shingles have it. simhash_many() does a whole
+batch in one bincount, keyed by document as well, which is what the
+re-fingerprinting tool uses.
+
+Fingerprints are stable across processes and runs (no Python hash()), so
+they can be stored and compared with simhash_index. They are not
+comparable with the simhash package's values.
+"""
+
+import re
+from hashlib import blake2b
+
+import numpy as np
+
+SHINGLE_WORDS = 3  # Words per shingle
+WORD_CACHE_SIZE = 500000  # Word hashes kept before the cache is cleared
+
+_WORD = re.compile(r"\w+")
+_word_hashes = {}
+_ROTATE = [np.uint64(r) for r in (0, 21, 42, 11, 53)]
+_M1 = np.uint64(0xbf58476d1ce4e5b9)
+_M2 = np.uint64(0x94d049bb133111eb)
+# Bit j (little-endian) of every byte value, shape (256, 8)
+_BYTE_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1, bitorder="little").astype(np.int64)
+_POSITIONS = np.arange(8, dtype=np.int64) * 256
+
+def _word_hash(word):
+    h = _word_hashes.get(word)
+    if h is None:
+        if len(_word_hashes) >= WORD_CACHE_SIZE:
+            _word_hashes.clear()
+        h = _word_hashes[word] = int.from_bytes(blake2b(word.encode(), digest_size=8).digest(), "little")
+    return h
+
+def _rotl(x, r):
+    if not r:
+        return x
+    return (x << r) | (x >> (np.uint64(64) - r))
+
+def shingle_hashes(text, k=SHINGLE_WORDS):
+    """uint64 hash of every k-word shingle of text (one shingle for shorter texts)."""
+    words = _WORD.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    ids = np.fromiter((_word_hash(w) for w in words), dtype=np.uint64, count=len(words))
+    k = min(k, len(ids))
+    n = len(ids) - k + 1
+    h = ids[:n].copy()
+    for i in range(1, k):
+        h ^= _rotl(ids[i:i + n], _ROTATE[i % len(_ROTATE)])
+    # splitmix64 finalizer so rotated xors of similar words do not share bits
+    with np.errstate(over="ignore"):
+        h ^= h >> np.uint64(30)
+        h *= _M1
+        h ^= h >> np.uint64(27)
+        h *= _M2
+        h ^= h >> np.uint64(31)
+    return h
+
+def _bit_counts(hashes, docs=None, ndocs=1):
+    """
+    (ndocs, 64) counts of set bits, bit i in column i; docs gives the
+    document index of each hash when counting a batch.
+    """
+    keys = hashes.astype("<u8").view(np.uint8).reshape(-1, 8) + _POSITIONS
+    if docs is not None:
+        keys += (docs * 2048)[:, None]
+    hist = np.bincount(keys.ravel(), minlength=ndocs * 2048).reshape(ndocs, 8, 256)
+    return (hist @ _BYTE_BITS).reshape(ndocs, 64)
+
+def _pack(counts, totals):
+    bits = (counts * 2 > totals[:, None]).astype(np.uint8)
+    return np.packbits(bits, axis=1, bitorder="little").view("<u8").ravel()
+
+def simhash(text, k=SHINGLE_WORDS):
+    """64-bit SimHash of text as a Python int; 0 for text without words."""
+    h = shingle_hashes(text, k)
+    if not len(h):
+        return 0
+    return int(_pack(_bit_counts(h), np.array([len(h)]))[0])
+
+def simhash_many(texts, k=SHINGLE_WORDS):
+    """SimHash of each text, as a uint64 array, computed in one batch."""
+    parts = [shingle_hashes(t or "", k) for t in texts]
+    sizes = np.array([len(p) for p in parts], dtype=np.int64)
+    out = np.zeros(len(parts), dtype=np.uint64)
+    nonempty = sizes > 0
+    if not nonempty.any():
+        return out
+    docs = np.repeat(np.arange(len(parts), dtype=np.int64), sizes)
+    counts = _bit_counts(np.concatenate(parts), docs, len(parts))
+    out[nonempty] = _pack(counts[nonempty], sizes[nonempty])
+    return out
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+parse_stage.py
+
+CPU-bound page processing for crawler.py, moved off the fetch threads.
+
+Fetch threads hand raw page bytes to ParseStage.submit(), which blocks once
+the bounded queue is full so downloads cannot outrun parsing. A dispatcher
+thread feeds a ProcessPoolExecutor running parse_page() (decode, lxml parse,
+tag candidate terms, langdetect). Finished futures only put their result on
+a queue: a handler thread passes each record to the handler, which queues
+the DB writes and may block on them, so the pool's own result thread never
+waits on the database. Workers are started by a fork server (spawned where
+there is none), never forked from the crawler itself: by then its DB,
+vetting and sitemap threads are running and may hold locks a forked child
+would inherit. With processes=0 pages are parsed inline on the calling
+thread, as before. Each record carries a page_simhash fingerprint
+of the full text for near-duplicate detection.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from queue import Queue
+from time import perf_counter
+
+from langdetect import detect, LangDetectException
+
+import metrics
+from fetch import decode_body
+from page_simhash import simhash
+from tagger import extract_terms
+from utils import ParsedPage
+
+logger = logging.getLogger(__name__)
+
+PARSE_QUEUE_SIZE = 256  # Raw pages waiting for a parse worker
+
+def parse_page(url, body, content_type, host, base_url=None):
+    """
+    Turn raw page bytes into a record dict. Runs in a worker process, so it
+    only takes and returns picklable values. Links are resolved against
+    base_url, the URL the response actually came from (after redirects),
+    when it differs from url.
+    """
+    start = perf_counter()
+    page = ParsedPage(base_url or url, decode_body(body, content_type, host=host))
+    if page.is_xml:
+        return {"url": url, "is_xml": True, "links": page.links,
+                "timings": {"parse": perf_counter() - start}}
+
+    record = {"url": url, "is_xml": False, "title": page.title or url,
+              "summary": page.summary, "images": page.images, "links": page.links}
+    parsed = perf_counter()
+    # Tags are picked by the handler, which owns the document-frequency table
+    record["terms"], record["term_buckets"] = extract_terms(page.text, page.title, url)
+    tagged = perf_counter()
+    record["simhash"] = simhash(page.text)
+    hashed = perf_counter()
+    try:
+        record["language"] = detect(page.text)
+    except LangDetectException:
+        record["language"] = "unknown"
+    record["timings"] = {"parse": parsed - start, "tags": tagged - parsed,
+                         "simhash": hashed - tagged, "langdetect": perf_counter() - hashed}
+    return record
+
+class ParseStage:
+    """Bounded queue plus process pool between the fetch threads and DBWorker."""
+
+    def __init__(self, handle, processes, queue_size=PARSE_QUEUE_SIZE):
+        self.handle = handle
+        self.processes = processes
+        self.queue = Queue(maxsize=queue_size)
+        # Pages handed to the pool at once; the rest wait in the bounded queue
+        self._slots = threading.BoundedSemaphore(max(1, processes) * 2)
+        self._executor = None
+        self._thread = None
+        self._handler = None
+        self._results = Queue()  # (url, depth, recrawl, future) of finished parses, at most one per slot
+        self.waiting = metrics.stage("parse_queue", depth=lambda: self.queue.unfinished_tasks)
+        for name in ("parse", "tags", "simhash", "langdetect"):
+            metrics.stage(name)
+
+    def start(self):
+        if self.processes > 0:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._executor = ProcessPoolExecutor(max_workers=self.processes,
+                                                 mp_context=multiprocessing.get_context(method))
+            self._thread = threading.Thread(target=self._dispatch, daemon=True)
+            self._thread.start()
+            self._handler = threading.Thread(target=self._handle_results, name="Parse-handler", daemon=True)
+            self._handler.start()
+            logger.info(f"Parse stage started with {self.processes} processes")
+
+    def submit(self, url, depth, body, content_type, host, base_url=None, recrawl=False):
+        """
+        Queue a fetched page for parsing; recrawl is handed on to the handler.
+        Inline mode parses it right away and returns the set of links handed
+        on; otherwise returns an empty set.
+        """
+        if self._executor is None:
+            record = parse_page(url, body, content_type, host, base_url)
+            self._done(record, depth, recrawl)
+            return record["links"]
+        self.queue.put((perf_counter(), depth, recrawl, (url, body, content_type, host, base_url)))
+        return set()
+
+    def _dispatch(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            queued_at, depth, recrawl, args = item
+            self.waiting.observe(perf_counter() - queued_at)
+            self._slots.acquire()
+            try:
+                fut = self._executor.submit(parse_page, *args)
+            except Exception as e:
+                logger.error(f"Parse submit failed for {args[0]}: {e}")
+                self._slots.release()
+                self.queue.task_done()
+                continue
+            fut.add_done_callback(partial(self._finished, args[0], depth, recrawl))
+
+    def _finished(self, url, depth, recrawl, fut):
+        # Runs on the executor's thread: hand over, never block here
+        self._results.put((url, depth, recrawl, fut))
+
+    def _handle_results(self):
+        while True:
+            item = self._results.get()
+            if item is None:
+                break
+            url, depth, recrawl, fut = item
+            try:
+                self._done(fut.result(), depth, recrawl)
+            except Exception as e:
+                logger.error(f"Parse error for {url}: {e}")
+            finally:
+                # The slot is freed only once handled, which bounds _results
+                self._slots.release()
+                self.queue.task_done()
+
+    def _done(self, record, depth, recrawl):
+        for name, seconds in record["timings"].items():
+            metrics.stage(name).observe(seconds)
+        self.handle(record, depth, recrawl)
+
+    def join(self):
+        """Block until every submitted page has been parsed and handled."""
+        self.queue.join()
+
+    def stop(self):
+        """Finish queued pages, then shut the pool down."""
+        if self._executor is None:
+            return
+        self.queue.put(None)
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+        self._results.put(None)
+        self._handler.join()
+        self._executor = None
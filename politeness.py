@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+politeness.py
+
+Per-host politeness scheduling for the crawler.
+
+HostScheduler keeps a FIFO of waiting rows per host and a heap of the time
+each host may next be fetched. pop() only hands out rows whose host is ready,
+so no worker ever sleeps on behalf of another host, and reserve() lets a
+caller that already holds a URL wait for its own host outside the lock.
+An optional on_wait callback receives how long each popped row was queued.
+Booked slots and per-host delays are wall-clock based, so state() can be
+checkpointed and restore()d by a restarted crawler.
+
+Memory stays proportional to the active hosts: slots already in the past
+mean the same as no slot and are pruned whenever the table has doubled
+since the last sweep, and only delays above the default are kept, for at
+most MAX_DELAY_HOSTS hosts (the crawler sets them again from robots.txt
+before each fetch).
+"""
+
+import heapq
+import threading
+from collections import OrderedDict, deque
+from time import time
+from urllib.parse import urlparse
+
+MAX_DELAY_HOSTS = 100000  # Per-host delays kept; least recently set ones are dropped
+PRUNE_MIN = 10000  # Booked slots tracked before the first sweep of past ones
+
+class HostScheduler:
+    """Heap of next-allowed fetch times per host with per-host row queues."""
+
+    def __init__(self, default_delay=1.0, on_wait=None):
+        self.default_delay = default_delay
+        self.on_wait = on_wait
+        self._lock = threading.Lock()
+        self._queues = {}         # host -> deque of (row, queued_at) waiting for that host
+        self._heap = []           # (ready_at, host) for every host with queued rows
+        self._next_allowed = {}   # host -> earliest time of the next fetch
+        self._delays = OrderedDict()  # host -> per-host delay above the default (robots Crawl-delay)
+        self._prune_at = PRUNE_MIN
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def host_count(self):
+        """Number of hosts that currently have rows waiting."""
+        return len(self._queues)
+
+    def set_delay(self, host, delay):
+        """Set the delay for host; never goes below the default delay."""
+        delay = float(delay or 0)
+        with self._lock:
+            if delay <= self.default_delay:
+                self._delays.pop(host, None)
+                return
+            self._delays[host] = delay
+            self._delays.move_to_end(host)
+            if len(self._delays) > MAX_DELAY_HOSTS:
+                self._delays.popitem(last=False)
+
+    def delay_for(self, host):
+        return self._delays.get(host, self.default_delay)
+
+    def push(self, row):
+        """Queue a row whose first element is its URL."""
+        host = urlparse(row[0]).netloc
+        with self._lock:
+            q = self._queues.get(host)
+            if q is None:
+                q = self._queues[host] = deque()
+                heapq.heappush(self._heap, (self._next_allowed.get(host, 0.0), host))
+            q.append((row, time()))
+            self._size += 1
+
+    def pop(self):
+        """
+        Return the next row whose host is ready and book the host's next slot,
+        or None if no host is ready yet.
+        """
+        with self._lock:
+            now = time()
+            while self._heap and self._heap[0][0] <= now:
+                _, host = heapq.heappop(self._heap)
+                q = self._queues.get(host)
+                if not q:
+                    continue
+                allowed = self._next_allowed.get(host, 0.0)
+                if allowed > now:
+                    # reserve() moved this host's slot since it was queued
+                    heapq.heappush(self._heap, (allowed, host))
+                    continue
+                row, queued_at = q.popleft()
+                self._size -= 1
+                self._book(host, now + self.delay_for(host), now)
+                if q:
+                    heapq.heappush(self._heap, (self._next_allowed[host], host))
+                else:
+                    del self._queues[host]
+                break
+            else:
+                return None
+        if self.on_wait is not None:
+            self.on_wait(now - queued_at)
+        return row
+
+    def wait_time(self):
+        """Seconds until the earliest queued host is ready, or None if empty."""
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time())
+
+    def reserve(self, host):
+        """
+        Book the next fetch slot for host and return how long the caller must
+        wait for it. The caller sleeps outside the lock, so only requests to
+        the same host are serialized.
+        """
+        with self._lock:
+            now = time()
+            slot = max(now, self._next_allowed.get(host, 0.0))
+            self._book(host, slot + self.delay_for(host), now)
+            return slot - now
+
+    def _book(self, host, next_allowed, now):
+        """Set host's next slot, first sweeping out past slots if the table has doubled. Lock held."""
+        if len(self._next_allowed) >= self._prune_at:
+            self._next_allowed = {h: t for h, t in self._next_allowed.items() if t > now}
+            self._prune_at = max(PRUNE_MIN, 2 * len(self._next_allowed))
+        self._next_allowed[host] = next_allowed
+
+    def state(self):
+        """{host: [next_allowed, delay]} for hosts with a future slot or a non-default delay."""
+        with self._lock:
+            now = time()
+            hosts = {h for h, t in self._next_allowed.items() if t > now} | set(self._delays)
+            return {h: [self._next_allowed.get(h, 0.0), self._delays.get(h, self.default_delay)]
+                    for h in hosts}
+
+    def restore(self, state):
+        """Re-apply a state() snapshot; slots already in the past are dropped."""
+        with self._lock:
+            now = time()
+            for host, (next_allowed, delay) in state.items():
+                if next_allowed > now:
+                    self._next_allowed[host] = max(next_allowed, self._next_allowed.get(host, 0.0))
+                if delay > self.default_delay and len(self._delays) < MAX_DELAY_HOSTS:
+                    self._delays[host] = delay
+
+    def drain(self):
+        """Remove and return every queued row, e.g. to hand them back on shutdown."""
+        with self._lock:
+            rows = [row for q in self._queues.values() for row, _ in q]
+            self._queues.clear()
+            self._heap.clear()
+            self._size = 0
+            return rows
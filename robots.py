@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+robots.py
+
+Shared robots.txt cache for crawler.py and CrawlerV2/crawler_worker.py.
+
+RobotsCache is thread-safe, expires entries after a TTL, caches failed
+fetches for a shorter negative TTL and makes sure concurrent lookups for
+one host trigger a single download. It holds at most max_entries hosts and
+drops the least recently used one beyond that. An optional store (see
+PgRobotsStore) persists fetched robots.txt files so a restart, or a host
+that was dropped from memory, does not refetch them.
+"""
+
+import logging
+import threading
+import urllib.robotparser as robotparser
+from collections import OrderedDict
+from time import time
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+ROBOTS_TTL = 24 * 3600        # Seconds a fetched robots.txt stays valid
+ROBOTS_NEGATIVE_TTL = 3600    # Seconds a failed fetch is remembered
+ROBOTS_TIMEOUT = 10           # Per-request timeout for robots.txt
+ROBOTS_MAX_BYTES = 512 * 1024 # Larger files are truncated (RFC 9309 minimum is 500 KiB)
+ROBOTS_MAX_ENTRIES = 50000    # Hosts kept in memory; least recently used ones are dropped
+
+# Pseudo status stored when robots.txt could not be fetched at all
+STATUS_UNREACHABLE = 0
+
+def build_parser(status, body):
+    """
+    Turn a fetch result into a RobotFileParser, or None when every URL is
+    allowed (missing file, client error or unreachable host).
+    """
+    if status in (401, 403):
+        rp = robotparser.RobotFileParser()
+        rp.disallow_all = True
+        return rp
+    if status != 200:
+        return None
+    rp = robotparser.RobotFileParser()
+    rp.parse(body.splitlines())
+    rp.modified()
+    return rp
+
+class RobotsCache:
+    """TTL'd, single-flight, size-bounded robots.txt cache keyed by host (netloc)."""
+
+    def __init__(self, user_agent, session=None, store=None, ttl=ROBOTS_TTL,
+                 negative_ttl=ROBOTS_NEGATIVE_TTL, timeout=ROBOTS_TIMEOUT,
+                 max_entries=ROBOTS_MAX_ENTRIES):
+        self.user_agent = user_agent
+        self.session = session or requests.Session()
+        self.store = store
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # host -> (parser or None, expires_at), least recently used first
+        self._inflight = {}  # host -> Event set when the fetch for host finishes
+        self.hits = 0
+        self.fetches = 0
+
+    def _ttl_for(self, status):
+        return self.negative_ttl if status == STATUS_UNREACHABLE or status >= 500 else self.ttl
+
+    def get(self, host):
+        """Return the parser for host, or None if every URL on host is allowed."""
+        while True:
+            with self._lock:
+                entry = self._entries.get(host)
+                if entry and entry[1] > time():
+                    self._entries.move_to_end(host)
+                    self.hits += 1
+                    return entry[0]
+                event = self._inflight.get(host)
+                if event is None:
+                    event = self._inflight[host] = threading.Event()
+                    break
+            # Another thread is already fetching this host
+            event.wait(self.timeout * 2 + 1)
+
+        try:
+            status, body, fetched_at = self._load_or_fetch(host)
+            rp = build_parser(status, body)
+            with self._lock:
+                self._entries[host] = (rp, fetched_at + self._ttl_for(status))
+                self._entries.move_to_end(host)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return rp
+        finally:
+            with self._lock:
+                del self._inflight[host]
+            event.set()
+
+    def _load_or_fetch(self, host):
+        if self.store is not None:
+            try:
+                row = self.store.load(host)
+            except Exception as e:
+                logger.warning(f"robots store load failed for {host}: {e}")
+                row = None
+            if row and row[2] + self._ttl_for(row[0]) > time():
+                return row
+
+        status, body = self._fetch(host)
+        fetched_at = time()
+        self.fetches += 1
+        if self.store is not None:
+            try:
+                self.store.save(host, status, body, fetched_at)
+            except Exception as e:
+                logger.warning(f"robots store save failed for {host}: {e}")
+        return status, body, fetched_at
+
+    def _fetch(self, host):
+        """Fetch robots.txt over https, falling back to http. Returns (status, body)."""
+        for scheme in ("https", "http"):
+            try:
+                r = self.session.get(f"{scheme}://{host}/robots.txt", timeout=self.timeout,
+                                     headers={"User-Agent": self.user_agent}, stream=True)
+                try:
+                    raw = r.raw.read(ROBOTS_MAX_BYTES, decode_content=True) if r.status_code == 200 else b""
+                finally:
+                    r.close()
+                return r.status_code, raw.decode("utf-8", errors="replace")
+            except Exception as e:
+                logger.debug(f"robots.txt fetch failed for {scheme}://{host}: {e}")
+        return STATUS_UNREACHABLE, ""
+
+    def can_fetch(self, url):
+        rp = self.get(urlparse(url).netloc)
+        return rp is None or rp.can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, host):
+        """Crawl-delay for our user agent on host, or None."""
+        rp = self.get(host)
+        if rp is None:
+            return None
+        try:
+            return rp.crawl_delay(self.user_agent)
+        except Exception:
+            return None
+
+    def site_maps(self, host):
+        """Sitemap URLs listed in host's robots.txt."""
+        rp = self.get(host)
+        return (rp.site_maps() or []) if rp is not None else []
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class PgRobotsStore:
+    """Persists robots.txt bodies in a robots_cache table via a connection pool."""
+
+    def __init__(self, get_conn, release_conn):
+        self.get_conn = get_conn
+        self.release_conn = release_conn
+
+    def ensure_schema(self, cur):
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS robots_cache(
+                host TEXT PRIMARY KEY,
+                status INTEGER,
+                body TEXT,
+                fetched_at DOUBLE PRECISION
+            );
+        """)
+
+    def load(self, host):
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT status, body, fetched_at FROM robots_cache WHERE host = %s;", (host,))
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+            return row
+        finally:
+            self.release_conn(conn)
+
+    def save(self, host, status, body, fetched_at):
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO robots_cache (host, status, body, fetched_at)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (host) DO UPDATE SET status = EXCLUDED.status,
+                    body = EXCLUDED.body, fetched_at = EXCLUDED.fetched_at;
+                """,
+                (host, status, body, fetched_at)
+            )
+            conn.commit()
+            cur.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_conn(conn)
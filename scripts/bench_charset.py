@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Decode time per page: requests' r.text vs fetch.CharsetDecoder.
+
+Pages are synthetic, in several encodings, and served with three kinds of
+header: a full "text/html; charset=..." header, "text/html" with no charset
+(requests then assumes ISO-8859-1) and no Content-Type at all (requests
+then runs charset_normalizer over the whole body). Accuracy is the share
+of pages whose decoded text matches the original.
+
+    python scripts/bench_charset.py --pages 40 --kb 300
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Add the parent directory to the path so we can import fetch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fetch import CharsetDecoder
+
+WORDS = {
+    "utf-8": "naïve café über straße 東京 данные ελληνικά".split(),
+    "windows-1251": "данные поиск страница новости привет мир".split(),
+    "iso-8859-1": "café garçon déjà vu crème brûlée".split(),
+    "shift_jis": "東京 日本語 検索 ページ ニュース".split(),
+}
+
+def make_page(encoding, kb, meta, rng):
+    words = WORDS[encoding] + "the and page link news index".split()
+    head = f'<meta charset="{encoding}">' if meta else ""
+    paras = []
+    size = 0
+    while size < kb * 1024:
+        p = "<p>" + " ".join(rng.choice(words) for _ in range(60)) + "</p>"
+        paras.append(p)
+        size += len(p.encode(encoding))
+    text = f"<html><head>{head}<title>t</title></head><body>{''.join(paras)}</body></html>"
+    return text, text.encode(encoding)
+
+def response(body, content_type):
+    r = Response()
+    r._content = body
+    r.status_code = 200
+    r.headers = CaseInsensitiveDict({"Content-Type": content_type} if content_type else {})
+    r.encoding = get_encoding_from_headers(r.headers)
+    return r
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--pages", type=int, default=40, help="pages per encoding")
+    ap.add_argument("--kb", type=int, default=300, help="approximate page size")
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    pages = []
+    for enc in WORDS:
+        for i in range(args.pages):
+            text, body = make_page(enc, args.kb, meta=(i % 2 == 0), rng=rng)
+            pages.append((enc, text, body, f"host{i % 4}.{enc}.test"))
+    print(f"[*] {len(pages)} pages, ~{args.kb} KB each, encodings: {', '.join(WORDS)}")
+
+    headers = {
+        "charset header": lambda enc: f"text/html; charset={enc}",
+        "text/html only": lambda enc: "text/html",
+        "no Content-Type": lambda enc: None,
+    }
+    print(f"  {'':<18}{'r.text ms/page':>16}{'ok':>6}{'decoder ms/page':>18}{'ok':>6}")
+    for label, header in headers.items():
+        old_t = new_t = 0.0
+        old_ok = new_ok = 0
+        decoder = CharsetDecoder()
+        for enc, text, body, host in pages:
+            r = response(body, header(enc))
+            start = time.perf_counter()
+            decoded = r.text
+            old_t += time.perf_counter() - start
+            old_ok += decoded == text
+
+            start = time.perf_counter()
+            decoded = decoder.decode(body, header(enc), host=host)
+            new_t += time.perf_counter() - start
+            new_ok += decoded == text
+        n = len(pages)
+        print(f"  {label:<18}{old_t / n * 1000:>16.2f}{old_ok / n:>6.0%}"
+              f"{new_t / n * 1000:>18.2f}{new_ok / n:>6.0%}")
+        print(f"  {'':<18}resolved by: {dict(decoder.stats)}")
+
+if __name__ == "__main__":
+    main()
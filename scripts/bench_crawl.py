@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+End-to-end crawl benchmark against the synthetic web universe.
+
+Starts scripts/synthetic_web.py in a subprocess, resolves *.synthetic.test
+to it through dns_cache overrides, then drives one crawler for --duration
+seconds and reports pages/sec, p50/p99 fetch latency (time to response
+headers, from requests' r.elapsed), CPU and peak memory of the crawler
+process including its parse workers.
+
+    v1  crawler.run_crawler. Needs config.py and a PostgreSQL database;
+        pass --reset to empty the crawl tables first (scratch DB only).
+        Runs in a temporary directory so crawler.log, visited.npy and the
+        spill journal do not touch the working copy.
+    v2  CrawlerV2/crawler_worker.start_workers, with the synthetic server
+        also acting as its coordinator API. Needs CrawlerV2/crawler_config.py.
+
+    python scripts/bench_crawl.py --target v1 --threads 32 --duration 60 --reset
+    python scripts/bench_crawl.py --target v2 --threads 8 --duration 60
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import psutil
+
+from synthetic_web import DOMAIN, Universe, add_universe_args, seed_urls
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Add the parent directory to the path so we can import the crawlers
+sys.path.append(ROOT)
+
+RESET_TABLES = ("pending_urls", "crawled_urls", "webpages", "tags", "images", "language",
+                "page_validators", "sitemap_state", "robots_cache", "domain_vetting")
+
+class Sampler:
+    """Fetch latencies from a requests response hook, plus CPU and RSS of this process tree."""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.proc = psutil.Process()
+        self.peak_rss = 0
+        self._stop = threading.Event()
+
+    def hook(self, r, *args, **kwargs):
+        if r.url and DOMAIN in r.url:
+            self.latencies.append(r.elapsed.total_seconds())
+            self.statuses[r.status_code] = self.statuses.get(r.status_code, 0) + 1
+
+    def _tree(self):
+        procs = [self.proc]
+        try:
+            procs += self.proc.children(recursive=True)
+        except psutil.Error:
+            pass
+        return procs
+
+    def cpu_seconds(self):
+        total = 0.0
+        for p in self._tree():
+            try:
+                t = p.cpu_times()
+                total += t.user + t.system
+            except psutil.Error:
+                pass
+        return total
+
+    def _watch(self):
+        while not self._stop.wait(0.5):
+            rss = 0
+            for p in self._tree():
+                try:
+                    rss += p.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak_rss = max(self.peak_rss, rss)
+
+    def start(self):
+        self.wall = time.perf_counter()
+        self.cpu = self.cpu_seconds()
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def stop(self):
+        self.wall = time.perf_counter() - self.wall
+        self.cpu = self.cpu_seconds() - self.cpu
+        self._stop.set()
+
+def start_server(args):
+    cmd = [sys.executable, os.path.join(ROOT, "scripts", "synthetic_web.py")]
+    for name, value in vars(args).items():
+        if name in UNIVERSE_ARGS:
+            cmd += ["--" + name.replace("_", "-"), str(value)]
+    server = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    for _ in range(50):
+        try:
+            return server, server_stats(args.port)
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    sys.exit("[!] Synthetic web server did not start")
+
+def server_stats(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stats", timeout=5) as r:
+        return json.load(r)
+
+def run_v1(args, seeds, sampler):
+    os.chdir(tempfile.mkdtemp(prefix="bench_crawl_"))
+    import crawler
+    crawler.dns_cache.overrides["." + DOMAIN] = ("127.0.0.1",)
+    crawler.DOMAIN_DELAY = crawler.host_scheduler.default_delay = args.domain_delay
+    crawler.IGNORE_TOS = args.ignore_tos
+    crawler.global_session.hooks["response"].append(sampler.hook)
+    if args.reset:
+        conn = crawler.get_pg_connection()
+        try:
+            cur = conn.cursor()
+            for table in RESET_TABLES:
+                cur.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+            conn.commit()
+        finally:
+            crawler.release_pg_connection(conn)
+    print(f"[*] v1: run_crawler with {args.threads} threads, working dir {os.getcwd()}")
+    threading.Timer(args.duration, crawler.shutdown_event.set).start()
+    sampler.start()
+    crawler.run_crawler(seeds, max_threads=args.threads)
+    sampler.stop()
+
+def run_v2(args, seeds, sampler):
+    sys.path.insert(0, os.path.join(ROOT, "CrawlerV2"))
+    import crawler_worker
+    from dns_cache import DNSCache
+    DNSCache(overrides={"." + DOMAIN: ["127.0.0.1"]}).install()
+    crawler_worker.session.hooks["response"].append(sampler.hook)
+    stop_event, pause_event = threading.Event(), threading.Event()
+    api = f"http://127.0.0.1:{args.port}/api/crawler"
+    print(f"[*] v2: start_workers with {args.threads} threads, coordinator {api}")
+    sampler.start()
+    threads = crawler_worker.start_workers(args.threads, stop_event, pause_event, api_base_url=api,
+                                           enforce_robots=not args.ignore_robots)
+    time.sleep(args.duration)
+    stop_event.set()
+    sampler.stop()
+    for t in threads:
+        t.join(timeout=30)
+
+def report(args, sampler, before, after):
+    lat = np.array(sampler.latencies) * 1000
+    pages = after["pages"] - before.get("pages", 0)
+    print(f"\n[*] {args.target}, {args.threads} threads, {sampler.wall:.1f}s")
+    print(f"    pages served      {pages}  ({pages / sampler.wall:.1f} pages/sec)")
+    print(f"    requests served   {after['requests'] - before.get('requests', 0)}  "
+          f"({(after['bytes'] - before.get('bytes', 0)) / 2**20:.1f} MB)")
+    if len(lat):
+        print(f"    fetch latency     p50 {np.percentile(lat, 50):.1f} ms  p99 {np.percentile(lat, 99):.1f} ms  "
+              f"({len(lat)} responses)")
+    print(f"    status codes      {dict(sorted(sampler.statuses.items()))}")
+    print(f"    trap pages        {after.get('trap_pages', 0) - before.get('trap_pages', 0)}")
+    print(f"    CPU               {sampler.cpu:.1f}s ({sampler.cpu / sampler.wall * 100:.0f}% of one core)")
+    print(f"    peak RSS          {sampler.peak_rss / 2**20:.0f} MB")
+
+UNIVERSE_ARGS = set()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_universe_args(ap)
+    UNIVERSE_ARGS.update(a.dest for a in ap._actions if a.dest != "help")
+    ap.add_argument("--target", choices=("v1", "v2"), default="v1")
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=60)
+    ap.add_argument("--domain-delay", type=float, default=0.5, help="v1 per-host delay")
+    ap.add_argument("--ignore-tos", action="store_true", help="v1: skip ToS vetting")
+    ap.add_argument("--ignore-robots", action="store_true", help="v2: do not enforce robots.txt")
+    ap.add_argument("--reset", action="store_true", help="v1: drop crawl tables first")
+    args = ap.parse_args()
+
+    server, before = start_server(args)
+    print(f"[*] Synthetic web: {args.hosts} hosts x {args.pages} pages on port {args.port}, seed {args.seed}")
+    sampler = Sampler()
+    seeds = seed_urls(Universe(args), args.seeds)
+    try:
+        (run_v1 if args.target == "v1" else run_v2)(args, seeds, sampler)
+        report(args, sampler, before, server_stats(args.port))
+    finally:
+        server.terminate()
+        server.wait()
+    os._exit(0)  # Crawler daemon threads may still be blocked on the network
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Compare pages/sec of the batch and streaming crawl loops in engine.py.
+
+Fetches are simulated with sleeps drawn from a fixed-seed latency
+distribution (mostly fast pages plus a few timeouts), so the numbers only
+reflect scheduling, not network or parsing cost.
+
+    python scripts/bench_engine.py --pages 400 --threads 8
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+# Add the parent directory to the path so we can import engine
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine import run_batched, run_streaming
+
+def make_latencies(pages, slow_rate, slow_time, seed):
+    rng = random.Random(seed)
+    return [
+        slow_time if rng.random() < slow_rate else rng.uniform(0.02, 0.2)
+        for _ in range(pages)
+    ]
+
+def bench(loop, latencies, threads):
+    rows = [(f"http://bench.test/{i}", latencies[i]) for i in range(len(latencies))]
+    lock = threading.Lock()
+
+    def next_batch(n):
+        with lock:
+            batch = rows[:n]
+            del rows[:n]
+        return batch
+
+    def work(url, delay):
+        time.sleep(delay)
+
+    start = time.perf_counter()
+    done = loop(next_batch, work, threads, threading.Event())
+    elapsed = time.perf_counter() - start
+    return done, elapsed
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--pages", type=int, default=400)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--slow-rate", type=float, default=0.03,
+                    help="fraction of fetches that hit the slow path")
+    ap.add_argument("--slow-time", type=float, default=2.0,
+                    help="seconds spent by a slow fetch (a scaled-down timeout)")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    latencies = make_latencies(args.pages, args.slow_rate, args.slow_time, args.seed)
+    print(f"[*] {args.pages} pages, {args.threads} threads, "
+          f"{args.slow_rate:.0%} slow at {args.slow_time}s")
+
+    results = {}
+    for name, loop in (("batch", run_batched), ("stream", run_streaming)):
+        done, elapsed = bench(loop, latencies, args.threads)
+        results[name] = done / elapsed
+        print(f"  {name:<7} {done} pages in {elapsed:6.2f}s  → {results[name]:7.1f} pages/sec")
+
+    print(f"[*] stream/batch speedup: {results['stream'] / results['batch']:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Links/sec of links.extract_links against the extractors it replaces.
+
+    bs4         CrawlerV2's extract_urls before: html.parser soup, find_all('a')
+    lxml-naive  the previous ParsedPage.links: lxml tree, urljoin and
+                canonicalize on every href, duplicates included
+    links.py    extract_links: lxml tree, <a>/<area> only, repeated hrefs
+                resolved once, anchor text and rel included
+
+The synthetic corpus mixes relative, absolute, duplicate, fragment,
+javascript: and rel="nofollow" links in realistic proportions. Point
+--corpus at a directory of saved *.html pages to use real ones. The URL
+sets each extractor returns are compared too.
+
+    python scripts/bench_links.py --corpus saved_pages/ --rounds 3
+"""
+
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+from lxml import html as lxml_html
+
+# Add the parent directory to the path so we can import links
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from canonical import canonicalize
+from links import extract_links
+
+def bs4_links(url, html):
+    links = set()
+    soup = BeautifulSoup(html, 'html.parser')
+    for a in soup.find_all('a', href=True):
+        absolute_url = canonicalize(urljoin(url, a['href']))
+        if urlparse(absolute_url).scheme in ['http', 'https']:
+            links.add(absolute_url[:2048])
+    return links
+
+def naive_links(url, html):
+    links = set()
+    root = lxml_html.document_fromstring(html)
+    for tag in root.iter('a'):
+        href = tag.get('href')
+        if not href:
+            continue
+        full_url = urljoin(url, href)
+        if urlparse(full_url).scheme in ['http', 'https']:
+            links.add(canonicalize(full_url))
+    return links
+
+def fast_links(url, html):
+    return {link.url for link in extract_links(url, html)}
+
+EXTRACTORS = (("bs4", bs4_links), ("lxml-naive", naive_links), ("links.py", fast_links))
+
+def synthetic_corpus(n, seed=11):
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(3000)]
+    nav = "".join(f'<a href="/section/{i}/">Section {i}</a>' for i in range(30))
+    pages = []
+    for i in range(n):
+        host = f"site{rng.randrange(200)}.example"
+        body = [f"<nav>{nav}</nav>"]
+        for p in range(rng.randint(30, 90)):
+            text = " ".join(rng.choice(words) for _ in range(rng.randint(15, 50)))
+            kind = rng.random()
+            if kind < 0.4:
+                href = f"/article/{rng.randrange(10**5)}?utm_source=x&id={p}"
+            elif kind < 0.7:
+                href = f"https://other{rng.randrange(500)}.example/page/{rng.randrange(10**4)}"
+            elif kind < 0.8:
+                href = f"#section-{p}"
+            elif kind < 0.85:
+                href = "javascript:void(0)"
+            else:
+                href = f"../related/{rng.randrange(100)}.html"
+            rel = ' rel="nofollow ugc"' if rng.random() < 0.1 else ""
+            body.append(f"<div><p>{text} <a href='{href}'{rel}><span>{rng.choice(words)}</span> "
+                        f"{rng.choice(words)}</a></p></div>")
+        body.append(f"<footer>{nav}</footer>")
+        pages.append((f"https://{host}/dir/{i}.html",
+                      f"<html><head><title>Page {i}</title></head><body>{''.join(body)}</body></html>"))
+    return pages
+
+def load_corpus(path):
+    pages = []
+    for fn in sorted(glob.glob(os.path.join(path, "**", "*.htm*"), recursive=True)):
+        with open(fn, "rb") as f:
+            html = f.read().decode("utf-8", errors="replace")
+        pages.append((f"http://corpus.test/{os.path.basename(fn)}", html))
+    return pages
+
+def timed(fn, pages, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for url, html in pages:
+            fn(url, html)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--corpus", help="directory of saved HTML pages")
+    ap.add_argument("--pages", type=int, default=300, help="synthetic pages if no corpus")
+    ap.add_argument("--rounds", type=int, default=3)
+    args = ap.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.pages)
+    if not pages:
+        print(f"[!] No pages found in {args.corpus}")
+        sys.exit(1)
+    size_mb = sum(len(h) for _, h in pages) / 1e6
+    anchors = sum(html.count("<a ") for _, html in pages)
+    print(f"[*] {len(pages)} pages, {size_mb:.1f} MB, {anchors} anchors, best of {args.rounds}")
+
+    results = {name: [fn(url, html) for url, html in pages] for name, fn in EXTRACTORS}
+    base = timed(EXTRACTORS[0][1], pages, args.rounds)
+    for name, fn in EXTRACTORS:
+        t = base if fn is EXTRACTORS[0][1] else timed(fn, pages, args.rounds)
+        print(f"  {name:<11} {anchors / t:10.0f} links/sec  {t * 1000 / len(pages):6.2f} ms/page  "
+              f"{base / t:5.1f}x")
+
+    # links.py also drops fragment-only hrefs (the page itself) and over-long URLs
+    diff = sum(len(a ^ b) for a, b in zip(results["bs4"], results["links.py"]))
+    print(f"[*] URLs differing between bs4 and links.py: {diff}")
+
+if __name__ == "__main__":
+    main()
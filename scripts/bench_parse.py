@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: the old per-page parsing in crawl_url vs utils.ParsedPage.
+
+The old path is reproduced here as it was: one html.parser soup plus three
+lxml soups (summary, images, links) and two get_text walks (tags and
+langdetect input). Point --corpus at a directory of saved *.html pages;
+without it a synthetic corpus is generated.
+
+    python scripts/bench_parse.py --corpus saved_pages/ --rounds 3
+"""
+
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+# Add the parent directory to the path so we can import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import ParsedPage, generate_tags
+
+def old_pipeline(url, html):
+    soup = BeautifulSoup(html, 'html.parser')
+    title = soup.title.string.strip() if soup.title and soup.title.string else url
+    summary = BeautifulSoup(html, 'lxml').get_text(separator=' ', strip=True)[:200]
+    tags = generate_tags(soup.get_text(" ", strip=True), title=title, url=url)
+    images = [img['src'] for img in BeautifulSoup(html, 'lxml').find_all('img', src=True)][:5]
+    lang_input = soup.get_text(" ", strip=True)
+    links = set()
+    for tag in BeautifulSoup(html, 'lxml').find_all('a', href=True):
+        full_url = urljoin(url, tag['href'])
+        if urlparse(full_url).scheme in ['http', 'https']:
+            links.add(full_url)
+    return title, summary, tags, images, lang_input, links
+
+def new_pipeline(url, html):
+    page = ParsedPage(url, html)
+    return page.title or url, page.summary, page.tags, page.images, page.text, page.links
+
+def synthetic_corpus(n, seed=7):
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(2000)]
+    pages = []
+    for i in range(n):
+        body = []
+        for p in range(rng.randint(20, 80)):
+            text = " ".join(rng.choice(words) for _ in range(rng.randint(20, 60)))
+            body.append(f"<div class='c{p}'><p>{text}</p>"
+                        f"<a href='/page/{rng.randint(0, 10**6)}'>link {p}</a>"
+                        f"<img src='/img/{p}.png'></div>")
+        pages.append((f"http://synthetic.test/{i}",
+                       f"<html><head><title>Page {i}</title><script>var x = {i};</script>"
+                       f"</head><body>{''.join(body)}</body></html>"))
+    return pages
+
+def load_corpus(path):
+    pages = []
+    for fn in sorted(glob.glob(os.path.join(path, "**", "*.htm*"), recursive=True)):
+        with open(fn, "rb") as f:
+            html = f.read().decode("utf-8", errors="replace")
+        pages.append((f"http://corpus.test/{os.path.basename(fn)}", html))
+    return pages
+
+def timed(fn, pages, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for url, html in pages:
+            fn(url, html)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--corpus", help="directory of saved HTML pages")
+    ap.add_argument("--pages", type=int, default=100, help="synthetic pages if no corpus")
+    ap.add_argument("--rounds", type=int, default=3)
+    args = ap.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.pages)
+    if not pages:
+        print(f"[!] No pages found in {args.corpus}")
+        sys.exit(1)
+    size_mb = sum(len(h) for _, h in pages) / 1e6
+    print(f"[*] {len(pages)} pages, {size_mb:.1f} MB, best of {args.rounds}")
+
+    old = timed(old_pipeline, pages, args.rounds)
+    new = timed(new_pipeline, pages, args.rounds)
+    print(f"  old (4 parses, 2 text walks): {old * 1000 / len(pages):7.2f} ms/page")
+    print(f"  ParsedPage (1 parse):         {new * 1000 / len(pages):7.2f} ms/page")
+    print(f"[*] speedup: {old / new:.1f}x")
+
+if __name__ == "__main__":
+    main()
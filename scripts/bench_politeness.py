@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Compare the old global domain_lock sleep with politeness.HostScheduler.
+
+Simulates a frontier spread over many hosts, a per-host delay and a fixed
+fetch time, and reports pages/sec for several thread counts.
+
+    python scripts/bench_politeness.py --hosts 50 --pages 300
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+# Add the parent directory to the path so we can import the crawler modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine import run_streaming
+from politeness import HostScheduler
+
+def make_rows(pages, hosts):
+    # Discovered links cluster by host, so neighbouring rows share a host.
+    return [(f"http://h{i * hosts // pages}.bench.test/{i}", 0) for i in range(pages)]
+
+def bench_global_lock(rows, threads, delay, fetch_time):
+    """The pre-scheduler behaviour: sleep while holding one process-wide lock."""
+    lock = threading.Lock()
+    last = defaultdict(float)
+    todo = list(rows)
+    todo_lock = threading.Lock()
+
+    def next_batch(n):
+        with todo_lock:
+            batch = todo[:n]
+            del todo[:n]
+        return batch
+
+    def work(url, depth):
+        host = url.split("/")[2]
+        with lock:
+            now = time.time()
+            if now - last[host] < delay:
+                time.sleep(delay - (now - last[host]))
+            last[host] = now
+        time.sleep(fetch_time)
+
+    return run_streaming(next_batch, work, threads, threading.Event())
+
+def bench_scheduler(rows, threads, delay, fetch_time):
+    sched = HostScheduler(delay)
+    for row in rows:
+        sched.push(row)
+
+    def next_batch(n):
+        out = []
+        while len(out) < n:
+            row = sched.pop()
+            if row is None:
+                break
+            out.append(row)
+        return out
+
+    def work(url, depth):
+        time.sleep(fetch_time)
+
+    return run_streaming(next_batch, work, threads, threading.Event(),
+                         prefetch=1, retry_after=sched.wait_time)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--hosts", type=int, default=50)
+    ap.add_argument("--pages", type=int, default=300)
+    ap.add_argument("--delay", type=float, default=0.2, help="per-host delay in seconds")
+    ap.add_argument("--fetch-time", type=float, default=0.05)
+    ap.add_argument("--threads", type=int, nargs="+", default=[2, 4, 8, 16])
+    args = ap.parse_args()
+
+    rows = make_rows(args.pages, args.hosts)
+    print(f"[*] {args.pages} pages over {args.hosts} hosts, delay {args.delay}s, "
+          f"fetch {args.fetch_time}s")
+    print(f"  {'threads':>7}  {'global lock':>12}  {'scheduler':>12}")
+    for threads in args.threads:
+        rates = []
+        for fn in (bench_global_lock, bench_scheduler):
+            start = time.perf_counter()
+            done = fn(rows, threads, args.delay, args.fetch_time)
+            rates.append(done / (time.perf_counter() - start))
+        print(f"  {threads:>7}  {rates[0]:>8.1f} p/s  {rates[1]:>8.1f} p/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Fingerprinting time per KB of text: the simhash package vs page_simhash.
+
+Documents are synthetic text with a Zipf-like vocabulary, or the *.txt /
+*.html files under --corpus (HTML is reduced to its text with lxml first).
+page_simhash is timed one document at a time (as in the parse stage) and
+as a single simhash_many batch (as in scripts/refingerprint.py). Also
+reports how well each tells planted near-duplicates (--edits words
+replaced) from unrelated documents, and page_simhash's recall within a few
+thresholds around simhash_index.MAX_DISTANCE, which is calibrated on it.
+
+    python scripts/bench_simhash.py --docs 500 --words 1500 --edits 5
+"""
+
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+from simhash import Simhash
+
+# Add the parent directory to the path so we can import page_simhash
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from page_simhash import simhash, simhash_many
+from simhash_index import MAX_DISTANCE, distance
+
+def synthetic_docs(n, words, seed=5):
+    rng = random.Random(seed)
+    letters = "etaoinshrdlcumwfgypbvkjxqz"
+    vocab = ["".join(rng.choices(letters, k=rng.randint(3, 10))) for _ in range(20000)]
+    weights = [1 / (i + 1) for i in range(len(vocab))]
+    return [" ".join(rng.choices(vocab, weights, k=rng.randint(words // 2, words * 3 // 2)))
+            for _ in range(n)]
+
+def load_corpus(path):
+    from lxml import html as lxml_html
+    docs = []
+    for fn in sorted(glob.glob(os.path.join(path, "**", "*.*"), recursive=True)):
+        with open(fn, "rb") as f:
+            raw = f.read()
+        if fn.endswith((".html", ".htm")):
+            try:
+                raw = lxml_html.document_fromstring(raw).text_content().encode()
+            except ValueError:
+                continue
+        elif not fn.endswith(".txt"):
+            continue
+        docs.append(raw.decode("utf-8", errors="replace"))
+    return docs
+
+def edit(doc, rng, changes=5):
+    words = doc.split()
+    for _ in range(changes):
+        words[rng.randrange(len(words))] = f"edit{rng.randrange(10**6)}"
+    return " ".join(words)
+
+def package_ok(doc):
+    # The package keeps feature weights in uint8 and overflows under NumPy 2
+    # once a character 4-gram repeats more than 255 times
+    try:
+        Simhash(doc)
+        return True
+    except OverflowError:
+        return False
+
+def timed(fn, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--corpus", help="directory of .txt/.html documents")
+    ap.add_argument("--docs", type=int, default=300, help="synthetic documents if no corpus")
+    ap.add_argument("--words", type=int, default=1500, help="average words per synthetic document")
+    ap.add_argument("--edits", type=int, default=5, help="words replaced in each near-duplicate")
+    ap.add_argument("--rounds", type=int, default=3)
+    args = ap.parse_args()
+
+    docs = load_corpus(args.corpus) if args.corpus else synthetic_docs(args.docs, args.words)
+    docs = [d for d in docs if len(d.split()) >= 20]
+    usable = [d for d in docs if package_ok(d)]
+    if len(usable) < len(docs):
+        print(f"[!] simhash package failed on {len(docs) - len(usable)} documents; timing the rest")
+    docs = usable
+    if not docs:
+        print(f"[!] No usable documents in {args.corpus or 'the synthetic corpus'}")
+        sys.exit(1)
+    kb = sum(len(d.encode()) for d in docs) / 1024
+    print(f"[*] {len(docs)} documents, {kb:.0f} KB, best of {args.rounds}")
+
+    old = timed(lambda: [Simhash(d).value for d in docs], args.rounds)
+    one = timed(lambda: [simhash(d) for d in docs], args.rounds)
+    batch = timed(lambda: simhash_many(docs), args.rounds)
+    for name, t in (("simhash package", old), ("page_simhash", one), ("simhash_many", batch)):
+        print(f"  {name:<16} {t / kb * 1000:8.3f} ms/KB  {old / t:5.1f}x")
+
+    rng = random.Random(1)
+    pairs = [(d, edit(d, rng, args.edits)) for d in docs[:200]]
+    for name, fn in (("simhash package", lambda t: Simhash(t).value), ("page_simhash", simhash)):
+        near = sorted(distance(fn(a), fn(b)) for a, b in pairs)
+        far = sorted(distance(fn(a), fn(b)) for (a, _), (b, _) in zip(pairs, pairs[1:]))
+        print(f"  {name:<16} median distance: edited copy {near[len(near) // 2]}, "
+              f"unrelated {far[len(far) // 2]} (closest {far[0]})")
+        if fn is simhash:
+            recall = ", ".join(f"{t} bits {sum(d <= t for d in near) / len(near):.0%}"
+                               for t in range(max(1, MAX_DISTANCE - 3), MAX_DISTANCE + 2))
+            print(f"  {'':<16} copies within {recall} (MAX_DISTANCE {MAX_DISTANCE})")
+
+if __name__ == "__main__":
+    main()
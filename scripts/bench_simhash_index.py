@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate lookups: the old full scan in database.save_page vs simhash_index.
+
+Builds --pages random 64-bit fingerprints and runs --queries lookups. Half
+of the queries are planted near-duplicates (1..MAX_DISTANCE bits flipped)
+and half are fresh fingerprints. Compared:
+
+    python scan  what save_page did on every insert: loop over every
+                 stored fingerprint (timed on --scan-queries lookups)
+    numpy scan   the same scan vectorised, as a best case for scanning
+    SimhashIndex in-memory band index, insert and lookup
+    Postgres     PgSimhashIndex on a scratch table (--pg, needs config.py)
+
+Recall is checked against the numpy scan, which is exact.
+
+    python scripts/bench_simhash_index.py --pages 1000000 --queries 2000 --pg
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add the parent directory to the path so we can import simhash_index
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from simhash_index import MAX_DISTANCE, SimhashIndex, PgSimhashIndex, distance
+
+def random_fps(rng, n):
+    # integers() cannot draw the full uint64 range in one call
+    return (rng.integers(0, 2**63, n, dtype=np.uint64) << np.uint64(1)) | \
+        rng.integers(0, 2, n, dtype=np.uint64)
+
+def make_queries(fps, n, rng):
+    picks = rng.integers(0, len(fps), n // 2)
+    near = []
+    for i in picks:
+        fp = int(fps[i])
+        for bit in rng.choice(64, rng.integers(1, MAX_DISTANCE + 1), replace=False):
+            fp ^= 1 << int(bit)
+        near.append(fp)
+    fresh = [int(x) for x in random_fps(rng, n - len(near))]
+    return near + fresh
+
+def numpy_scan(fps, q):
+    d = np.bitwise_count(fps ^ np.uint64(q))
+    return set(np.flatnonzero(d <= MAX_DISTANCE).tolist())
+
+def bench_pg(fps, queries, keys, batch=10000):
+    from database import get_connection, release_connection
+    index = PgSimhashIndex(table="bench_simhash_bands")
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(f"DROP TABLE IF EXISTS {index.table};")
+        index.ensure_schema(cur)
+        start = time.perf_counter()
+        for i in range(0, len(fps), batch):
+            index.add_many(cur, [(keys[j], int(fps[j])) for j in range(i, min(i + batch, len(fps)))])
+        conn.commit()
+        cur.execute(f"ANALYZE {index.table};")
+        load = time.perf_counter() - start
+        start = time.perf_counter()
+        found = [index.near(cur, q) for q in queries]
+        lookup = time.perf_counter() - start
+        cur.execute(f"DROP TABLE {index.table};")
+        conn.commit()
+        cur.close()
+    finally:
+        release_connection(conn)
+    return load, lookup, found
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--pages", type=int, default=1000000)
+    ap.add_argument("--queries", type=int, default=2000)
+    ap.add_argument("--scan-queries", type=int, default=3, help="lookups timed for the python scan")
+    ap.add_argument("--pg", action="store_true", help="also benchmark PgSimhashIndex (scratch table)")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    fps = random_fps(rng, args.pages)
+    queries = make_queries(fps, args.queries, rng)
+    keys = [f"http://bench.test/{i}" for i in range(args.pages)]
+    print(f"[*] {args.pages} fingerprints, {args.queries} lookups (half near-duplicates), "
+          f"max distance {MAX_DISTANCE}")
+
+    stored = [int(x) for x in fps]
+    start = time.perf_counter()
+    for q in queries[:args.scan_queries]:
+        [i for i, fp in enumerate(stored) if distance(fp, q) <= MAX_DISTANCE]
+    py_scan = (time.perf_counter() - start) / args.scan_queries
+    print(f"  python scan   {py_scan * 1000:10.2f} ms/lookup")
+
+    start = time.perf_counter()
+    exact = [numpy_scan(fps, q) for q in queries]
+    np_scan = (time.perf_counter() - start) / len(queries)
+    print(f"  numpy scan    {np_scan * 1000:10.2f} ms/lookup")
+
+    index = SimhashIndex()
+    start = time.perf_counter()
+    for key, fp in zip(range(args.pages), stored):
+        index.add(key, fp)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    found = [index.near(q) for q in queries]
+    mem = (time.perf_counter() - start) / len(queries)
+    cands = sum(index.candidates(q) for q in queries) / len(queries)
+    recall = sum(len(exact_i & {k for k, _ in f}) for exact_i, f in zip(exact, found)) / \
+        max(1, sum(len(e) for e in exact))
+    print(f"  SimhashIndex  {mem * 1000:10.3f} ms/lookup  ({cands:.0f} candidates, "
+          f"{args.pages / build:.0f} inserts/sec, recall {recall:.1%})")
+    print(f"[*] speedup over python scan: {py_scan / mem:.0f}x, over numpy scan: {np_scan / mem:.0f}x")
+
+    if args.pg:
+        load, lookup, pg_found = bench_pg(fps, queries, keys)
+        hits = sum(len(f) for f in pg_found)
+        print(f"  Postgres      {lookup / len(queries) * 1000:10.3f} ms/lookup  "
+              f"({args.pages / load:.0f} pages/sec loaded, {hits} matches)")
+
+if __name__ == "__main__":
+    main()
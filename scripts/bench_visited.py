@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Memory per URL and startup time: Python set of URLs vs visited.FingerprintSet.
+
+"Startup" for the set is building it from a list of rows (what the old
+fetchall() preload did, minus the DB round trip). For FingerprintSet it is
+both a cold build and loading a memory-mapped snapshot.
+
+    python scripts/bench_visited.py --urls 1000000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Add the parent directory to the path so we can import visited
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from visited import FingerprintSet
+
+def make_urls(n):
+    return [f"https://host{i % 5000}.example.com/section/{i // 7}/article-{i}.html?ref=feed"
+            for i in range(n)]
+
+def measure(build):
+    """Return (obj, seconds, bytes); memory is traced in a separate run so timing stays clean."""
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    obj = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, elapsed, current
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--urls", type=int, default=1000000)
+    args = ap.parse_args()
+
+    urls = make_urls(args.urls)
+    n = len(urls)
+    print(f"[*] {n} URLs, avg {sum(map(len, urls)) / n:.0f} chars")
+
+    # Strings are created inside the build so both sides pay for what they keep.
+    _, t_set, m_set = measure(lambda: {u.encode().decode() for u in urls})
+
+    def build_fp():
+        fs = FingerprintSet()
+        fs.update(urls)
+        fs.merge()
+        return fs
+
+    fs, t_fp, m_fp = measure(build_fp)
+
+    path = os.path.join(tempfile.mkdtemp(), "visited.npy")
+    fs.save(path)
+    loaded = FingerprintSet()
+    start = time.perf_counter()
+    loaded.load(path)
+    t_load = time.perf_counter() - start
+    assert all(u in loaded for u in urls[:1000])
+
+    print(f"  {'':<28}{'bytes/URL':>10}{'startup':>10}")
+    print(f"  {'set of str':<28}{m_set / n:>10.1f}{t_set:>9.2f}s")
+    print(f"  {'FingerprintSet (build)':<28}{m_fp / n:>10.1f}{t_fp:>9.2f}s")
+    print(f"  {'FingerprintSet (snapshot)':<28}{8.0:>10.1f}{t_load:>9.3f}s  (mmap)")
+
+if __name__ == "__main__":
+    main()
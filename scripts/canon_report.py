@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Report how many fetches URL canonicalization saves on a recorded crawl.
+
+Input is one URL per line, e.g. the seedslistauto.txt written by
+seed_dump.py (crawled_urls + pending_urls) or URLs grepped out of
+crawler.log. Every raw URL beyond the first of its canonical form is a
+fetch the crawler no longer makes.
+
+    python scripts/canon_report.py seedslistauto.txt
+"""
+
+import argparse
+import os
+import sys
+from collections import Counter
+from urllib.parse import urlsplit
+
+# Add the parent directory to the path so we can import canonical
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from canonical import canonicalize
+
+def reasons(raw, canon):
+    """Which normalizations changed raw into canon."""
+    a, b = urlsplit(raw.strip()), urlsplit(canon)
+    out = []
+    if a.fragment:
+        out.append("fragment")
+    if a.netloc != b.netloc:
+        out.append("host/port")
+    if a.query != b.query:
+        out.append("query params")
+    if a.path != b.path:
+        out.append("path (slash/;params)")
+    return out or ["scheme"]
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("files", nargs="+", help="files with one URL per line")
+    args = ap.parse_args()
+
+    raw = set()
+    for fn in args.files:
+        with open(fn, encoding="utf-8", errors="replace") as f:
+            raw.update(line.strip() for line in f if line.strip().startswith("http"))
+    if not raw:
+        print("[!] No URLs found.")
+        sys.exit(1)
+
+    groups = {}
+    why = Counter()
+    for url in raw:
+        canon = canonicalize(url)
+        groups.setdefault(canon, []).append(url)
+        if canon != url:
+            why.update(reasons(url, canon))
+
+    saved = len(raw) - len(groups)
+    print(f"[*] Distinct raw URLs:       {len(raw)}")
+    print(f"[*] Distinct canonical URLs: {len(groups)}")
+    print(f"[*] Fetches saved:           {saved} ({saved / len(raw):.1%})")
+    print("[*] URLs changed by:")
+    for reason, n in why.most_common():
+        print(f"      {reason:<22}{n}")
+    print("[*] Largest groups:")
+    for canon, members in sorted(groups.items(), key=lambda kv: -len(kv[1]))[:5]:
+        if len(members) > 1:
+            print(f"      {len(members):>5}  {canon}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Recompute page_simhash fingerprints for stored pages and rebuild their simhash_bands rows.
+
+Pages saved before the band index carry content_hash values from the old
+simhash package (or its object repr) and have no band rows, so near-duplicate
+lookups cannot find them. This walks webpages in url order, fingerprints
+the stored text in batches with page_simhash.simhash_many, and rewrites
+content_hash plus the band rows, one transaction per batch. The DB only
+keeps title and summary, so these fingerprints cover the summary, the
+same fallback database.save_page uses without full text. Pages the crawler
+saves already carry a full-text fingerprint. By default only pages
+without band rows are touched; --all redoes every page.
+
+    python scripts/refingerprint.py --batch 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from psycopg2.extras import execute_values
+
+# Add the parent directory to the path so we can import database
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import get_connection, release_connection, setup_schema, simhash_index
+from page_simhash import simhash_many
+
+def next_batch(cur, after, size, redo_all):
+    missing = "" if redo_all else \
+        f"AND NOT EXISTS (SELECT 1 FROM {simhash_index.table} b WHERE b.url = w.url)"
+    cur.execute(
+        f"""
+        SELECT w.url, w.summary FROM webpages w
+        WHERE w.url > %s {missing}
+        ORDER BY w.url
+        LIMIT %s;
+        """,
+        (after, size)
+    )
+    return cur.fetchall()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--batch", type=int, default=5000, help="pages per transaction")
+    ap.add_argument("--all", action="store_true", help="also redo pages that already have band rows")
+    args = ap.parse_args()
+
+    setup_schema()
+    conn = get_connection()
+    done, after, start = 0, "", time.perf_counter()
+    try:
+        cur = conn.cursor()
+        while True:
+            rows = next_batch(cur, after, args.batch, args.all)
+            if not rows:
+                break
+            urls = [url for url, _ in rows]
+            prints = [int(fp) for fp in simhash_many([summary or "" for _, summary in rows])]
+            execute_values(
+                cur,
+                """
+                UPDATE webpages w SET content_hash = v.content_hash
+                FROM (VALUES %s) AS v(url, content_hash)
+                WHERE w.url = v.url;
+                """,
+                [(url, str(fp)) for url, fp in zip(urls, prints)], page_size=len(rows)
+            )
+            simhash_index.remove(cur, urls)
+            simhash_index.add_many(cur, zip(urls, prints))
+            conn.commit()
+            done += len(rows)
+            after = urls[-1]
+            print(f"[*] {done} pages re-fingerprinted ({done / (time.perf_counter() - start):.0f}/sec)")
+        cur.close()
+    except KeyboardInterrupt:
+        conn.rollback()
+        print(f"[!] Interrupted after {done} pages; run again to continue.")
+    finally:
+        release_connection(conn)
+    print(f"[*] Done: {done} pages in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
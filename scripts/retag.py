@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Rebuild the tag document-frequency table from webpages and retag every page with TF-IDF tags.
+
+Two passes over webpages, each spread over a process pool:
+
+    1. count document frequencies of every term (tagger.DocFreq)
+    2. pick each page's tagger.TAGS_PER_PAGE best tags with the finished
+       table and replace its rows in tags
+
+The DB only keeps title and summary, so both passes work on those. The
+table is saved to --doc-freq, where crawler.py picks it up, so tags of
+newly crawled pages (taken from the full text) are scored against the
+whole corpus from the first page on.
+
+    python scripts/retag.py --processes 8 --batch 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+# Add the parent directory to the path so we can import database and tagger
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import get_connection, release_connection
+from tagger import DocFreq, Tagger, extract_terms, TAGS_PER_PAGE
+
+_tagger = None  # Set in pass 2 workers by _init_tagger
+
+def count_terms(pages):
+    """Pass 1 worker: (unique buckets, counts, pages) for a batch."""
+    parts = [extract_terms(summary or "", title, url)[1] for url, title, summary in pages]
+    if not parts:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int64), 0
+    idx, counts = np.unique(np.concatenate(parts), return_counts=True)
+    return idx, counts, len(pages)
+
+def _init_tagger(counts, tags_per_page):
+    global _tagger
+    doc_freq = DocFreq()
+    doc_freq.counts = counts
+    _tagger = Tagger(doc_freq, tags_per_page)
+
+def tag_pages(pages):
+    """Pass 2 worker: [(url, tags)] for a batch."""
+    return [(url, _tagger.tag(extract_terms(summary or "", title, url)[0]))
+            for url, title, summary in pages]
+
+def batches(size):
+    """Yield lists of (url, title, summary) in url order, on a connection of their own."""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        after = ""
+        while True:
+            cur.execute(
+                "SELECT url, title, summary FROM webpages WHERE url > %s ORDER BY url LIMIT %s;",
+                (after, size)
+            )
+            rows = cur.fetchall()
+            conn.commit()
+            if not rows:
+                break
+            after = rows[-1][0]
+            yield rows
+        cur.close()
+    finally:
+        release_connection(conn)
+
+def run_pool(pool, fn, size, handle, window):
+    """Feed batches to pool with at most window in flight, calling handle() on each result."""
+    pending = set()
+    for pages in batches(size):
+        pending.add(pool.submit(fn, pages))
+        if len(pending) >= window:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                handle(fut.result())
+    for fut in pending:
+        handle(fut.result())
+
+def count_tag_rows(cur):
+    cur.execute("SELECT COUNT(*) FROM tags;")
+    return cur.fetchone()[0]
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--processes", type=int, default=os.cpu_count() or 2)
+    ap.add_argument("--batch", type=int, default=2000, help="pages per worker task and transaction")
+    ap.add_argument("--tags", type=int, default=TAGS_PER_PAGE, help="tags per page")
+    ap.add_argument("--doc-freq", default="docfreq.npy", help="where to save the table")
+    args = ap.parse_args()
+    window = args.processes * 2
+
+    start = time.perf_counter()
+    doc_freq = DocFreq()
+
+    def add_counts(result):
+        idx, counts, pages = result
+        np.add.at(doc_freq.counts, idx, counts.astype(np.uint32))
+        doc_freq.counts[-1] += pages
+
+    with ProcessPoolExecutor(args.processes) as pool:
+        run_pool(pool, count_terms, args.batch, add_counts, window)
+    doc_freq.save(args.doc_freq)
+    print(f"[*] Pass 1: document frequencies of {doc_freq.docs} pages in "
+          f"{time.perf_counter() - start:.1f}s, saved to {args.doc_freq}")
+
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        before = count_tag_rows(cur)
+        done = 0
+
+        def write_tags(result):
+            nonlocal done
+            cur.execute("DELETE FROM tags WHERE url = ANY(%s);", ([url for url, _ in result],))
+            rows = [(url, tag) for url, tags in result for tag in tags]
+            if rows:
+                execute_values(cur, "INSERT INTO tags (url, tag) VALUES %s ON CONFLICT DO NOTHING;",
+                               rows, page_size=len(rows))
+            conn.commit()
+            done += len(result)
+            print(f"[*] Pass 2: {done}/{doc_freq.docs} pages retagged")
+
+        with ProcessPoolExecutor(args.processes, initializer=_init_tagger,
+                                 initargs=(doc_freq.counts, args.tags)) as pool:
+            run_pool(pool, tag_pages, args.batch, write_tags, window)
+        after = count_tag_rows(cur)
+        cur.close()
+    finally:
+        release_connection(conn)
+    print(f"[*] Done in {time.perf_counter() - start:.1f}s: tag rows {before} -> {after}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Synthetic web universe for offline, reproducible crawl benchmarks.
+
+One local HTTP server plays thousands of virtual hosts (h0.synthetic.test,
+h1.synthetic.test, ... selected by the Host header) with a deterministic
+link graph: the same --seed always yields the same pages, links, errors
+and latencies, so runs are comparable. Nothing is stored; every page is
+generated on request, so millions of pages cost no memory.
+
+Per host:
+    /robots.txt           Disallow: /private/ plus a Sitemap: line
+    /sitemap.xml          first --sitemap-urls pages with <lastmod>
+    /p/<n>.html           HTML page of --size-kb with --links out-links
+    /r/<n>                301 redirect to /p/<n>.html
+    /private/<n>.html     page disallowed by robots.txt
+    /file/<n>.bin         1 MB application/octet-stream (content-type gating)
+    /trap/<n>/            endless calendar-style trap on --trap-rate of hosts
+
+Any host also answers:
+    /_stats               JSON counters of what was served
+    /api/crawler/...      minimal in-memory coordinator for CrawlerV2 workers
+
+Point the crawler at it by resolving *.synthetic.test to 127.0.0.1 (see
+scripts/bench_crawl.py, which starts this server itself).
+
+    python scripts/synthetic_web.py --port 8700 --hosts 2000 --pages 1000
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from hashlib import blake2b
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+DOMAIN = "synthetic.test"
+WORDS = ("search engine crawler index page link network data python server query result "
+         "archive library science history music travel recipe garden weather market sport "
+         "review guide forum article photo video school health energy design software").split()
+
+def h64(*parts):
+    """Deterministic 64-bit hash of parts."""
+    return int.from_bytes(blake2b(":".join(map(str, parts)).encode(), digest_size=8).digest(), "big")
+
+def unit(*parts):
+    """Deterministic float in [0, 1)."""
+    return h64(*parts) / 2 ** 64
+
+class Universe:
+    """The link graph and page contents, derived from the seed on demand."""
+
+    def __init__(self, args):
+        self.seed = args.seed
+        self.hosts = args.hosts
+        self.pages = args.pages
+        self.links = args.links
+        self.local = args.local
+        self.size_kb = (args.min_kb, args.max_kb)
+        self.latency = args.latency_ms / 1000
+        self.jitter = args.jitter_ms / 1000
+        self.slow_rate = args.slow_rate
+        self.error_rate = args.error_rate
+        self.redirect_rate = args.redirect_rate
+        self.binary_rate = args.binary_rate
+        self.private_rate = args.private_rate
+        self.trap_rate = args.trap_rate
+        self.sitemap_urls = args.sitemap_urls
+        self.port = args.port
+
+    def host_name(self, h):
+        return f"h{h}.{DOMAIN}:{self.port}"
+
+    def url(self, h, path):
+        return f"http://{self.host_name(h)}{path}"
+
+    def is_trap_host(self, h):
+        return unit(self.seed, "trap", h) < self.trap_rate
+
+    def delay(self, h, path):
+        d = self.latency + self.jitter * unit(self.seed, "lat", h, path)
+        if unit(self.seed, "slow", h) < self.slow_rate:
+            d *= 10
+        return d
+
+    def status(self, h, n):
+        u = unit(self.seed, "err", h, n)
+        if u < self.error_rate / 2:
+            return 404
+        if u < self.error_rate:
+            return 500
+        return 200
+
+    def out_links(self, h, n):
+        rng = random.Random(h64(self.seed, "links", h, n))
+        out = []
+        for k in range(self.links):
+            th = h if rng.random() < self.local else rng.randrange(self.hosts)
+            tn = rng.randrange(self.pages)
+            kind = rng.random()
+            if kind < self.redirect_rate:
+                path = f"/r/{tn}"
+            elif kind < self.redirect_rate + self.binary_rate:
+                path = f"/file/{tn}.bin"
+            elif kind < self.redirect_rate + self.binary_rate + self.private_rate:
+                path = f"/private/{tn}.html"
+            else:
+                path = f"/p/{tn}.html"
+            out.append(self.url(th, path))
+        if self.is_trap_host(h) and n % 10 == 0:
+            out.append(self.url(h, "/trap/0/"))
+        return out
+
+    def page(self, h, n, links=None, title=None):
+        rng = random.Random(h64(self.seed, "page", h, n))
+        lo, hi = self.size_kb
+        target = int(rng.uniform(lo, hi) * 1024)
+        links = self.out_links(h, n) if links is None else links
+        anchors = "".join(f'<li><a href="{u}">{rng.choice(WORDS)} {i}</a></li>' for i, u in enumerate(links))
+        head = (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+                f"<title>{title or f'Host {h} page {n}'}</title></head><body>"
+                f"<h1>{rng.choice(WORDS).title()} {rng.choice(WORDS)}</h1><ul>{anchors}</ul>")
+        paras = []
+        size = len(head)
+        while size < target:
+            p = "<p>" + " ".join(rng.choice(WORDS) for _ in range(80)) + ".</p>"
+            paras.append(p)
+            size += len(p)
+        return (head + "".join(paras) + "</body></html>").encode()
+
+    def robots(self, h):
+        return (f"User-agent: *\nDisallow: /private/\n\n"
+                f"Sitemap: {self.url(h, '/sitemap.xml')}\n").encode()
+
+    def sitemap(self, h):
+        now = time.time()
+        entries = []
+        for n in range(min(self.pages, self.sitemap_urls)):
+            age = unit(self.seed, "lastmod", h, n) * 365 * 86400
+            lastmod = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now - age))
+            entries.append(f"<url><loc>{self.url(h, f'/p/{n}.html')}</loc><lastmod>{lastmod}</lastmod></url>")
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                + "".join(entries) + "</urlset>").encode()
+
+    def trap(self, h, depth):
+        links = [self.url(h, f"/trap/{depth + 1}/"),
+                 self.url(h, f"/trap/{depth}/?sid={h64(depth, time.time_ns()) % 10 ** 8}")]
+        return self.page(h, -depth - 1, links=links, title=f"Calendar {depth}")
+
+class Coordinator:
+    """In-memory stand-in for crawler_server.py's queue endpoints."""
+
+    def __init__(self, seeds):
+        self._lock = threading.Lock()
+        self.queue = deque(seeds)
+        self.seen = set(seeds)
+        self.submitted = 0
+
+    def take(self, n=10):
+        with self._lock:
+            return [self.queue.popleft() for _ in range(min(n, len(self.queue)))]
+
+    def submit(self, data):
+        with self._lock:
+            self.submitted += 1
+            for url in data.get("new_urls", []):
+                if url not in self.seen:
+                    self.seen.add(url)
+                    self.queue.append(url)
+
+_HOST = re.compile(r"^h(\d+)\." + re.escape(DOMAIN) + r"(:\d+)?$")
+
+def make_handler(universe, coordinator, stats, stats_lock):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body=b"", ctype="text/html; charset=utf-8", headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+            with stats_lock:
+                stats["requests"] += 1
+                stats[f"status_{status}"] += 1
+                stats["bytes"] += len(body)
+
+        def _json(self, obj, status=200):
+            self._send(status, json.dumps(obj).encode(), "application/json")
+
+        def do_POST(self):
+            path = urlsplit(self.path).path
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            if path == "/api/crawler/submit":
+                coordinator.submit(json.loads(raw or b"{}"))
+                self._json({"message": "Data saved successfully"})
+            elif path.startswith("/api/crawler/"):
+                self._json({"message": "ok"})
+            else:
+                self._send(404)
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            path = parts.path
+            if path == "/_stats":
+                with stats_lock:
+                    snap = dict(stats)
+                snap["coordinator_queue"] = len(coordinator.queue)
+                snap["coordinator_submitted"] = coordinator.submitted
+                return self._json(snap)
+            if path == "/api/crawler/urls":
+                return self._json({"urls": coordinator.take()})
+            if path == "/api/crawler/blacklist_domain":
+                return self._json({"blacklisted": False, "domain": parse_qs(parts.query).get("domain")})
+
+            m = _HOST.match(self.headers.get("Host", ""))
+            if not m or int(m.group(1)) >= universe.hosts:
+                return self._send(404, b"unknown host")
+            h = int(m.group(1))
+            time.sleep(universe.delay(h, path))
+
+            if path == "/robots.txt":
+                return self._send(200, universe.robots(h), "text/plain")
+            if path == "/sitemap.xml":
+                return self._send(200, universe.sitemap(h), "application/xml")
+            m = re.match(r"^/(p|private)/(\d+)\.html$", path)
+            if m and int(m.group(2)) < universe.pages:
+                n = int(m.group(2))
+                status = universe.status(h, n)
+                if status != 200:
+                    return self._send(status, b"<html><body>error</body></html>")
+                with stats_lock:
+                    stats["pages"] += 1
+                return self._send(200, universe.page(h, n))
+            m = re.match(r"^/r/(\d+)$", path)
+            if m:
+                return self._send(301, headers={"Location": universe.url(h, f"/p/{m.group(1)}.html")})
+            if re.match(r"^/file/\d+\.bin$", path):
+                return self._send(200, bytes(1024 * 1024), "application/octet-stream")
+            m = re.match(r"^/trap/(\d+)/$", path)
+            if m and universe.is_trap_host(h):
+                with stats_lock:
+                    stats["trap_pages"] += 1
+                return self._send(200, universe.trap(h, int(m.group(1))))
+            return self._send(404, b"<html><body>not found</body></html>")
+
+        do_HEAD = do_GET
+
+    return Handler
+
+def add_universe_args(ap):
+    """Universe options, shared with scripts/bench_crawl.py."""
+    ap.add_argument("--port", type=int, default=8700)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--hosts", type=int, default=2000)
+    ap.add_argument("--pages", type=int, default=1000, help="pages per host")
+    ap.add_argument("--links", type=int, default=15, help="out-links per page")
+    ap.add_argument("--local", type=float, default=0.7, help="share of links to the same host")
+    ap.add_argument("--min-kb", type=float, default=5)
+    ap.add_argument("--max-kb", type=float, default=60)
+    ap.add_argument("--latency-ms", type=float, default=30)
+    ap.add_argument("--jitter-ms", type=float, default=40)
+    ap.add_argument("--slow-rate", type=float, default=0.02, help="hosts answering 10x slower")
+    ap.add_argument("--error-rate", type=float, default=0.03)
+    ap.add_argument("--redirect-rate", type=float, default=0.05)
+    ap.add_argument("--binary-rate", type=float, default=0.01)
+    ap.add_argument("--private-rate", type=float, default=0.02)
+    ap.add_argument("--trap-rate", type=float, default=0.01, help="hosts with a crawl trap")
+    ap.add_argument("--sitemap-urls", type=int, default=200)
+    ap.add_argument("--seeds", type=int, default=20, help="seed URLs (first page of the first N hosts)")
+
+def seed_urls(universe, n):
+    return [universe.url(h, "/p/0.html") for h in range(min(n, universe.hosts))]
+
+def serve(args):
+    universe = Universe(args)
+    coordinator = Coordinator(seed_urls(universe, args.seeds))
+    stats, stats_lock = Counter(), threading.Lock()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port),
+                                 make_handler(universe, coordinator, stats, stats_lock))
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    return server
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_universe_args(ap)
+    args = ap.parse_args()
+    server = serve(args)
+    print(f"[*] Serving {args.hosts} hosts x {args.pages} pages on 127.0.0.1:{args.port} "
+          f"(*.{DOMAIN}), seed {args.seed}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
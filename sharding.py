@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+sharding.py
+
+Consistent-hash sharding of hosts across crawler processes.
+
+Every host maps to a point on a 60-bit ring: the top 60 bits of the md5 of
+its lower-cased netloc. pending_urls and crawled_urls store that point as
+host_point, and HOST_POINT_SQL computes the same value inside PostgreSQL. Each of the N
+shards places VNODES points on the ring and owns the arcs that end at
+them, so a shard only claims (and loads as visited) rows whose host_point falls
+in its ranges().
+All politeness, robots and ToS state of a host then lives in exactly one
+process. Links to foreign hosts are still written to the shared
+pending_urls table, and that write is what routes them to their owner.
+
+Shard points depend only on the shard's index, so going from N to N+1
+shards moves about 1/(N+1) of the hosts and leaves the rest where they
+were. State files of a shard (visited snapshot, checkpoint...) carry a
+.shardN tag from shard_path(), so shards can also share a directory.
+"""
+
+import os
+from bisect import bisect_left
+from hashlib import md5
+
+VNODES = 128  # Ring points per shard; more gives a more even split
+POINT_BITS = 60
+RING_SIZE = 1 << POINT_BITS
+
+# Same value as host_point(), for a TEXT column or expression holding the netloc
+HOST_POINT_SQL = "('x' || substr(md5(lower({})), 1, 15))::bit(60)::bigint"
+NETLOC_SQL = "substring(url from '^[A-Za-z]+://([^/?#]+)')"  # netloc of a url column
+
+def host_point(host):
+    """Ring point of a netloc."""
+    return int(md5(host.lower().encode("utf-8", "surrogatepass")).hexdigest()[:15], 16)
+
+class Shard:
+    """Shard `index` of `count` on a ring of count * vnodes points."""
+
+    def __init__(self, index, count, vnodes=VNODES):
+        if not 0 <= index < count:
+            raise ValueError(f"shard index {index} is not in 0..{count - 1}")
+        self.index = index
+        self.count = count
+        ring = sorted((host_point(f"shard-{s}#{v}"), s) for s in range(count) for v in range(vnodes))
+        self._points = [p for p, _ in ring]
+        self._owners = [s for _, s in ring]
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+    @classmethod
+    def parse(cls, spec):
+        """'2/4' -> Shard(2, 4)."""
+        index, _, count = spec.partition("/")
+        return cls(int(index), int(count))
+
+    def owner(self, host):
+        """Index of the shard that owns host."""
+        i = bisect_left(self._points, host_point(host))
+        return self._owners[i % len(self._owners)]
+
+    def owns(self, host):
+        return self.count == 1 or self.owner(host) == self.index
+
+    def ranges(self):
+        """
+        (lo, hi) pairs, lo exclusive and hi inclusive, covering every point
+        this shard owns; the arc across zero is split in two.
+        """
+        arcs = []
+        for i, (point, owner) in enumerate(zip(self._points, self._owners)):
+            if owner != self.index:
+                continue
+            if i:
+                arcs.append((self._points[i - 1], point))
+            else:
+                arcs.append((-1, point))
+                arcs.append((self._points[-1], RING_SIZE))
+        # Neighbouring arcs of one shard become a single range
+        out = []
+        for lo, hi in sorted(arcs):
+            if out and out[-1][1] == lo:
+                out[-1] = (out[-1][0], hi)
+            else:
+                out.append((lo, hi))
+        return out
+
+    def sql_filter(self, column="host_point"):
+        """
+        (SQL condition, parameters) that keep rows whose column lies in
+        ranges(); the condition is empty when there is a single shard.
+        """
+        if self.count == 1:
+            return "", ()
+        condition = f"""EXISTS (SELECT 1 FROM unnest(%s::bigint[], %s::bigint[]) r(lo, hi)
+                       WHERE {column} > r.lo AND {column} <= r.hi)"""
+        return condition, tuple(map(list, zip(*self.ranges())))
+
+def shard_path(path, shard):
+    """
+    path with a .shardN tag before its extensions, so the state files of
+    shards sharing a directory do not collide; unchanged without sharding.
+    """
+    if not path or shard is None or shard.count == 1:
+        return path
+    head, tail = os.path.split(path)
+    base, dot, ext = tail.partition(".")
+    return os.path.join(head, f"{base}.shard{shard.index}{dot}{ext}")
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+simhash_index.py
+
+Near-duplicate lookup for 64-bit SimHash fingerprints without a table scan.
+
+A fingerprint is split into BANDS bands of BAND_BITS bits. If two
+fingerprints differ in at most 2 * BANDS - 1 bits, at least one band holds
+at most one of those bits, so the two share that band exactly or up to a
+single bit. A lookup therefore only compares the fingerprints filed under
+the query's band values and their BAND_BITS one-bit neighbours (probes()).
+With 16-bit bands that is about 17 * N / 65536 rows per band, e.g. ~1000
+candidates at 1M pages, instead of all N.
+
+MAX_DISTANCE is calibrated for full-text 3-word-shingle fingerprints
+(page_simhash), where every edited word changes three features. On
+synthetic 1500-word pages with 5 words edited, scripts/bench_simhash.py
+finds 72% of the copies within 3 bits, 98% within 6 and 99% within 7;
+unrelated pages sit 20+ bits apart, and only pages sharing most of their
+text through a template come closer. save_page also requires the same URL
+path before it calls a page a duplicate, which keeps such template
+matches out, so the threshold favours recall.
+
+SimhashIndex keeps the bands in memory. PgSimhashIndex stores them in the
+indexed simhash_bands side table, which database.save_page uses. Postgres
+has no unsigned 64-bit type, so fingerprints are stored as signed BIGINTs
+and converted back on read.
+"""
+
+from psycopg2.extras import execute_values
+
+BANDS = 4
+BAND_BITS = 16
+MAX_DISTANCE = 6  # Fingerprints this many bits apart or fewer are near-duplicates
+_BAND_MASK = (1 << BAND_BITS) - 1
+_U64 = 1 << 64
+
+def bands(fingerprint):
+    """The BANDS band values of a fingerprint, lowest bits first."""
+    return [(fingerprint >> (i * BAND_BITS)) & _BAND_MASK for i in range(BANDS)]
+
+def probes(fingerprint):
+    """Per band, the band value followed by its BAND_BITS one-bit neighbours."""
+    return [[value] + [value ^ (1 << bit) for bit in range(BAND_BITS)] for value in bands(fingerprint)]
+
+def distance(a, b):
+    """Hamming distance between two fingerprints."""
+    return bin(a ^ b).count("1")
+
+def to_signed(fingerprint):
+    return fingerprint - _U64 if fingerprint >= 1 << 63 else fingerprint
+
+def to_unsigned(value):
+    return value % _U64
+
+def _check(max_distance):
+    if max_distance >= 2 * BANDS:
+        raise ValueError(f"max_distance must be below {2 * BANDS} to be found through {BANDS} probed bands")
+    return max_distance
+
+class SimhashIndex:
+    """In-memory band tables: one dict of band value -> [(fingerprint, key)] per band."""
+
+    def __init__(self, max_distance=MAX_DISTANCE):
+        self.max_distance = _check(max_distance)
+        self._tables = [{} for _ in range(BANDS)]
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, key, fingerprint):
+        entry = (fingerprint, key)
+        for table, value in zip(self._tables, bands(fingerprint)):
+            bucket = table.get(value)
+            if bucket is None:
+                table[value] = [entry]
+            else:
+                bucket.append(entry)
+        self._size += 1
+
+    def near(self, fingerprint, max_distance=None):
+        """[(key, distance)] of indexed fingerprints within max_distance, closest first."""
+        limit = self.max_distance if max_distance is None else _check(max_distance)
+        found = {}
+        for table, values in zip(self._tables, probes(fingerprint)):
+            for value in values:
+                for fp, key in table.get(value, ()):
+                    if key not in found:
+                        d = distance(fp, fingerprint)
+                        if d <= limit:
+                            found[key] = d
+        return sorted(found.items(), key=lambda kv: kv[1])
+
+    def add_if_new(self, key, fingerprint):
+        """Insert-time check: return the near-duplicates of fingerprint, indexing it only if there are none."""
+        dupes = self.near(fingerprint)
+        if not dupes:
+            self.add(key, fingerprint)
+        return dupes
+
+    def candidates(self, fingerprint):
+        """Number of entries a lookup compares (for benchmarks)."""
+        return sum(len(t.get(v, ())) for t, values in zip(self._tables, probes(fingerprint)) for v in values)
+
+class PgSimhashIndex:
+    """Band rows in a PostgreSQL side table; methods take a cursor and leave commits to the caller."""
+
+    def __init__(self, table="simhash_bands", max_distance=MAX_DISTANCE):
+        self.table = table
+        self.max_distance = _check(max_distance)
+
+    def ensure_schema(self, cur):
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table}(
+                band SMALLINT NOT NULL,
+                value INTEGER NOT NULL,
+                fingerprint BIGINT NOT NULL,
+                url TEXT NOT NULL,
+                PRIMARY KEY (band, value, url)
+            );
+        """)
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_url ON {self.table}(url);")
+
+    def near(self, cur, fingerprint, max_distance=None):
+        """[(url, distance)] of indexed pages within max_distance, closest first."""
+        limit = self.max_distance if max_distance is None else _check(max_distance)
+        where = " OR ".join(["(band = %s AND value = ANY(%s))"] * BANDS)
+        params = [x for i, values in enumerate(probes(fingerprint)) for x in (i, values)]
+        cur.execute(f"SELECT DISTINCT url, fingerprint FROM {self.table} WHERE {where};", params)
+        found = [(url, distance(to_unsigned(fp), fingerprint)) for url, fp in cur.fetchall()]
+        return sorted(((u, d) for u, d in found if d <= limit), key=lambda kv: kv[1])
+
+    def add(self, cur, url, fingerprint):
+        self.add_many(cur, [(url, fingerprint)])
+
+    def add_many(self, cur, pages):
+        """Index [(url, fingerprint)] in one statement."""
+        rows = [(i, value, to_signed(fp), url)
+                for url, fp in pages for i, value in enumerate(bands(fp))]
+        if rows:
+            execute_values(
+                cur,
+                f"INSERT INTO {self.table}(band, value, fingerprint, url) VALUES %s ON CONFLICT DO NOTHING;",
+                rows, page_size=len(rows)
+            )
+
+    def remove(self, cur, urls):
+        cur.execute(f"DELETE FROM {self.table} WHERE url = ANY(%s);", (list(urls),))
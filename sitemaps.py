@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+sitemaps.py
+
+Sitemap ingestion for the crawler.
+
+SitemapIngester discovers a host's sitemaps from its robots.txt Sitemap:
+lines (falling back to /sitemap.xml), follows sitemap indexes and reads
+plain or gzipped sitemaps straight off the response stream with
+lxml.etree.iterparse, clearing each <url> as it goes, so a 50k-URL file is
+processed in constant memory.
+
+<lastmod> decides what reaches the frontier: URLs we already stored and
+that have not changed since our last fetch are skipped. The rest get the
+frontier's usual per-host sequence priority, so a host with a big sitemap
+still takes its turn with every other host; lastmod only decides the order
+within a host (changed stored pages first, then by freshness). Changed
+stored pages are given a page_validators row if they lack one, which marks
+them as recrawls so the visited check does not drop them. Child
+sitemaps whose <lastmod> is older than our last read of them are skipped,
+and each sitemap is read at most once per SITEMAP_TTL (sitemap_state).
+
+Sitemap requests take their turn in the crawler's per-host politeness
+schedule (the reserve callable) like page fetches do, and the
+/sitemap.xml fallback is only tried where robots.txt allows it.
+"""
+
+import gzip
+import logging
+import math
+import re
+import threading
+from datetime import datetime, timedelta
+from queue import Queue, Empty
+from urllib.parse import urlparse
+
+from lxml import etree
+
+from canonical import canonicalize
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_TTL = timedelta(days=1)  # A sitemap is re-read at most this often
+MAX_SITEMAPS_PER_HOST = 50  # Sitemap files (index + children) read per host
+MAX_SITEMAP_BYTES = 50 * 1024 * 1024  # Uncompressed size limit from the sitemap protocol
+SITEMAP_BATCH = 1000  # <url> entries checked against the DB and enqueued at once
+UNDATED_PRIORITY = 8  # Freshness rank of URLs without <lastmod> (ranks order URLs within a host)
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_YEAR_MONTH = re.compile(r"(\d{4})(?:-(\d{2}))?$")
+
+class _Reader:
+    """File-like wrapper that replays already-read head bytes, then stops after limit bytes."""
+
+    def __init__(self, f, limit, head=b""):
+        self.f = f
+        self.left = limit
+        self.head = head
+
+    def read(self, n=-1):
+        if self.left <= 0:
+            return b""
+        n = self.left if n is None or n < 0 else min(n, self.left)
+        if self.head:
+            data, self.head = self.head[:n], self.head[n:]
+        else:
+            data = self.f.read(n)
+        self.left -= len(data)
+        return data
+
+def parse_lastmod(value):
+    """W3C datetime (any precision from YYYY on) from <lastmod> as naive local time, or None."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        # fromisoformat() does not take the reduced YYYY and YYYY-MM forms
+        m = _YEAR_MONTH.match(value)
+        dt = datetime(int(m.group(1)), int(m.group(2) or 1), 1) if m else datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt
+
+def iter_sitemap(stream):
+    """
+    Yield ("url" | "sitemap", loc, lastmod) for each entry of a <urlset> or
+    <sitemapindex> read from a binary file-like, gzipped or not.
+    """
+    head = stream.read(2)
+    src = _Reader(stream, MAX_SITEMAP_BYTES, head)
+    if head == _GZIP_MAGIC:
+        src = _Reader(gzip.GzipFile(fileobj=src), MAX_SITEMAP_BYTES)
+    context = etree.iterparse(src, events=("end",),
+                              tag=("{*}url", "{*}sitemap"), resolve_entities=False,
+                              no_network=True, huge_tree=False)
+    try:
+        for _, elem in context:
+            loc = (elem.findtext("{*}loc") or "").strip()
+            if loc:
+                kind = "sitemap" if etree.QName(elem).localname == "sitemap" else "url"
+                yield kind, loc, parse_lastmod(elem.findtext("{*}lastmod"))
+            # Drop the finished entry and its already-processed siblings
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    except (etree.XMLSyntaxError, OSError, EOFError) as e:
+        logger.debug(f"Sitemap parse stopped early: {e}")
+
+def priority_for(lastmod, now=None):
+    """Freshness rank: 0 for pages changed within a day, growing with log2 of their age."""
+    if lastmod is None:
+        return UNDATED_PRIORITY
+    age_days = max(0.0, ((now or datetime.now()) - lastmod).total_seconds() / 86400)
+    return min(UNDATED_PRIORITY, int(math.log2(1 + age_days)))
+
+class SitemapIngester:
+    """Reads the sitemaps of newly seen hosts on background threads and feeds the frontier."""
+
+    def __init__(self, session, robots_cache, frontier, get_conn, release_conn,
+                 workers=2, timeout=15, depth=1, reserve=None):
+        self.session = session
+        self.reserve = reserve  # host -> seconds to wait for its next fetch slot (HostScheduler.reserve)
+        self.robots_cache = robots_cache
+        self.frontier = frontier
+        self.get_conn = get_conn
+        self.release_conn = release_conn
+        self.workers = workers
+        self.timeout = timeout
+        self.depth = depth
+        self._seen = set()
+        self._lock = threading.Lock()
+        self._queue = Queue()
+        self._threads = []
+        self._stop = threading.Event()
+        self.stats = {"sitemaps": 0, "skipped_sitemaps": 0, "urls": 0,
+                      "unchanged": 0, "enqueued": 0}
+
+    def ensure_schema(self, cur):
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS sitemap_state(
+                sitemap_url TEXT PRIMARY KEY,
+                host TEXT,
+                fetched_at TIMESTAMP DEFAULT NOW()
+            );
+        """)
+
+    def start(self):
+        self._stop.clear()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"Sitemaps-{i+1}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def submit(self, host):
+        """Queue host's sitemaps for ingestion the first time host is seen."""
+        with self._lock:
+            if host in self._seen:
+                return
+            self._seen.add(host)
+        self._queue.put(host)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                host = self._queue.get(timeout=1)
+            except Empty:
+                continue
+            try:
+                self.ingest(host)
+            except Exception as e:
+                logger.error(f"Sitemap ingestion error for {host}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def discover(self, host):
+        """Sitemap URLs for host from robots.txt, or the conventional location if robots.txt allows it."""
+        listed = self.robots_cache.site_maps(host)
+        if listed:
+            return listed
+        fallback = f"https://{host}/sitemap.xml"
+        return [fallback] if self.robots_cache.can_fetch(fallback) else []
+
+    def ingest(self, host):
+        """Read every sitemap reachable from host's roots; returns the number of URLs enqueued."""
+        pending = [(url, None) for url in self.discover(host)]
+        seen = set()
+        enqueued = 0
+        while pending and len(seen) < MAX_SITEMAPS_PER_HOST and not self._stop.is_set():
+            sitemap_url, lastmod = pending.pop(0)
+            if sitemap_url in seen:
+                continue
+            seen.add(sitemap_url)
+            if not self._due(sitemap_url, lastmod):
+                self.stats["skipped_sitemaps"] += 1
+                continue
+
+            batch = []
+            for kind, loc, loc_lastmod in self._read(sitemap_url):
+                if kind == "sitemap":
+                    pending.append((loc, loc_lastmod))
+                    continue
+                batch.append((loc, loc_lastmod))
+                if len(batch) >= SITEMAP_BATCH:
+                    enqueued += self._enqueue(host, batch)
+                    batch = []
+            if batch:
+                enqueued += self._enqueue(host, batch)
+            self._mark_read(host, sitemap_url)
+            self.stats["sitemaps"] += 1
+        if enqueued:
+            logger.info(f"Sitemaps of {host}: {enqueued} URLs enqueued from {len(seen)} sitemaps")
+        return enqueued
+
+    def _read(self, sitemap_url):
+        if self.reserve is not None:
+            wait = self.reserve(urlparse(sitemap_url).netloc)
+            if wait > 0 and self._stop.wait(wait):
+                return
+        try:
+            r = self.session.get(sitemap_url, timeout=self.timeout, stream=True)
+        except Exception as e:
+            logger.debug(f"Sitemap fetch failed for {sitemap_url}: {e}")
+            return
+        try:
+            if r.status_code != 200:
+                return
+            r.raw.decode_content = True
+            yield from iter_sitemap(r.raw)
+        finally:
+            r.close()
+
+    def _due(self, sitemap_url, lastmod):
+        """True unless we read sitemap_url recently and it has not changed since."""
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT fetched_at FROM sitemap_state WHERE sitemap_url = %s;", (sitemap_url,))
+            row = cur.fetchone()
+            cur.close()
+            conn.commit()
+        finally:
+            self.release_conn(conn)
+        if row is None:
+            return True
+        fetched_at = row[0]
+        if lastmod is not None:
+            return lastmod > fetched_at
+        return datetime.now() - fetched_at > SITEMAP_TTL
+
+    def _mark_read(self, host, sitemap_url):
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO sitemap_state (sitemap_url, host, fetched_at)
+                VALUES (%s, %s, NOW())
+                ON CONFLICT (sitemap_url) DO UPDATE SET fetched_at = EXCLUDED.fetched_at;
+                """,
+                (sitemap_url, host)
+            )
+            conn.commit()
+            cur.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_conn(conn)
+
+    def _enqueue(self, host, entries):
+        """
+        Enqueue same-host entries that are new or modified since we last
+        fetched them. entries is a list of (loc, lastmod).
+        """
+        latest = {}
+        for loc, lastmod in entries:
+            url = canonicalize(loc)
+            if urlparse(url).netloc != host:
+                continue
+            if url not in latest or (lastmod and (latest[url] is None or lastmod > latest[url])):
+                latest[url] = lastmod
+        self.stats["urls"] += len(entries)
+        if not latest:
+            return 0
+
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT u.url, GREATEST(w.timestamp, v.checked_at), v.url IS NOT NULL
+                FROM unnest(%s::text[]) AS u(url)
+                LEFT JOIN webpages w ON w.url = u.url
+                LEFT JOIN page_validators v ON v.url = u.url;
+                """,
+                (list(latest),)
+            )
+            crawled = {url: (seen_at, validated) for url, seen_at, validated in cur.fetchall()}
+            now = datetime.now()
+            ranked, recrawl = [], []
+            for url, lastmod in latest.items():
+                seen_at, validated = crawled.get(url, (None, False))
+                if seen_at is not None and (lastmod is None or lastmod <= seen_at):
+                    self.stats["unchanged"] += 1
+                    continue
+                # A stored page with a newer lastmod goes first
+                ranked.append((-1 if seen_at is not None else priority_for(lastmod, now), url))
+                if seen_at is not None and not validated:
+                    recrawl.append(url)
+            if recrawl:
+                # Claims then return (empty) validators for these, so crawl_url refetches them
+                cur.execute(
+                    """
+                    INSERT INTO page_validators (url, checked_at)
+                    SELECT url, timestamp FROM webpages WHERE url = ANY(%s)
+                    ON CONFLICT DO NOTHING;
+                    """,
+                    (recrawl,)
+                )
+            ranked.sort()
+            rows = [(url, self.depth) for _, url in ranked]
+            self.frontier.enqueue(cur, rows)
+            conn.commit()
+            cur.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_conn(conn)
+        self.stats["enqueued"] += len(rows)
+        return len(rows)
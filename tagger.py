@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+tagger.py
+
+Corpus-aware TF-IDF tags for crawled pages.
+
+DocFreq is a global document-frequency table kept as a flat uint32 array
+of DF_BUCKETS counters indexed by the crc32 of a term. That is a fixed 16 MB
+whatever the vocabulary, cheap to update with np.add.at and saved to disk
+as a .npy (the last slot holds the document count). Hash collisions can
+only raise a term's count, which makes a rare term look slightly more
+common; it never promotes boilerplate.
+
+extract_terms() runs where the page is parsed (a parse_stage worker). It
+returns the page's most frequent candidate terms with their counts, plus
+the bucket of every distinct term as a small array. The process that owns
+the table calls Tagger.observe() with the buckets and Tagger.tag() with
+the candidates, so workers never need the table itself. Tags are the
+TAGS_PER_PAGE candidates with the highest (1 + log tf) * idf. Terms found
+in more than MAX_DF_RATIO of all pages are never tags.
+"""
+
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter
+
+import numpy as np
+
+DF_BUCKETS = 1 << 22
+TAGS_PER_PAGE = 8
+CANDIDATES = 48  # Most frequent terms of a page considered for its tags
+TITLE_WEIGHT = 3  # A title occurrence counts this many times
+MAX_DF_RATIO = 0.5  # Terms on more than this share of pages are boilerplate
+MIN_DOCS_FOR_RATIO = 100  # ...once the table has seen this many pages
+
+_TERM = re.compile(r"\b[^\W\d_][^\W_]{3,19}\b")
+
+STOPWORDS = frozenset("""
+    about above after again against also among another because been before being below
+    between both came come could does doing down during each either else even ever every
+    from further have having here hers herself himself however into itself just least less
+    like made make many more most much must myself neither never none nothing once only
+    other ours ourselves over own rather same shall should since some such than that their
+    theirs them themselves then there these they this those though through thus under
+    until upon very want well were what whatever when where whether which while whom whose
+    will with within without would your yours yourself yourselves
+    click home menu login logout sign account cookie cookies privacy policy copyright
+    rights reserved contact terms service services search share follow subscribe
+    newsletter read more next previous back skip content main navigation toggle close
+    open view html http https index page pages site website online welcome learn
+""".split())
+
+def bucket(term, buckets=DF_BUCKETS):
+    return zlib.crc32(term.encode("utf-8", "surrogatepass")) % buckets
+
+def extract_terms(text, title=None, url=None, candidates=CANDIDATES, buckets=DF_BUCKETS):
+    """
+    Return (candidates, term_buckets): up to `candidates` [(term, tf)] by
+    frequency and a uint32 array with the bucket of every distinct term.
+    """
+    counts = Counter(t for t in _TERM.findall(text.lower()) if t not in STOPWORDS)
+    extra = []
+    if title:
+        extra += [t for t in _TERM.findall(title.lower()) if t not in STOPWORDS] * TITLE_WEIGHT
+    if url:
+        extra += [t for t in _TERM.findall(url.lower().replace("_", " ")) if t not in STOPWORDS]
+    counts.update(extra)
+    term_buckets = np.fromiter((bucket(t, buckets) for t in counts), dtype=np.uint32, count=len(counts))
+    return counts.most_common(candidates), term_buckets
+
+class DocFreq:
+    """Hashed document-frequency table; the last array slot counts documents."""
+
+    def __init__(self, buckets=DF_BUCKETS):
+        self.buckets = buckets
+        self.counts = np.zeros(buckets + 1, dtype=np.uint32)
+
+    @property
+    def docs(self):
+        return int(self.counts[-1])
+
+    def observe(self, term_buckets):
+        """Count one document with the given distinct-term buckets."""
+        np.add.at(self.counts, term_buckets, 1)
+        self.counts[-1] += 1
+
+    def merge(self, other):
+        """Add another table's counts (e.g. one built by a batch worker)."""
+        self.counts += other.counts
+
+    def df(self, term):
+        return int(self.counts[bucket(term, self.buckets)])
+
+    def idf(self, df):
+        return math.log((self.docs + 1) / (df + 1)) + 1.0
+
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, self.counts)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        """Load a table written by save(); returns False if there is none or it does not fit."""
+        try:
+            counts = np.load(path)
+        except (OSError, ValueError):
+            return False
+        if counts.dtype != np.uint32 or len(counts) != self.buckets + 1:
+            return False
+        self.counts = counts
+        return True
+
+class Tagger:
+    """Picks high-IDF tags and keeps a DocFreq up to date; thread-safe."""
+
+    def __init__(self, doc_freq=None, tags_per_page=TAGS_PER_PAGE):
+        self.doc_freq = doc_freq or DocFreq()
+        self.tags_per_page = tags_per_page
+        self._lock = threading.Lock()
+
+    def observe(self, term_buckets):
+        with self._lock:
+            self.doc_freq.observe(term_buckets)
+
+    def tag(self, candidates, n=None):
+        """Best n terms of [(term, tf)] by tf-idf, best first."""
+        df_table = self.doc_freq
+        docs = df_table.docs
+        limit = MAX_DF_RATIO * docs if docs >= MIN_DOCS_FOR_RATIO else None
+        scored = []
+        for term, tf in candidates:
+            df = df_table.df(term)
+            if limit is not None and df > limit:
+                continue
+            scored.append(((1 + math.log(tf)) * df_table.idf(df), term))
+        scored.sort(reverse=True)
+        return [term for _, term in scored[:n or self.tags_per_page]]
+
+    def observe_and_tag(self, candidates, term_buckets):
+        """Count the page, then return its tags."""
+        self.observe(term_buckets)
+        return self.tag(candidates)
+
+    def save(self, path):
+        with self._lock:
+            counts = self.doc_freq.counts.copy()
+        tmp = DocFreq(self.doc_freq.buckets)
+        tmp.counts = counts
+        tmp.save(path)
+
+    def load(self, path):
+        with self._lock:
+            return self.doc_freq.load(path)
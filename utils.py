@@ -6,53 +6,128 @@ utils.py
 Utility functions for the DarkNetCrawler to process web content.
 """
 
-from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
+from lxml import etree, html as lxml_html
 from urllib.parse import urljoin, urlparse
+from functools import cached_property
 import re
 from collections import Counter
 from config import MIN_TAGS, MAX_TAGS
-import warnings
+from canonical import canonicalize
+from links import links_from_root
 
-# Suppress XMLParsedAsHTMLWarning for HTML parsing
-warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
+_TEXT_NODES = etree.XPath("//text()[not(ancestor::script or ancestor::style or ancestor::template)]")
 
 def is_xml_content(html):
     """Check if content is likely XML based on common XML tags or DOCTYPE."""
+    if isinstance(html, bytes):
+        html = html[:2000].decode('latin-1')
     html = html.strip().lower()[:1000]  # Limit check for performance
     return html.startswith('<?xml') or '<rss' in html or '<sitemap' in html or '<!doctype xml' in html
 
+class ParsedPage:
+    """
+    A page parsed once with lxml and shared by every extractor.
+
+    Properties are computed on first access and cached, so callers only pay
+    for what they use. content may be str or raw bytes; bytes let lxml pick
+    up the encoding from the document itself.
+    """
+
+    def __init__(self, url, content):
+        self.url = url
+        self.content = content
+        self.is_xml = is_xml_content(content)
+
+    @cached_property
+    def root(self):
+        """Root element of the parsed document, or None if it is empty/unparseable."""
+        content = self.content
+        try:
+            if self.is_xml:
+                if isinstance(content, str):
+                    content = content.encode('utf-8')
+                    parser = etree.XMLParser(recover=True, encoding='utf-8', resolve_entities=False)
+                else:
+                    parser = etree.XMLParser(recover=True, resolve_entities=False)
+                return etree.fromstring(content, parser)
+            return lxml_html.document_fromstring(content)
+        except (etree.ParserError, etree.XMLSyntaxError, ValueError):
+            return None
+
+    @cached_property
+    def title(self):
+        """Stripped text of the first <title>, or None."""
+        if self.root is None:
+            return None
+        for el in self.root.iter('title', '{*}title'):
+            text = el.text_content() if hasattr(el, 'text_content') else ''.join(el.itertext())
+            return text.strip() or None
+        return None
+
+    @cached_property
+    def text(self):
+        """Visible text with each string stripped and joined by single spaces."""
+        if self.root is None:
+            return ""
+        return " ".join(t.strip() for t in _TEXT_NODES(self.root) if t.strip())
+
+    @cached_property
+    def summary(self):
+        return self.text[:200] or "No content"
+
+    @cached_property
+    def anchors(self):
+        """links.Link(url, text, rel) for every distinct <a>/<area> target, in document order."""
+        return links_from_root(self.root, self.url)
+
+    @cached_property
+    def links(self):
+        """Canonical absolute http(s) targets of every <a href>, plus sitemap <loc>s in XML."""
+        links = {link.url for link in self.anchors}
+        if self.is_xml and self.root is not None:
+            for loc in self.root.iter('{*}loc'):
+                href = (loc.text or '').strip()
+                full_url = urljoin(self.url, href)
+                if href and urlparse(full_url).scheme in ['http', 'https']:
+                    links.add(canonicalize(full_url))
+        return links
+
+    @cached_property
+    def images(self):
+        """First five <img src> values, as written in the page."""
+        if self.root is None:
+            return []
+        imgs = []
+        for img in self.root.iter('img', '{*}img'):
+            src = img.get('src')
+            if src is not None:
+                imgs.append(src)
+                if len(imgs) == 5:
+                    break
+        return imgs
+
+    @cached_property
+    def tags(self):
+        return generate_tags(self.text, title=self.title, url=self.url)
+
 def extract_links(base_url, html):
-    """Extract all valid links from HTML or XML content."""
+    """Extract all valid links from HTML or XML content (see links.extract_links for anchor text and rel)."""
     try:
-        parser = 'xml' if is_xml_content(html) else 'lxml'
-        soup = BeautifulSoup(html, parser)
-        links = set()
-        for tag in soup.find_all('a', href=True):
-            href = tag['href']
-            full_url = urljoin(base_url, href)
-            if urlparse(full_url).scheme in ['http', 'https']:
-                links.add(full_url)
-        return links
+        return ParsedPage(base_url, html).links
     except Exception as e:
         return set()
 
 def summarize_content(html):
     """Extract a summary from HTML or XML content."""
     try:
-        parser = 'xml' if is_xml_content(html) else 'lxml'
-        soup = BeautifulSoup(html, parser)
-        text = soup.get_text(separator=' ', strip=True)
-        return text[:200] or "No content"
+        return ParsedPage(None, html).summary
     except Exception as e:
         return f"Error summarizing: {e}"
 
 def extract_images(html):
     """Extract image URLs from HTML or XML content."""
     try:
-        parser = 'xml' if is_xml_content(html) else 'lxml'
-        soup = BeautifulSoup(html, parser)
-        imgs = [img['src'] for img in soup.find_all('img', src=True)]
-        return imgs[:5]
+        return ParsedPage(None, html).images
     except Exception as e:
         return []
 
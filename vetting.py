@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+vetting.py
+
+Background Terms-of-Service vetting of domains for the crawler.
+
+Crawl threads never probe ToS pages themselves: DomainVetter.status() is a
+non-blocking lookup that queues unknown hosts for a small worker pool. The
+workers fetch the usual ToS paths without holding a DB connection and then
+persist the verdict with a timestamp in domain_vetting (blocked hosts are
+also added to blocked_domains). snapshot()/restore() carry resolved verdicts
+through crawler checkpoints, so a restart only reads newer rows from the DB.
+
+Verdicts are kept in memory for at most VETTING_MAX_HOSTS hosts, least
+recently looked up dropped first, and expire after VETTING_TTL. A dropped
+or expired host is queued again, and the worker reuses its persisted
+verdict while that is still fresh instead of probing the site again.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from queue import Queue, Empty
+from time import time
+
+logger = logging.getLogger(__name__)
+
+TOS_PATHS = ("/terms", "/terms-of-service", "/tos", "/legal/terms")
+TOS_KEYWORDS = ("automated", "robot", "scrap", "crawl", "not allowed", "disallow", "unauthorized")
+VETTING_TTL = timedelta(days=30)  # Persisted verdicts older than this are re-vetted
+VETTING_MAX_HOSTS = 200000  # Verdicts kept in memory; least recently looked up ones are dropped
+
+PENDING = "pending"
+ALLOWED = "allowed"
+BLOCKED = "blocked"
+
+class DomainVetter:
+    """Resolves ToS verdicts for hosts on a pool of background threads."""
+
+    def __init__(self, session, get_conn, release_conn, workers=4, timeout=5,
+                 max_hosts=VETTING_MAX_HOSTS):
+        self.session = session
+        self.get_conn = get_conn
+        self.release_conn = release_conn
+        self.workers = workers
+        self.timeout = timeout
+        self.max_hosts = max_hosts
+        self._status = OrderedDict()  # host -> state, least recently looked up first
+        self._checked = {}  # host -> epoch seconds its verdict was reached
+        self._lock = threading.Lock()
+        self._queue = Queue()
+        self._threads = []
+        self._stop = threading.Event()
+
+    def ensure_schema(self, cur):
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS domain_vetting(
+                domain TEXT PRIMARY KEY,
+                blocked BOOLEAN NOT NULL,
+                checked_at TIMESTAMP DEFAULT NOW()
+            );
+        """)
+
+    def load(self, cur, since=None):
+        """
+        Preload persisted verdicts, only those checked after since when the
+        rest came from a checkpoint; blocked_domains always wins.
+        """
+        cutoff = datetime.now() - VETTING_TTL
+        cur.execute(
+            """
+            SELECT domain, blocked, checked_at FROM domain_vetting
+            WHERE checked_at > %s ORDER BY checked_at;
+            """,
+            (max(cutoff, since) if since else cutoff,)
+        )
+        rows = cur.fetchall()
+        cur.execute("SELECT domain FROM blocked_domains;")
+        blocked = cur.fetchall()
+        with self._lock:
+            for domain, is_blocked, checked_at in rows:
+                self._set(domain, BLOCKED if is_blocked else ALLOWED, checked_at.timestamp())
+            for (domain,) in blocked:
+                self._set(domain, BLOCKED, self._checked.get(domain, time()))
+        return len(self._status)
+
+    def start(self):
+        self._stop.clear()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"Vetter-{i+1}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def status(self, host):
+        """Return PENDING, ALLOWED or BLOCKED; unknown hosts are queued and PENDING."""
+        with self._lock:
+            state = self._status.get(host)
+            if state is not None and state != PENDING and self._expired(host):
+                state = None
+            if state is None:
+                state = PENDING
+                self._set(host, PENDING, None)
+                self._queue.put(host)
+            else:
+                self._status.move_to_end(host)
+            return state
+
+    def submit(self, host):
+        """Queue host for vetting ahead of its first crawl."""
+        self.status(host)
+
+    def is_blocked(self, host):
+        return self._status.get(host) == BLOCKED
+
+    def snapshot(self):
+        """Resolved verdicts as {host: [blocked, checked_at epoch seconds]}."""
+        with self._lock:
+            return {h: [s == BLOCKED, self._checked.get(h, 0.0)]
+                    for h, s in self._status.items() if s != PENDING}
+
+    def restore(self, verdicts):
+        """Load a snapshot() taken earlier, dropping verdicts older than VETTING_TTL."""
+        cutoff = time() - VETTING_TTL.total_seconds()
+        with self._lock:
+            for host, (blocked, checked_at) in sorted(verdicts.items(), key=lambda v: v[1][1]):
+                if checked_at > cutoff and self._status.get(host) in (None, PENDING):
+                    self._set(host, BLOCKED if blocked else ALLOWED, checked_at)
+        return len(self._status)
+
+    def clear(self):
+        with self._lock:
+            self._status.clear()
+            self._checked.clear()
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _expired(self, host):
+        return self._checked.get(host, 0.0) < time() - VETTING_TTL.total_seconds()
+
+    def _set(self, host, state, checked_at):
+        """
+        Record host's state (checked_at is None while PENDING) and drop the
+        least recently looked up hosts beyond max_hosts. Lock held.
+        """
+        self._status[host] = state
+        self._status.move_to_end(host)
+        if checked_at is not None:
+            self._checked[host] = checked_at
+        while len(self._status) > self.max_hosts:
+            dropped, _ = self._status.popitem(last=False)
+            self._checked.pop(dropped, None)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                host = self._queue.get(timeout=1)
+            except Empty:
+                continue
+            try:
+                verdict = self._persisted(host)
+                if verdict is None:
+                    blocked = self._probe(host)
+                    self._persist(host, blocked)
+                    verdict = (blocked, time())
+                    if blocked:
+                        logger.info(f"Disallowed by ToS: {host}")
+                blocked, checked_at = verdict
+                with self._lock:
+                    self._set(host, BLOCKED if blocked else ALLOWED, checked_at)
+            except Exception as e:
+                logger.error(f"ToS check error for {host}: {e}")
+                with self._lock:
+                    self._set(host, ALLOWED, time())
+            finally:
+                self._queue.task_done()
+
+    def _probe(self, host):
+        for path in TOS_PATHS:
+            try:
+                r = self.session.get(f"https://{host}{path}", timeout=self.timeout)
+                if r.status_code == 200 and any(kw in r.text.lower() for kw in TOS_KEYWORDS):
+                    return True
+            except Exception:
+                continue
+        return False
+
+    def _persisted(self, host):
+        """(blocked, checked_at epoch seconds) from the DB if still fresh, else None."""
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT v.blocked OR b.domain IS NOT NULL, v.checked_at
+                FROM (SELECT %s::text AS domain) d
+                LEFT JOIN domain_vetting v ON v.domain = d.domain AND v.checked_at > %s
+                LEFT JOIN blocked_domains b ON b.domain = d.domain;
+                """,
+                (host, datetime.now() - VETTING_TTL)
+            )
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+        finally:
+            self.release_conn(conn)
+        blocked, checked_at = row if row else (None, None)
+        if checked_at is None:
+            return (True, time()) if blocked else None
+        return bool(blocked), checked_at.timestamp()
+
+    def _persist(self, host, blocked):
+        conn = self.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO domain_vetting (domain, blocked, checked_at)
+                VALUES (%s, %s, NOW())
+                ON CONFLICT (domain) DO UPDATE
+                SET blocked = EXCLUDED.blocked, checked_at = EXCLUDED.checked_at;
+                """,
+                (host, blocked)
+            )
+            if blocked:
+                cur.execute(
+                    "INSERT INTO blocked_domains(domain) VALUES (%s) ON CONFLICT DO NOTHING;",
+                    (host,)
+                )
+            conn.commit()
+            cur.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_conn(conn)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+visited.py
+
+Compact visited-URL set for the crawler.
+
+URLs are stored as 64-bit blake2b fingerprints: a sorted NumPy uint64 array
+holds the bulk and a small Python set buffers recent additions until they
+are merged in. That is ~8 bytes per URL instead of the ~100+ bytes a str in
+a set costs. The sorted array is snapshotted as a .npy file and memory-mapped
+on load, so a restart only has to read crawled_urls rows added since the
+snapshot. With 64-bit fingerprints a false "already visited" stays below
+1e-10 per lookup even at hundreds of millions of URLs.
+
+FingerprintSet is not thread-safe; crawler.py guards it with visited_lock.
+"""
+
+import json
+import os
+from datetime import datetime
+from hashlib import blake2b
+
+import numpy as np
+
+MERGE_THRESHOLD = 65536  # Buffered fingerprints before merging into the sorted array
+
+def fingerprint(url):
+    """64-bit fingerprint of a URL."""
+    return int.from_bytes(blake2b(url.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'little')
+
+class FingerprintSet:
+    """Set of URLs kept as a sorted uint64 array plus an append buffer."""
+
+    def __init__(self, merge_threshold=MERGE_THRESHOLD):
+        self.merge_threshold = merge_threshold
+        self._base = np.empty(0, dtype=np.uint64)
+        self._buffer = set()
+
+    def __len__(self):
+        """Exact after merge(); buffered items added via update() may be double counted."""
+        return len(self._base) + len(self._buffer)
+
+    def _in_base(self, fp):
+        base = self._base
+        i = int(np.searchsorted(base, np.uint64(fp)))
+        return i < len(base) and int(base[i]) == fp
+
+    def __contains__(self, url):
+        fp = fingerprint(url)
+        return fp in self._buffer or self._in_base(fp)
+
+    def add(self, url):
+        """Add url; returns False if it was already present."""
+        fp = fingerprint(url)
+        if fp in self._buffer or self._in_base(fp):
+            return False
+        self._buffer.add(fp)
+        if len(self._buffer) >= self.merge_threshold:
+            self.merge()
+        return True
+
+    def update(self, urls):
+        """Bulk add; duplicates of the sorted array are dropped at merge time."""
+        buf = self._buffer
+        for url in urls:
+            buf.add(fingerprint(url))
+            if len(buf) >= self.merge_threshold:
+                self.merge()
+                buf = self._buffer
+
+    def merge(self):
+        """Fold the buffer into the sorted array."""
+        if not self._buffer:
+            return
+        new = np.fromiter(self._buffer, dtype=np.uint64, count=len(self._buffer))
+        new.sort()
+        base = self._base
+        pos = np.searchsorted(base, new)
+        present = pos < len(base)
+        present[present] = base[pos[present]] == new[present]
+        self._base = np.insert(base, pos[~present], new[~present])
+        self._buffer = set()
+
+    def clear(self):
+        self._base = np.empty(0, dtype=np.uint64)
+        self._buffer = set()
+
+    def fingerprints(self):
+        """Merged sorted array of every fingerprint (read-only view)."""
+        self.merge()
+        return self._base
+
+    def nbytes(self):
+        """Approximate memory held by the set."""
+        return self._base.nbytes + len(self._buffer) * 64
+
+    def save(self, path, watermark=None):
+        """
+        Atomically write the fingerprints to path (.npy) and a small JSON
+        sidecar recording watermark, the time up to which the DB is covered.
+        """
+        save_fingerprints(path, self.fingerprints(), watermark)
+
+    def load(self, path):
+        """
+        Memory-map a snapshot written by save(). Returns its watermark as a
+        datetime, or None if there is no usable snapshot.
+        """
+        try:
+            with open(path + ".meta.json") as f:
+                meta = json.load(f)
+            base = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if base.dtype != np.uint64 or len(base) != meta.get("count"):
+            return None
+        self._base = base
+        self._buffer = set()
+        return datetime.fromisoformat(meta["watermark"])
+
+def save_fingerprints(path, base, watermark=None):
+    """
+    Write a sorted fingerprint array as a FingerprintSet snapshot. Merges
+    never modify an array in place, so base can be written without holding
+    the set's lock.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, base)
+    os.replace(tmp, path)
+    meta = {"count": int(len(base)),
+            "watermark": (watermark or datetime.now()).isoformat()}
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, path + ".meta.json")